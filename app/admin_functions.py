@@ -1,175 +1,214 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
 import sys, os
 import datetime
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from models.schemas import Room, RoomBooking, EquipmentManagement, FitnessClass, BillingPayment, Admin, Trainer, Member
+from models.records import AdminRecord, RoomRecord, RoomBookingRecord, EquipmentRecord, FitnessClassRecord, BillingRecord, Outcome
+import scheduling
+import identity
+import billing
+import occupancy
+from database import retry_on_conflict
+from pagination import keyset_pages, PAGE_SIZE
+import instrumentation
+
+# Writes, registrations and logins return an Outcome (models/records.py); terminal_UI prints the messages
 
 #Admin Management
 
 def register_admin(session: Session, name: str):
-    existing_member = session.query(Admin).filter_by(name=name).first()
+    existing_member = identity.find_admin(session, name)
     if existing_member:
-        print("Error: name must be unique!")
-    else:
-        admin = Admin(name=name)
-        session.add(admin)
-        session.commit()
-        print(f"{name} has successfully been registered as a admin.")
+        return Outcome(Outcome.CONFLICT, "Error: name must be unique!")
+    admin = Admin(name=name)
+    session.add(admin)
+    session.commit()
+    identity.invalidate("admin", "name", name)
+    return Outcome(Outcome.OK, f"{name} has successfully been registered as a admin.", admin)
 
 def login_admin(session: Session, name: str):
-    admin = session.query(Admin).filter(Admin.name == name).first()
+    admin = identity.find_admin(session, name)
     if admin:
-        print(f"Welcome back, {admin.name}!")
-        return admin
-    else:
-        print("Admin not found. Please register first.")
-        return None
+        return Outcome(Outcome.OK, f"Welcome back, {admin.name}!", admin)
+    return Outcome(Outcome.NOT_FOUND, "Admin not found. Please register first.")
     
-def view_admins(session: Session):
-    admins = session.query(Admin).all()
-    for admin in admins:
-        print(admin)
+def view_admins(session: Session, page_size: int = PAGE_SIZE, after: tuple = None):
+    stmt = select(Admin.admin_id, Admin.name)
+    return keyset_pages(session, stmt, [Admin.admin_id], page_size, after, AdminRecord)
 
 # Room Management
 
-def view_rooms(session: Session):
-    rooms = session.query(Room).all()
-    for room in rooms:
-        print(room)
-
-def view_room_bookings(session: Session):
-    bookings = session.query(RoomBooking).all()
-    for booking in bookings:
-        print(booking)
-
-def room_booking(session: Session, admin: Admin, room_name: str, start_date: str, start_time: str, end_date: str, end_time: str):
-    # - date in "YYYY-MM-DD"
-    # - time in "HH:MM"
-    start_dt = datetime.datetime.strptime(f"{start_date} {start_time}", "%Y-%m-%d %H:%M")
-    end_dt = datetime.datetime.strptime(f"{end_date} {end_time}", "%Y-%m-%d %H:%M")
-
+def view_rooms(session: Session, page_size: int = PAGE_SIZE, after: tuple = None):
+    stmt = select(Room.room_id, Room.room_name)
+    return keyset_pages(session, stmt, [Room.room_id], page_size, after, RoomRecord)
+
+def view_room_bookings(session: Session, page_size: int = PAGE_SIZE, after: tuple = None, start=None, end=None, room_name: str = None, is_booked: bool = None):
+    # Ordered by start time; start/end keep bookings that overlap [start, end)
+    stmt = select(RoomBooking.booking_id, RoomBooking.room_id, Room.room_name, RoomBooking.is_booked,
+                  RoomBooking.start_time, RoomBooking.end_time).join(Room, Room.room_id == RoomBooking.room_id)
+    if start:
+        stmt = stmt.where(RoomBooking.end_time > start)
+    if end:
+        stmt = stmt.where(RoomBooking.start_time < end)
+    if room_name:
+        stmt = stmt.where(Room.room_name == room_name)
+    if is_booked is not None:
+        stmt = stmt.where(RoomBooking.is_booked == is_booked)
+    return keyset_pages(session, stmt, [RoomBooking.start_time, RoomBooking.booking_id], page_size, after, RoomBookingRecord)
+
+def _reserve_room(session: Session, admin: Admin, room_name: str, start_dt: datetime.datetime, end_dt: datetime.datetime, is_booked: bool):
+    # Adds the booking to the session without committing; None if any booking of the room overlaps.
+    # A booking racing in after the probe fails the insert (ex_roombooking_room_overlap) at commit.
     room = session.query(Room).filter(Room.room_name == room_name).first()
     if not room:
         room = Room(room_name = room_name)
         session.add(room)
         session.flush()
 
-    conflict = session.query(RoomBooking).filter(
-        RoomBooking.room_id == room.room_id, or_(RoomBooking.is_booked == True, and_(RoomBooking.start_time < end_dt, RoomBooking.end_time > start_dt))).first()
+    # Range-overlap probe over the room's bookings, free slots included, as the constraint checks
+    conflict = session.query(RoomBooking.booking_id).filter(
+        RoomBooking.room_id == room.room_id,
+        func.tsrange(RoomBooking.start_time, RoomBooking.end_time).op("&&")(func.tsrange(start_dt, end_dt))).first()
     if conflict:
         return None
 
-    booking = RoomBooking(admin = admin, room = room, is_booked = False, start_time = start_dt, end_time = end_dt)
+    booking = RoomBooking(admin = admin, room = room, is_booked = is_booked, start_time = start_dt, end_time = end_dt)
     session.add(booking)
-    session.commit()
     return booking
 
+def room_booking(session: Session, admin: Admin, room_name: str, start_date: str, start_time: str, end_date: str, end_time: str):
+    # - date in "YYYY-MM-DD"
+    # - time in "HH:MM"
+    start_dt = datetime.datetime.strptime(f"{start_date} {start_time}", "%Y-%m-%d %H:%M")
+    end_dt = datetime.datetime.strptime(f"{end_date} {end_time}", "%Y-%m-%d %H:%M")
+    if end_dt <= start_dt:
+        return Outcome(Outcome.INVALID, "Error: booking must end after it starts.")
+
+    booking = _reserve_room(session, admin, room_name, start_dt, end_dt, is_booked = False)
+    if not booking:
+        return Outcome(Outcome.CONFLICT, "Error: the room is already booked for part of that time.")
+    try:
+        session.commit()
+    except IntegrityError:
+        # Another booking for the room landed between the probe and the insert
+        session.rollback()
+        return Outcome(Outcome.CONFLICT, "Error: the room is already booked for part of that time.")
+    return Outcome(Outcome.OK, "Room booked.", booking)
+
+def room_utilization(session: Session, start: datetime.datetime, end: datetime.datetime, room_ids: list = None):
+    # Occupancy heatmap by hour of the week over [start, end), cached until bookings change (app/occupancy.py);
+    # None for an empty range
+    if end <= start:
+        return None
+    return occupancy.room_occupancy(session, start, end, room_ids)
+
 # Equipment Maintenance
 
-def view_equipment_maintenance(admin: Admin):
-    maintenances = sorted(admin.equipment_operations, key=lambda m: m.equipment_id, reverse=True)
-    for maintenance in maintenances:
-        print(maintenance)
+def view_equipment_maintenance(session: Session, admin: Admin = None, page_size: int = PAGE_SIZE, after: tuple = None):
+    # Every admin's records, or just `admin`'s
+    stmt = select(EquipmentManagement.equipment_id, EquipmentManagement.admin_id, EquipmentManagement.admin_operation, EquipmentManagement.status)
+    if admin:
+        stmt = stmt.where(EquipmentManagement.admin_id == admin.admin_id)
+    return keyset_pages(session, stmt, [EquipmentManagement.equipment_id], page_size, after, EquipmentRecord)
 
 def add_equipment_maintenance(session: Session, admin: Admin, operation: str, status = "open"):
     em = EquipmentManagement(admin = admin, admin_operation = operation, status = status)
     session.add(em)
     session.commit()
-    print(f"Equipment maintenance record created (id: {em.equipment_id})")
+    return Outcome(Outcome.OK, f"Equipment maintenance record created (id: {em.equipment_id})", em)
 
 def edit_equipment_maintenance(session: Session, equipment_id: int, status: str):
     em = session.query(EquipmentManagement).filter(EquipmentManagement.equipment_id == equipment_id).first()
     if not em:
-        print("Error: Equipment maintenance record not found.")
-        return None
+        return Outcome(Outcome.NOT_FOUND, "Error: Equipment maintenance record not found.")
     em.status = status
     session.commit()
-    print(f"Equipment maintenance record {equipment_id} updated.")
+    return Outcome(Outcome.OK, f"Equipment maintenance record {equipment_id} updated.", em)
 
 # Fitness classes
 
-def view_fitness_classes(session: Session):
-    all_classes = []
-    room_bookings = session.query(RoomBooking).all()
-    for room_booking in room_bookings:
-        for fitness_class in room_booking.fitness_classes:
-            all_classes.append(fitness_class)
-    all_classes.sort(key=lambda fitness_class: fitness_class.class_name)
-    
-    for fitness_class in all_classes:
-        print(fitness_class)
-
+def view_fitness_classes(session: Session, page_size: int = PAGE_SIZE, after: tuple = None):
+    # By class name, with trainer, room and times joined in
+    stmt = (select(FitnessClass.class_id, FitnessClass.class_name, Trainer.name.label("trainer_name"), Room.room_name,
+                   RoomBooking.start_time, RoomBooking.end_time, FitnessClass.capacity, FitnessClass.num_signed_up)
+            .join(Trainer, Trainer.trainer_id == FitnessClass.trainer_id)
+            .join(RoomBooking, RoomBooking.booking_id == FitnessClass.booking_id)
+            .join(Room, Room.room_id == RoomBooking.room_id))
+    return keyset_pages(session, stmt, [FitnessClass.class_name, FitnessClass.class_id], page_size, after, FitnessClassRecord)
+
+# Starts over if the trainer is booked elsewhere meanwhile (app/database.py); a room taken
+# meanwhile fails the booking insert instead
+@retry_on_conflict()
 def add_fitness_class(session: Session, admin: Admin, trainer: Trainer, class_name: str, capacity: int, room_name: str, start_date: str, start_time: str, end_date: str, end_time: str):
     if session.query(Room).filter(Room.room_name == room_name).first() is None:
-        print("Error: Room not found.")
-        return None
-    rb = room_booking(session, admin, room_name, start_date, start_time, end_date, end_time)
-    if not rb:
-        print("Error: Room booking failed.")
-        return None
-
-    try:
-        rb.is_booked = True
-        session.flush()
-    except Exception as e:
-        session.rollback()
-        print("Error marking room booking as booked:", e)
-        return None
-    
+        return Outcome(Outcome.NOT_FOUND, "Error: Room not found.")
     if not trainer:
-        print("Error: Trainer not found.")
-        return None
-    
+        return Outcome(Outcome.NOT_FOUND, "Error: Trainer not found.")
+
     start_dt = datetime.datetime.strptime(f"{start_date} {start_time}", "%Y-%m-%d %H:%M")
     end_dt = datetime.datetime.strptime(f"{end_date} {end_time}", "%Y-%m-%d %H:%M")
-
-    # 4) Check trainer availability for that whole time window
-    for availability in trainer.availability:
-        if availability.start_time <= start_dt and availability.end_time >= end_dt:
-            break
-    else:
-        print("Trainer is not available for that booking time.")
-        return None
-
-    # 5) Check for conflicts with other PT sessions
-    for training_session in trainer.sessions:
-        other = training_session.booking
-        if other.start_time < end_dt and other.end_time > start_dt:
-            print("Trainer already has another PT session at that time.")
-            return None
-
-    # 6) Check for conflicts with fitness classes
-    for fitness_class in trainer.classes:
-        other = fitness_class.booking
-        if other.start_time < end_dt and other.end_time > start_dt:
-            print("Trainer is teaching a class at that time.")
-            return None
+    if end_dt <= start_dt:
+        return Outcome(Outcome.INVALID, "Error: booking must end after it starts.")
+
+    # Check the trainer before reserving the room so a busy trainer doesn't leave a stray booking
+    seen = scheduling.schedule_version(session, trainer.trainer_id)
+    reason = scheduling.trainer_conflict(session, trainer.trainer_id, start_dt, end_dt)
+    if reason:
+        return Outcome(Outcome.CONFLICT, reason)
+    scheduling.claim_trainer(session, trainer.trainer_id, seen)
+
+    # Room, booking and class commit together, so a lost race leaves no stray booking behind
+    rb = _reserve_room(session, admin, room_name, start_dt, end_dt, is_booked = True)
+    if not rb:
+        # Undo the trainer claim (and any Room just added) rather than leave it for the caller's commit
+        session.rollback()
+        return Outcome(Outcome.CONFLICT, "Error: Room booking failed.")
 
     fc = FitnessClass(trainer = trainer, booking = rb, class_name = class_name, capacity = capacity, num_signed_up = 0)
     session.add(fc)
-    session.commit()
-    print(f"Fitness class '{class_name}' added successfully.")
-    return fc
+    try:
+        session.commit()
+    except IntegrityError:
+        session.rollback()
+        return Outcome(Outcome.CONFLICT, "Error: Room booking failed.")
+    return Outcome(Outcome.OK, f"Fitness class '{class_name}' added successfully.", fc)
 
 def billing_and_payments(session: Session, action="create", member: Member = None, type_of_billing=None, amount=None, billing_id=None, payment_method=None):
-    if action == "create" and member:
-        bp = BillingPayment(member=member, type_of_billing=type_of_billing, amount_due=amount, status="due")
+    if action == "create":
+        if not member:
+            return Outcome(Outcome.NOT_FOUND, "Error: Member not found.")
+        if amount is None or amount < 0:
+            return Outcome(Outcome.INVALID, "Error: amount must be zero or more.")
+        bp = BillingPayment(member=member, type_of_billing=type_of_billing, amount_due=amount, status=billing.STATUS_DUE)
         session.add(bp)
         session.commit()
-        return bp
+        return Outcome(Outcome.OK, "Invoice created.", bp)
     elif action == "pay":
         bp = session.query(BillingPayment).filter_by(billing_id=billing_id).first()
         if not bp:
-            return None
+            return Outcome(Outcome.NOT_FOUND, "Error: Billing record not found.")
+        if bp.status == billing.STATUS_PAID:
+            return Outcome(Outcome.OK, "Already paid; the original payment stands.", bp)
+        if not payment_method:
+            return Outcome(Outcome.INVALID, "Error: payment method is required.")
         bp.payment_method = payment_method
-        bp.status = "paid"
+        bp.status = billing.STATUS_PAID
+        bp.paid_at = datetime.datetime.now()
         session.commit()
-        return bp
-    return None
-
-def view_billings(session: Session):
-    billings = session.query(BillingPayment).all()
-    for billing in billings:
-        print(billing)
+        return Outcome(Outcome.OK, "Payment recorded.", bp)
+    return Outcome(Outcome.INVALID, f"Error: unknown billing action {action!r}.")
+
+def view_billings(session: Session, page_size: int = PAGE_SIZE, after: tuple = None, status: str = None, member_id: int = None):
+    stmt = select(BillingPayment.billing_id, BillingPayment.member_id, BillingPayment.type_of_billing,
+                  BillingPayment.amount_due, BillingPayment.status, BillingPayment.payment_method)
+    if status:
+        stmt = stmt.where(BillingPayment.status == billing.normalize_status(status))
+    if member_id:
+        stmt = stmt.where(BillingPayment.member_id == member_id)
+    return keyset_pages(session, stmt, [BillingPayment.billing_id], page_size, after, BillingRecord)
+
+# Every public function above is a traced operation (app/instrumentation.py)
+instrumentation.trace_module(sys.modules[__name__])
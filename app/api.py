@@ -0,0 +1,528 @@
+from flask import Flask, Blueprint, g, request, jsonify, abort, current_app
+from werkzeug.exceptions import HTTPException
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.exc import DataError, IntegrityError, OperationalError
+from sqlalchemy.engine import Engine
+from sqlalchemy import inspect
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+import hmac
+import json
+import math
+import sys, os
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from models.schemas import Base, Member, Trainer, Admin, RoomBooking, FitnessClass, TrainingSession
+from models.records import GoalRecord, Outcome
+from pagination import PAGE_SIZE
+import member_functions
+import trainer_functions
+import admin_functions
+import billing
+import recurrence
+import slot_finder
+import database
+import migrations
+
+# HTTP JSON API over member_functions / trainer_functions / admin_functions, for the front desk,
+# trainer tablets and the member app at once. Every request gets its own Session from the
+# process's pooled engine (closed, and rolled back if uncommitted, when the request ends); the
+# domain functions commit their own work exactly as they do under the terminal UI.
+# Writes return an Outcome (models/records.py) whose status picks the HTTP code (OUTCOME_STATUS);
+# its message is the error, or the one entry in "messages" on success.
+# Every blueprint route needs a token (Authorization: Bearer <token>, or X-API-Token): API_TOKEN
+# for the member and trainer routes, API_ADMIN_TOKEN for those and the admin and billing routes.
+# Run it under gunicorn (see gunicorn.conf.py):  gunicorn -c gunicorn.conf.py wsgi:app
+
+MAX_PAGE_SIZE = 500
+MAX_SLOTS = 1000
+MAX_UTILIZATION_DAYS = 3 * 366
+
+# Request plumbing
+
+def _session() -> Session:
+    if "db_session" not in g:
+        g.db_session = current_app.extensions["sessionmaker"]()
+    return g.db_session
+
+def _close_session(exc=None):
+    session = g.pop("db_session", None)
+    if session is not None:
+        session.close()
+
+def _body():
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        abort(400, "Expected a JSON object body.")
+    return body
+
+def _required(body: dict, *names):
+    missing = [name for name in names if body.get(name) in (None, "")]
+    if missing:
+        abort(400, f"Missing {', '.join(missing)}.")
+    return [body[name] for name in names]
+
+def _parse(value, parse, name):
+    if value in (None, ""):
+        return None
+    try:
+        return parse(value)
+    except (TypeError, ValueError):
+        abort(400, f"Invalid {name}: {value!r}.")
+
+def _datetime(value, name):
+    return _parse(value, datetime.fromisoformat, name)
+
+def _date(value, name):
+    return _parse(value, date.fromisoformat, name)
+
+def _int(value, name):
+    if isinstance(value, float) and not value.is_integer():
+        abort(400, f"Invalid {name}: {value!r}.")  # int() would truncate it
+    return _parse(value, int, name)
+
+def _float(value, name):
+    number = _parse(value, float, name)
+    if number is not None and not math.isfinite(number):
+        abort(400, f"Invalid {name}: {value!r}.")
+    return number
+
+def _bool(value, name):
+    if value is None or isinstance(value, bool):
+        return value
+    lowered = str(value).strip().lower()
+    if lowered == "":
+        return None
+    if lowered in ("true", "1", "yes"):
+        return True
+    if lowered in ("false", "0", "no"):
+        return False
+    abort(400, f"Invalid {name}: {value!r}.")
+
+def _get(model, ident):
+    obj = _session().get(model, ident)
+    if obj is None:
+        abort(404, f"{model.__name__} {ident} not found.")
+    return obj
+
+def _to_json(value):
+    if isinstance(value, float) and value != value:
+        return None  # NaN (e.g. no readings in a window) isn't valid JSON
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    if isinstance(value, np.generic):
+        return _to_json(value.item())
+    if hasattr(value, "_asdict"):  # NamedTuple records and result rows
+        return {key: _to_json(item) for key, item in value._asdict().items()}
+    if isinstance(value, Base):
+        return {attr.key: _to_json(getattr(value, attr.key)) for attr in inspect(value).mapper.column_attrs}
+    if isinstance(value, dict):
+        return {key: _to_json(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return [_to_json(item) for item in value]
+    raise TypeError(f"Can't serialize {type(value).__name__}")
+
+def _ok(value, status=200, messages=None):
+    payload = _to_json(value)
+    if messages:
+        payload = {"result": payload, "messages": messages}
+    return jsonify(payload), status
+
+OUTCOME_STATUS = {Outcome.OK: 200, Outcome.NOT_FOUND: 404, Outcome.INVALID: 400, Outcome.CONFLICT: 409}
+
+def _outcome(outcome: Outcome, status=200, value=None):
+    # What was written (or `value` in its place) with `status`, or the outcome's error
+    if not outcome:
+        return jsonify({"error": outcome.message, "status": outcome.status}), OUTCOME_STATUS[outcome.status]
+    return _ok(outcome.value if value is None else value, status, [outcome.message])
+
+# Listings: one keyset page per request. ?after= is the JSON "after" of the previous page.
+
+def _page_args():
+    page_size = min(_int(request.args.get("page_size"), "page_size") or PAGE_SIZE, MAX_PAGE_SIZE)
+    after = request.args.get("after")
+    if after:
+        try:
+            after = tuple(json.loads(after))
+        except (ValueError, TypeError):
+            abort(400, "Invalid after: pass back the previous page's \"after\".")
+    return page_size, after or None
+
+def _first_page(pages):
+    page = next(pages, None)
+    if page is None:
+        return _ok({"rows": [], "after": None})
+    return _ok({"rows": page.rows, "after": page.after})
+
+members = Blueprint("members", __name__)
+trainers = Blueprint("trainers", __name__)
+admins = Blueprint("admins", __name__)
+
+# Members
+
+@members.get("/members")
+def list_members():
+    page_size, after = _page_args()
+    return _first_page(member_functions.view_members(_session(), page_size, after, request.args.get("name")))
+
+@members.post("/members")
+def register_member():
+    body = _body()
+    name, contact = _required(body, "name", "contact_detail")
+    return _outcome(member_functions.register_member(_session(), name, _date(body.get("date_of_birth"), "date_of_birth"),
+                                                     body.get("gender"), contact), 201)
+
+@members.get("/members/<int:member_id>")
+def get_member(member_id):
+    return _ok(_get(Member, member_id))
+
+@members.patch("/members/<int:member_id>")
+def update_member(member_id):
+    body = _body()
+    return _outcome(member_functions.update_personal_details(_session(), _get(Member, member_id), body.get("name"),
+                                                             _date(body.get("date_of_birth"), "date_of_birth"), body.get("gender"),
+                                                             body.get("contact_detail")))
+
+@members.get("/members/<int:member_id>/dashboard")
+def member_dashboard(member_id):
+    return _ok(member_functions.dashboard(_session(), _get(Member, member_id)))
+
+@members.get("/members/<int:member_id>/health-metrics")
+def list_health_metrics(member_id):
+    page_size, after = _page_args()
+    pages = member_functions.view_health_metrics(_session(), _get(Member, member_id), page_size, after,
+                                                 _datetime(request.args.get("start"), "start"), _datetime(request.args.get("end"), "end"))
+    return _first_page(pages)
+
+@members.post("/members/<int:member_id>/health-metrics")
+def add_health_metric(member_id):
+    body = _body()
+    member = _get(Member, member_id)
+    recorded = _datetime(body.get("date_recorded"), "date_recorded") or datetime.now()
+    return _outcome(member_functions.input_health_metric(_session(), member, recorded, _float(body.get("weight"), "weight"),
+                                                         _float(body.get("height"), "height"), _int(body.get("heart_rate"), "heart_rate")), 201)
+
+@members.get("/members/<int:member_id>/health-trend")
+def health_trend(member_id):
+    _get(Member, member_id)
+    period = request.args.get("period", "week")
+    if period not in ("day", "week"):
+        abort(400, "period must be day or week.")
+    return _ok(member_functions.health_trend(_session(), member_id, period, _date(request.args.get("start"), "start"),
+                                             _date(request.args.get("end"), "end"), _int(request.args.get("limit"), "limit")))
+
+@members.get("/members/<int:member_id>/goals")
+def list_goals(member_id):
+    return _ok(member_functions.view_fitness_goals(_session(), _get(Member, member_id)))
+
+@members.post("/members/<int:member_id>/goals")
+def add_goal(member_id):
+    description, target = _required(_body(), "description", "target")
+    return _outcome(member_functions.add_fitness_goals(_session(), _get(Member, member_id), description, target), 201,
+                    GoalRecord(description, target))
+
+@members.patch("/members/<int:member_id>/goals/<int:number>")
+def update_goal(member_id, number):
+    # number: 1-based position in the member's goal list, as the terminal UI shows it
+    target, = _required(_body(), "target")
+    return _outcome(member_functions.update_fitness_goals(_session(), number, _get(Member, member_id), None, target), 200,
+                    {"goal": number, "target": target})
+
+@members.get("/members/<int:member_id>/pt-sessions")
+def list_pt_sessions(member_id):
+    return _ok(member_functions.view_pt_sessions(_session(), _get(Member, member_id)))
+
+@members.post("/members/<int:member_id>/pt-sessions")
+def book_pt_session(member_id):
+    trainer_id, booking_id = _required(_body(), "trainer_id", "booking_id")
+    return _outcome(member_functions.book_pt_session(_session(), _get(Member, member_id), _get(Trainer, _int(trainer_id, "trainer_id")),
+                                                     _get(RoomBooking, _int(booking_id, "booking_id"))), 201)
+
+@members.patch("/members/<int:member_id>/pt-sessions/<int:session_id>")
+def reschedule_pt_session(member_id, session_id):
+    body = _body()
+    booking_id, = _required(body, "booking_id")
+    trainer = _get(Trainer, _int(body["trainer_id"], "trainer_id")) if body.get("trainer_id") else None
+    return _outcome(member_functions.reschedule_pt_session(_session(), _get(Member, member_id), _get(TrainingSession, session_id),
+                                                           _get(RoomBooking, _int(booking_id, "booking_id")), trainer))
+
+@members.get("/classes/available")
+def available_classes():
+    page_size, after = _page_args()
+    days = _int(request.args.get("days"), "days") or 14
+    return _first_page(member_functions.view_available_classes(_session(), page_size, after, days))
+
+@members.post("/members/<int:member_id>/classes")
+def register_for_class(member_id):
+    class_id, = _required(_body(), "class_id")
+    return _outcome(member_functions.class_registration(_session(), _get(Member, member_id), _get(FitnessClass, _int(class_id, "class_id"))),
+                    201, {"member_id": member_id, "class_id": int(class_id)})
+
+@members.get("/room-bookings")
+def list_room_bookings():
+    page_size, after = _page_args()
+    args = request.args
+    return _first_page(admin_functions.view_room_bookings(_session(), page_size, after, _datetime(args.get("start"), "start"),
+                                                          _datetime(args.get("end"), "end"), args.get("room_name"),
+                                                          _bool(args.get("is_booked"), "is_booked")))
+
+# Trainers
+
+@trainers.get("/trainers")
+def list_trainers():
+    page_size, after = _page_args()
+    return _first_page(trainer_functions.view_trainers(_session(), page_size, after))
+
+@trainers.post("/trainers")
+def register_trainer():
+    name, = _required(_body(), "name")
+    return _outcome(trainer_functions.register_trainer(_session(), name), 201)
+
+@trainers.get("/trainers/<int:trainer_id>/availability")
+def trainer_availability(trainer_id):
+    _get(Trainer, trainer_id)
+    start = _datetime(request.args.get("start"), "start") or datetime.now().replace(second=0, microsecond=0)
+    days = _int(request.args.get("days"), "days") or trainer_functions.AVAILABILITY_DAYS
+    windows = recurrence.trainer_windows(_session(), trainer_id, start, start + timedelta(days=days))
+    return _ok([{"start_time": s, "end_time": e} for s, e in windows.intervals()])
+
+@trainers.post("/trainers/<int:trainer_id>/availability")
+def add_availability(trainer_id):
+    body = _body()
+    start_time, end_time = _required(body, "start_time", "end_time")
+    _datetime(start_time, "start_time"), _datetime(end_time, "end_time"), _date(body.get("repeat_until"), "repeat_until")
+    return _outcome(trainer_functions.set_availability(_session(), _get(Trainer, trainer_id), start_time, end_time,
+                                                       bool(_bool(body.get("is_recurring"), "is_recurring")), body.get("recurrence"),
+                                                       body.get("repeat_until")), 201)
+
+@trainers.post("/trainers/<int:trainer_id>/availability/<int:availability_id>/skips")
+def skip_availability(trainer_id, availability_id):
+    day, = _required(_body(), "date")
+    _date(day, "date")
+    return _outcome(trainer_functions.skip_availability(_session(), _get(Trainer, trainer_id), availability_id, day), 201,
+                    {"availability_id": availability_id, "skipped": day})
+
+@trainers.get("/trainers/<int:trainer_id>/schedule")
+def trainer_schedule(trainer_id):
+    return _ok(trainer_functions.schedule_view(_session(), _get(Trainer, trainer_id)))
+
+@trainers.get("/members/lookup")
+def member_lookup():
+    name = request.args.get("name")
+    if not name:
+        abort(400, "Missing name.")
+    # What the terminal shows a trainer: goals, latest metric and weekly trend, not the member's dashboard
+    lookup = trainer_functions.member_lookup(_session(), name)
+    if lookup is None:
+        abort(404, "Member not found.")
+    return _ok(lookup)
+
+@trainers.get("/pt-slots")
+def pt_slots():
+    args = request.args
+    start = _datetime(args.get("start"), "start") or datetime.now().replace(second=0, microsecond=0)
+    end = _datetime(args.get("end"), "end") or start + timedelta(days=7)
+    duration = timedelta(minutes=_int(args.get("duration_minutes"), "duration_minutes") or 60)
+    if end <= start or end - start > timedelta(days=62):
+        abort(400, "end must be after start and at most 62 days later.")
+    slots = slot_finder.find_slots(_session(), start, end, duration, _int(args.get("trainer_id"), "trainer_id"))
+    return _ok([row for row, _ in zip(slots.rows(), range(MAX_SLOTS))])
+
+@trainers.get("/pt-slots/bookable")
+def bookable_pt_slots():
+    args = request.args
+    start = _datetime(args.get("start"), "start") or datetime.now().replace(second=0, microsecond=0)
+    end = _datetime(args.get("end"), "end") or start + timedelta(days=1)
+    if end <= start or end - start > timedelta(days=62):
+        abort(400, "end must be after start and at most 62 days later.")
+    options = slot_finder.bookable_slots(_session(), start, end, _int(args.get("trainer_id"), "trainer_id"))
+    return _ok([row for row, _ in zip(options.rows(_session()), range(MAX_SLOTS))])
+
+@trainers.get("/health-stats")
+def health_stats():
+    stats = trainer_functions.club_health_stats(_session())
+    return _ok([row for row, _ in zip(stats.rows(), range(MAX_SLOTS))])
+
+# Admins
+
+@admins.get("/admins")
+def list_admins():
+    page_size, after = _page_args()
+    return _first_page(admin_functions.view_admins(_session(), page_size, after))
+
+@admins.post("/admins")
+def register_admin():
+    name, = _required(_body(), "name")
+    return _outcome(admin_functions.register_admin(_session(), name), 201)
+
+@admins.get("/rooms")
+def list_rooms():
+    page_size, after = _page_args()
+    return _first_page(admin_functions.view_rooms(_session(), page_size, after))
+
+@admins.post("/room-bookings")
+def book_room():
+    body = _body()
+    admin_id, room_name, start, end = _required(body, "admin_id", "room_name", "start_time", "end_time")
+    start, end = _datetime(start, "start_time"), _datetime(end, "end_time")
+    return _outcome(admin_functions.room_booking(_session(), _get(Admin, _int(admin_id, "admin_id")), room_name,
+                                                 f"{start:%Y-%m-%d}", f"{start:%H:%M}", f"{end:%Y-%m-%d}", f"{end:%H:%M}"), 201)
+
+@admins.get("/room-utilization")
+def room_utilization():
+    args = request.args
+    end = _datetime(args.get("end"), "end") or datetime.now()
+    start = _datetime(args.get("start"), "start") or end - timedelta(days=365)
+    if end <= start or end - start > timedelta(days=MAX_UTILIZATION_DAYS):
+        abort(400, f"end must be after start and at most {MAX_UTILIZATION_DAYS} days later.")
+    room_ids = [_int(value, "room_id") for value in args.getlist("room_id")] or None
+    result = admin_functions.room_utilization(_session(), start, end, room_ids)
+    return _ok({"start": result.start, "end": result.end, "rooms": list(result.room_rows()),
+                "heatmap": result.heatmap().round(2).tolist(), "peak_hours": result.peak_hours(_int(args.get("top"), "top") or 10)})
+
+@admins.get("/equipment")
+def list_equipment():
+    page_size, after = _page_args()
+    admin_id = _int(request.args.get("admin_id"), "admin_id")
+    admin = _get(Admin, admin_id) if admin_id else None
+    return _first_page(admin_functions.view_equipment_maintenance(_session(), admin, page_size, after))
+
+@admins.post("/equipment")
+def add_equipment():
+    body = _body()
+    admin_id, operation = _required(body, "admin_id", "operation")
+    return _outcome(admin_functions.add_equipment_maintenance(_session(), _get(Admin, _int(admin_id, "admin_id")), operation,
+                                                              body.get("status") or "open"), 201)
+
+@admins.patch("/equipment/<int:equipment_id>")
+def edit_equipment(equipment_id):
+    status, = _required(_body(), "status")
+    return _outcome(admin_functions.edit_equipment_maintenance(_session(), equipment_id, status))
+
+@admins.get("/classes")
+def list_classes():
+    page_size, after = _page_args()
+    return _first_page(admin_functions.view_fitness_classes(_session(), page_size, after))
+
+@admins.post("/classes")
+def add_class():
+    body = _body()
+    admin_id, trainer_id, class_name, capacity, room_name, start, end = _required(
+        body, "admin_id", "trainer_id", "class_name", "capacity", "room_name", "start_time", "end_time")
+    start, end = _datetime(start, "start_time"), _datetime(end, "end_time")
+    return _outcome(admin_functions.add_fitness_class(_session(), _get(Admin, _int(admin_id, "admin_id")),
+                                                      _get(Trainer, _int(trainer_id, "trainer_id")), class_name, _int(capacity, "capacity"),
+                                                      room_name, f"{start:%Y-%m-%d}", f"{start:%H:%M}", f"{end:%Y-%m-%d}", f"{end:%H:%M}"), 201)
+
+@admins.get("/members/<int:member_id>/balance")
+def member_balance(member_id):
+    _get(Member, member_id)
+    return _ok(billing.member_balance(_session(), member_id))
+
+@admins.get("/billings")
+def list_billings():
+    page_size, after = _page_args()
+    return _first_page(admin_functions.view_billings(_session(), page_size, after, request.args.get("status"),
+                                                     _int(request.args.get("member_id"), "member_id")))
+
+@admins.post("/billings")
+def create_billing():
+    body = _body()
+    member_id, type_of_billing, amount = _required(body, "member_id", "type_of_billing", "amount")
+    return _outcome(admin_functions.billing_and_payments(_session(), action="create", member=_get(Member, _int(member_id, "member_id")),
+                                                        type_of_billing=type_of_billing, amount=_float(amount, "amount")), 201)
+
+@admins.post("/billings/<int:billing_id>/pay")
+def pay_billing(billing_id):
+    payment_method, = _required(_body(), "payment_method")
+    return _outcome(admin_functions.billing_and_payments(_session(), action="pay", billing_id=billing_id, payment_method=payment_method))
+
+@admins.post("/billing-cycles")
+def billing_cycle():
+    body = _body()
+    period = _date(body.get("period"), "period") or date.today()
+    report = billing.run_billing_cycle(_session(), period, _float(body.get("amount"), "amount") or billing.MEMBERSHIP_FEE,
+                                       body.get("type_of_billing") or billing.MEMBERSHIP, bool(_bool(body.get("dry_run"), "dry_run")))
+    return _ok(report, 200 if report.dry_run else 201)
+
+@admins.get("/revenue")
+def revenue():
+    args = request.args
+    today = date.today()
+    start = _date(args.get("start"), "start") or date(today.year, 1, 1)
+    end = _date(args.get("end"), "end") or today + timedelta(days=1)
+    period = args.get("period", "month")
+    if period not in ("day", "month"):
+        abort(400, "period must be day or month.")
+    return _ok(billing.revenue(_session(), start, end, period, args.get("type_of_billing")))
+
+def _request_token():
+    header = request.headers.get("Authorization", "")
+    if header.startswith("Bearer "):
+        return header[len("Bearer "):].strip()
+    return request.headers.get("X-API-Token", "")
+
+def _authenticate():
+    # Before every blueprint route; /health stays open for load balancer probes
+    if request.blueprint is None:
+        return
+    token = _request_token().encode()
+    is_admin = hmac.compare_digest(token, current_app.config["API_ADMIN_TOKEN"].encode())
+    if not is_admin and not hmac.compare_digest(token, current_app.config["API_TOKEN"].encode()):
+        abort(401, "Missing or invalid API token.")
+    if request.blueprint == admins.name and not is_admin:
+        abort(403, "Admin and billing operations need the admin token.")
+
+def _health():
+    return _ok({"ok": True, "pool": database.pool_snapshot(current_app.extensions["engine"]), "retries": database.retry_snapshot()})
+
+def _http_error(error: HTTPException):
+    return jsonify({"error": error.description}), error.code
+
+def _integrity_error(error: IntegrityError):
+    _close_session()
+    return jsonify({"error": "Conflicts with existing data.", "detail": str(error.orig).strip()}), 409
+
+def _data_error(error: DataError):
+    # A value the column type rejects (out of range, too long) that got past request parsing
+    _close_session()
+    return jsonify({"error": "Invalid value.", "detail": str(error.orig).strip()}), 400
+
+def _database_unavailable(error: OperationalError):
+    _close_session()
+    return jsonify({"error": "Database unavailable or timed out; try again."}), 503
+
+def create_app(engine: Engine = None, migrate: bool = True, api_token: str = None, admin_token: str = None):
+    # One app (and one pooled engine) per worker process
+    api_token = api_token or os.environ.get("API_TOKEN")
+    admin_token = admin_token or os.environ.get("API_ADMIN_TOKEN")
+    if not api_token or not admin_token or api_token == admin_token:
+        raise RuntimeError("Set API_TOKEN and API_ADMIN_TOKEN (to different values) before starting the API.")
+    engine = engine or database.get_engine()
+    if migrate:
+        migrations.migrate(engine, progress=None)
+        migrations.maintain(engine)
+
+    app = Flask(__name__)
+    app.extensions["engine"] = engine
+    app.extensions["sessionmaker"] = sessionmaker(bind=engine)
+    app.config.update(API_TOKEN=api_token, API_ADMIN_TOKEN=admin_token)
+    app.before_request(_authenticate)
+    app.teardown_appcontext(_close_session)
+    app.register_error_handler(HTTPException, _http_error)
+    app.register_error_handler(IntegrityError, _integrity_error)
+    app.register_error_handler(DataError, _data_error)
+    app.register_error_handler(OperationalError, _database_unavailable)
+    app.add_url_rule("/health", "health", _health)
+    for blueprint in (members, trainers, admins):
+        app.register_blueprint(blueprint)
+    return app
@@ -0,0 +1,175 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import text, select, func
+from typing import NamedTuple
+from datetime import date
+import argparse
+import sys, os
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from models.schemas import MemberBalance, LedgerDaily
+from models.records import BalanceRecord, RevenueRecord
+import database
+import instrumentation
+
+# Billing cycles: a period's invoices for every eligible member in one INSERT ... SELECT.
+# Each invoice carries idempotency_key = "<type>:<YYYY-MM>:<member_id>" (unique), and the insert
+# skips keys that already exist (ON CONFLICT DO NOTHING), so re-running a cycle, or two admins
+# running it at once, bills every member exactly once for the period.
+
+STATUS_DUE = "due"
+STATUS_PAID = "paid"
+
+MEMBERSHIP = "Membership"
+MEMBERSHIP_FEE = 49.99
+
+class BillingRunReport(NamedTuple):
+    period: date
+    type_of_billing: str
+    eligible: int
+    created: int
+    skipped: int  # already billed for this period
+    dry_run: bool
+    seconds: float
+
+    @property
+    def rows_per_second(self):
+        return self.eligible / self.seconds if self.seconds else 0.0
+
+# Every member is billed; add conditions here once memberships can lapse
+ELIGIBLE_SQL = """
+    SELECT member_id, :key_prefix || member_id AS idempotency_key FROM "Member"
+    WHERE CAST(:member_ids AS integer[]) IS NULL OR member_id = ANY(CAST(:member_ids AS integer[]))
+"""
+
+BILLING_CYCLE_SQL = text(f"""
+    WITH eligible AS ({ELIGIBLE_SQL}
+    ), inserted AS (
+        INSERT INTO "BillingPayment" (member_id, type_of_billing, amount_due, status, billing_period, idempotency_key)
+        SELECT member_id, :type_of_billing, :amount, :status, :period, idempotency_key FROM eligible
+        ON CONFLICT (idempotency_key) DO NOTHING
+        RETURNING 1
+    )
+    SELECT (SELECT count(*) FROM eligible) AS eligible, (SELECT count(*) FROM inserted) AS created
+""")
+
+DRY_RUN_SQL = text(f"""
+    WITH eligible AS ({ELIGIBLE_SQL}
+    )
+    SELECT count(*) AS eligible,
+           count(*) FILTER (WHERE NOT EXISTS (SELECT 1 FROM "BillingPayment" bp WHERE bp.idempotency_key = e.idempotency_key)) AS created
+    FROM eligible e
+""")
+
+def normalize_status(status: str):
+    # Older rows and imports used "Paid"/"Pending"; everything not paid is due
+    return STATUS_PAID if (status or "").strip().lower() == STATUS_PAID else STATUS_DUE
+
+def idempotency_key_prefix(type_of_billing: str, period: date):
+    return f"{type_of_billing.lower()}:{period:%Y-%m}:"
+
+def run_billing_cycle(session: Session, period: date, amount: float = MEMBERSHIP_FEE, type_of_billing: str = MEMBERSHIP, dry_run: bool = False, member_ids: list = None):
+    # period: any day of the month being billed. dry_run counts what would be created and writes nothing.
+    period = date(period.year, period.month, 1)
+    params = {
+        "key_prefix": idempotency_key_prefix(type_of_billing, period),
+        "member_ids": list(member_ids) if member_ids is not None else None,
+        "type_of_billing": type_of_billing,
+        "amount": amount,
+        "status": STATUS_DUE,
+        "period": period,
+    }
+    started = time.perf_counter()
+    row = session.execute(DRY_RUN_SQL if dry_run else BILLING_CYCLE_SQL, params).one()
+    if dry_run:
+        session.rollback()
+    else:
+        session.commit()
+    return BillingRunReport(period, type_of_billing, row.eligible, row.created, row.eligible - row.created, dry_run, time.perf_counter() - started)
+
+# Ledger summaries (MemberBalance / LedgerDaily, maintained by the triggers in sql/ledger.sql)
+
+def member_balance(session: Session, member_id: int):
+    # Front-desk balance check: one primary-key read (a plain row, never a stale identity-map copy);
+    # a member never billed owes nothing
+    row = session.execute(select(MemberBalance.member_id, MemberBalance.outstanding, MemberBalance.open_invoices,
+                                 MemberBalance.last_payment_at, MemberBalance.last_payment_amount)
+                          .where(MemberBalance.member_id == member_id)).one_or_none()
+    return BalanceRecord(*row) if row else BalanceRecord(member_id, 0, 0, None, None)
+
+def revenue(session: Session, start: date, end: date, period: str = "month", type_of_billing: str = None):
+    # Invoiced and paid totals per day or month in [start, end), by billing type
+    if period not in ("day", "month"):
+        raise ValueError(f"Unknown period {period!r}; expected 'day' or 'month'")
+    period_start = LedgerDaily.day if period == "day" else func.cast(func.date_trunc("month", LedgerDaily.day), LedgerDaily.day.type)
+    stmt = (select(period_start.label("period_start"), LedgerDaily.type_of_billing,
+                   func.sum(LedgerDaily.invoiced_count), func.sum(LedgerDaily.invoiced_amount),
+                   func.sum(LedgerDaily.paid_count), func.sum(LedgerDaily.paid_amount))
+            .where(LedgerDaily.day >= start, LedgerDaily.day < end)
+            .group_by(period_start, LedgerDaily.type_of_billing)
+            .order_by(period_start, LedgerDaily.type_of_billing))
+    if type_of_billing:
+        stmt = stmt.where(LedgerDaily.type_of_billing == type_of_billing)
+    return [RevenueRecord(*row) for row in session.execute(stmt)]
+
+class ReconcileReport(NamedTuple):
+    balance_mismatches: int
+    daily_mismatches: int
+    repaired: bool
+    seconds: float
+
+    @property
+    def consistent(self):
+        return self.balance_mismatches == 0 and self.daily_mismatches == 0
+
+# Rows that differ between the summaries and the raw BillingPayment rows. All-zero summary rows
+# (every invoice of a member or day deleted) count as absent.
+RECONCILE_SQL = text("""
+    WITH balance AS (
+        SELECT member_id, outstanding, open_invoices, last_payment_at, last_payment_amount FROM "MemberBalance"
+        WHERE open_invoices <> 0 OR outstanding <> 0 OR last_payment_at IS NOT NULL
+    ), expected_balance AS (
+        SELECT * FROM ledger_expected_balance
+        WHERE open_invoices <> 0 OR outstanding <> 0 OR last_payment_at IS NOT NULL
+    ), daily AS (
+        SELECT day, type_of_billing, invoiced_count, invoiced_amount, paid_count, paid_amount FROM "LedgerDaily"
+        WHERE invoiced_count <> 0 OR paid_count <> 0
+    )
+    SELECT
+        (SELECT count(*) FROM ((SELECT * FROM balance EXCEPT SELECT * FROM expected_balance)
+                               UNION ALL (SELECT * FROM expected_balance EXCEPT SELECT * FROM balance)) d) AS balance_mismatches,
+        (SELECT count(*) FROM ((SELECT * FROM daily EXCEPT SELECT * FROM ledger_expected_daily)
+                               UNION ALL (SELECT * FROM ledger_expected_daily EXCEPT SELECT * FROM daily)) d) AS daily_mismatches
+""")
+
+def reconcile(session: Session, repair: bool = False):
+    # Full scan of BillingPayment; repair rebuilds both summaries from the raw rows if they differ
+    started = time.perf_counter()
+    row = session.execute(RECONCILE_SQL).one()
+    repaired = False
+    if repair and (row.balance_mismatches or row.daily_mismatches):
+        session.execute(text("SELECT ledger_rebuild()"))
+        repaired = True
+    session.commit()
+    return ReconcileReport(row.balance_mismatches, row.daily_mismatches, repaired, time.perf_counter() - started)
+
+def main():
+    parser = argparse.ArgumentParser(description="Billing maintenance.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    reconcile_parser = subcommands.add_parser("reconcile", help="check MemberBalance / LedgerDaily against BillingPayment")
+    reconcile_parser.add_argument("--repair", action="store_true", help="rebuild the summaries if they differ")
+    args = parser.parse_args()
+
+    # A full scan can outlast the interactive statement_timeout
+    engine = database.make_engine(database.load_settings()._replace(statement_timeout_ms=0))
+    with Session(engine) as session:
+        report = reconcile(session, repair=args.repair)
+    print(f"{report.balance_mismatches} member balance and {report.daily_mismatches} daily ledger rows differ from BillingPayment"
+          f"{' (rebuilt)' if report.repaired else ''}; checked in {report.seconds:.1f} s")
+    sys.exit(0 if report.consistent or report.repaired else 1)
+
+# Every public function above is a traced operation (app/instrumentation.py)
+instrumentation.trace_module(sys.modules[__name__])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+from sqlalchemy.engine import Engine
+from typing import Iterable, NamedTuple
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import database
+
+# Bulk import through PostgreSQL COPY.
+# Each chunk is COPYed into a temporary staging table, then moved into the real
+# table with one INSERT ... SELECT that resolves foreign keys by natural key:
+#   member -> Member.contact_detail, room -> Room.room_name, trainer -> Trainer.name,
+#   admin -> Admin.name, booking/class -> (room_name, start_time)
+# Only one chunk is ever held in Python, so memory stays flat for any input size.
+# Rows whose keys don't resolve, or that hit a unique/exclusion constraint, are skipped.
+
+# First room / trainer with a given name wins when names repeat
+ROOMS_BY_NAME = '(SELECT DISTINCT ON (room_name) room_id, room_name FROM "Room" ORDER BY room_name, room_id)'
+TRAINERS_BY_NAME = '(SELECT DISTINCT ON (name) trainer_id, name FROM "Trainer" ORDER BY name, trainer_id)'
+
+IMPORT_SPECS = {
+    "Member": {
+        "columns": [("name", "varchar(100)"), ("date_of_birth", "date"), ("gender", "varchar(10)"), ("contact_detail", "varchar(255)")],
+        "insert": """
+            INSERT INTO "Member" (name, date_of_birth, gender, contact_detail)
+            SELECT name, date_of_birth, gender, contact_detail FROM {stage}
+            ON CONFLICT DO NOTHING
+        """,
+    },
+    "Trainer": {
+        "columns": [("name", "varchar(100)")],
+        "insert": """
+            INSERT INTO "Trainer" (name)
+            SELECT name FROM {stage}
+        """,
+    },
+    "Admin": {
+        "columns": [("name", "varchar(50)")],
+        "insert": """
+            INSERT INTO "Admin" (name)
+            SELECT name FROM {stage}
+            ON CONFLICT DO NOTHING
+        """,
+    },
+    "Room": {
+        "columns": [("room_name", "varchar(50)")],
+        "insert": """
+            INSERT INTO "Room" (room_name)
+            SELECT room_name FROM {stage}
+        """,
+    },
+    "HealthMetric": {
+        "columns": [("member_contact", "varchar(255)"), ("date_recorded", "timestamp"), ("weight", "numeric(5,2)"),
+                    ("height", "numeric(5,2)"), ("heart_rate", "integer")],
+        # Once before the import: drain HealthMetric_default and create the coming months' partitions
+        "before": "SELECT healthmetric_maintain_partitions()",
+        # Monthly partitions for the chunk's date range are created before it is inserted
+        "prepare": 'SELECT healthmetric_ensure_partitions(min(date_recorded), max(date_recorded)) FROM {stage}',
+        "insert": """
+            INSERT INTO "HealthMetric" (member_id, date_recorded, weight, height, heart_rate)
+            SELECT m.member_id, s.date_recorded, s.weight, s.height, s.heart_rate
+            FROM {stage} s
+            JOIN "Member" m ON m.contact_detail = s.member_contact
+        """,
+    },
+    "BillingPayment": {
+        "columns": [("member_contact", "varchar(255)"), ("type_of_billing", "varchar(50)"), ("amount_due", "numeric(10,2)"),
+                    ("status", "varchar(20)"), ("payment_method", "varchar(50)"), ("created_at", "timestamp"), ("paid_at", "timestamp")],
+        # Statuses are normalized like billing.normalize_status (anything but "paid" is due)
+        "insert": """
+            INSERT INTO "BillingPayment" (member_id, type_of_billing, amount_due, status, payment_method, created_at, paid_at)
+            SELECT m.member_id, s.type_of_billing, s.amount_due,
+                   CASE WHEN lower(trim(s.status)) = 'paid' THEN 'paid' ELSE 'due' END,
+                   s.payment_method, coalesce(s.created_at, localtimestamp), s.paid_at
+            FROM {stage} s
+            JOIN "Member" m ON m.contact_detail = s.member_contact
+        """,
+    },
+    "RoomBooking": {
+        "columns": [("admin_name", "varchar(50)"), ("room_name", "varchar(50)"), ("is_booked", "boolean"),
+                    ("start_time", "timestamp"), ("end_time", "timestamp")],
+        "insert": """
+            INSERT INTO "RoomBooking" (admin_id, room_id, is_booked, start_time, end_time)
+            SELECT a.admin_id, r.room_id, s.is_booked, s.start_time, s.end_time
+            FROM {stage} s
+            JOIN "Admin" a ON a.name = s.admin_name
+            JOIN """ + ROOMS_BY_NAME + """ r ON r.room_name = s.room_name
+            ON CONFLICT DO NOTHING
+        """,
+    },
+    "FitnessClass": {
+        "columns": [("trainer_name", "varchar(100)"), ("room_name", "varchar(50)"), ("start_time", "timestamp"),
+                    ("class_name", "varchar(50)"), ("capacity", "integer"), ("num_signed_up", "integer")],
+        "insert": """
+            INSERT INTO "FitnessClass" (trainer_id, booking_id, class_name, capacity, num_signed_up)
+            SELECT t.trainer_id, rb.booking_id, s.class_name, s.capacity, coalesce(s.num_signed_up, 0)
+            FROM {stage} s
+            JOIN """ + TRAINERS_BY_NAME + """ t ON t.name = s.trainer_name
+            JOIN """ + ROOMS_BY_NAME + """ r ON r.room_name = s.room_name
+            JOIN "RoomBooking" rb ON rb.room_id = r.room_id AND rb.start_time = s.start_time
+        """,
+    },
+    # Keeps FitnessClass.num_signed_up in step with the rows actually added
+    "GroupMember": {
+        "columns": [("member_contact", "varchar(255)"), ("room_name", "varchar(50)"), ("start_time", "timestamp")],
+        "insert": """
+            WITH added AS (
+                INSERT INTO "GroupMember" (class_id, member_id)
+                SELECT fc.class_id, m.member_id
+                FROM {stage} s
+                JOIN "Member" m ON m.contact_detail = s.member_contact
+                JOIN """ + ROOMS_BY_NAME + """ r ON r.room_name = s.room_name
+                JOIN "RoomBooking" rb ON rb.room_id = r.room_id AND rb.start_time = s.start_time
+                JOIN "FitnessClass" fc ON fc.booking_id = rb.booking_id
+                ON CONFLICT DO NOTHING
+                RETURNING class_id
+            ), counts AS (
+                SELECT class_id, count(*) AS n FROM added GROUP BY class_id
+            ), bumped AS (
+                UPDATE "FitnessClass" fc SET num_signed_up = fc.num_signed_up + counts.n, version = fc.version + 1
+                FROM counts WHERE fc.class_id = counts.class_id
+            )
+            SELECT CAST(coalesce(sum(n), 0) AS bigint) FROM counts
+        """,
+        "returns_count": True,
+    },
+    "TrainingSession": {
+        "columns": [("trainer_name", "varchar(100)"), ("member_contact", "varchar(255)"), ("room_name", "varchar(50)"),
+                    ("start_time", "timestamp")],
+        "insert": """
+            INSERT INTO "TrainingSession" (trainer_id, booking_id, member_id)
+            SELECT t.trainer_id, rb.booking_id, m.member_id
+            FROM {stage} s
+            JOIN """ + TRAINERS_BY_NAME + """ t ON t.name = s.trainer_name
+            JOIN "Member" m ON m.contact_detail = s.member_contact
+            JOIN """ + ROOMS_BY_NAME + """ r ON r.room_name = s.room_name
+            JOIN "RoomBooking" rb ON rb.room_id = r.room_id AND rb.start_time = s.start_time
+        """,
+    },
+    "Availability": {
+        "columns": [("trainer_name", "varchar(100)"), ("is_recurring", "boolean"), ("start_time", "timestamp"),
+                    ("end_time", "timestamp"), ("recurrence", "varchar(10)"), ("repeat_until", "date")],
+        "insert": """
+            INSERT INTO "Availability" (trainer_id, is_recurring, start_time, end_time, recurrence, repeat_until)
+            SELECT t.trainer_id, coalesce(s.is_recurring, FALSE), s.start_time, s.end_time,
+                   CASE WHEN s.is_recurring THEN coalesce(lower(s.recurrence), 'weekly') END,
+                   CASE WHEN s.is_recurring THEN s.repeat_until END
+            FROM {stage} s
+            JOIN """ + TRAINERS_BY_NAME + """ t ON t.name = s.trainer_name
+        """,
+    },
+}
+
+DEFAULT_CHUNK_SIZE = 50000
+
+class ImportReport(NamedTuple):
+    model: str
+    rows_read: int
+    rows_inserted: int
+    rows_skipped: int
+    seconds: float
+
+    @property
+    def rows_per_second(self):
+        return self.rows_read / self.seconds if self.seconds else 0.0
+
+def read_csv(path: str):
+    with open(path, newline="") as f:
+        yield from csv.DictReader(f)
+
+def read_jsonl(path: str):
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def _chunks(rows: Iterable[dict], size: int):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _copy_buffer(chunk: list, column_names: list):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in chunk:
+        # None and "" both become NULL in COPY's csv format
+        writer.writerow(["" if row.get(name) is None else row.get(name) for name in column_names])
+    buffer.seek(0)
+    return buffer
+
+def import_rows(engine: Engine, model: str, rows: Iterable[dict], chunk_size: int = DEFAULT_CHUNK_SIZE, progress=print):
+    if model not in IMPORT_SPECS:
+        raise ValueError(f"Unknown model {model!r}; expected one of {', '.join(IMPORT_SPECS)}")
+    spec = IMPORT_SPECS[model]
+    column_names = [name for name, _ in spec["columns"]]
+    stage = f"import_stage_{model.lower()}"
+
+    rows_read = 0
+    rows_inserted = 0
+    started = time.perf_counter()
+
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        # ON COMMIT DELETE ROWS empties the stage after every chunk's commit
+        column_ddl = ", ".join(f"{name} {sql_type}" for name, sql_type in spec["columns"])
+        cursor.execute(f"CREATE TEMP TABLE IF NOT EXISTS {stage} ({column_ddl}) ON COMMIT DELETE ROWS")
+        if "before" in spec:
+            cursor.execute(spec["before"])
+        raw.commit()
+
+        for chunk in _chunks(rows, chunk_size):
+            cursor.copy_expert(
+                f"COPY {stage} ({', '.join(column_names)}) FROM STDIN WITH (FORMAT csv)",
+                _copy_buffer(chunk, column_names),
+            )
+            if "prepare" in spec:
+                cursor.execute(spec["prepare"].format(stage=stage))
+            cursor.execute(spec["insert"].format(stage=stage))
+            inserted = cursor.fetchone()[0] if spec.get("returns_count") else cursor.rowcount
+            raw.commit()
+
+            rows_read += len(chunk)
+            rows_inserted += inserted
+            if progress:
+                elapsed = time.perf_counter() - started
+                progress(f"{model}: {rows_read} read, {rows_inserted} inserted, "
+                         f"{rows_read - rows_inserted} skipped, {rows_read / elapsed:,.0f} rows/s")
+        cursor.close()
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        raw.close()
+
+    return ImportReport(model, rows_read, rows_inserted, rows_read - rows_inserted, time.perf_counter() - started)
+
+def import_file(engine: Engine, model: str, path: str, file_format: str = None, chunk_size: int = DEFAULT_CHUNK_SIZE, progress=print):
+    if file_format is None:
+        file_format = "jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv"
+    rows = read_jsonl(path) if file_format == "jsonl" else read_csv(path)
+    return import_rows(engine, model, rows, chunk_size, progress)
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import CSV/JSONL files through PostgreSQL COPY.")
+    parser.add_argument("model", choices=list(IMPORT_SPECS))
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["csv", "jsonl"], default=None)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    # Large chunks can outlast the interactive statement_timeout
+    engine = database.make_engine(database.load_settings()._replace(statement_timeout_ms=0))
+    report = import_file(engine, args.model, args.path, args.format, args.chunk_size)
+    print(f"Done: {report.rows_inserted}/{report.rows_read} rows imported into {report.model} "
+          f"in {report.seconds:.1f} s ({report.rows_per_second:,.0f} rows/s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import NamedTuple, Optional
+import io
+import numpy as np
+
+# Club-wide health statistics computed column-wise with NumPy.
+# HealthMetric is read in one binary COPY (every column fixed-width, NULL -> NaN) and
+# sorted by (member_id, date_recorded) in NumPy, so each member is one contiguous run of rows and
+# every per-member statistic is a grouped reduction (bincount / ufunc.accumulate), not a Python loop.
+
+DAY_SECONDS = 86400.0
+EPOCH = datetime(1970, 1, 1)
+PG_EPOCH_OFFSET = 946684800.0  # binary timestamps are microseconds since 2000-01-01
+
+# Binary COPY row: int16 field count, then (int32 length, value) per field; all big-endian
+COPY_ROW = np.dtype([
+    ("fields", ">i2"),
+    ("member_id_len", ">i4"), ("member_id", ">i4"),
+    ("t_len", ">i4"), ("t", ">i8"),
+    ("weight_len", ">i4"), ("weight", ">f8"),
+    ("height_len", ">i4"), ("height", ">f8"),
+    ("heart_rate_len", ">i4"), ("heart_rate", ">f8"),
+])
+COPY_HEADER_SIZE = 19  # signature (11) + flags (4) + header extension length (4)
+COPY_TRAILER_SIZE = 2
+
+COPY_SQL = """
+    COPY (
+        SELECT member_id,
+               date_recorded,
+               coalesce(CAST(weight AS float8), 'NaN'),
+               coalesce(CAST(height AS float8), 'NaN'),
+               coalesce(CAST(heart_rate AS float8), 'NaN')
+        FROM "HealthMetric"
+        WHERE {where}
+    ) TO STDOUT WITH (FORMAT binary)
+"""
+
+class MetricArrays(NamedTuple):
+    member_id: np.ndarray  # int32, sorted
+    t: np.ndarray  # float64 seconds since 1970-01-01 (date_recorded is naive), sorted within each member
+    weight: np.ndarray  # float64, NaN when not recorded
+    height: np.ndarray
+    heart_rate: np.ndarray
+
+class HealthStatsRow(NamedTuple):
+    member_id: int
+    samples: int
+    latest_weight: float
+    latest_height: float
+    bmi: float
+    hr_avg_7d: float
+    hr_avg_30d: float
+    weight_change_per_week: float
+
+class HealthStats(NamedTuple):
+    # One entry per member with metrics; NaN where a statistic has no data
+    member_id: np.ndarray
+    samples: np.ndarray
+    latest_weight: np.ndarray
+    latest_height: np.ndarray
+    bmi: np.ndarray
+    hr_avg_7d: np.ndarray
+    hr_avg_30d: np.ndarray
+    weight_change_per_week: np.ndarray  # kg/week, least-squares slope over the trend window
+
+    def rows(self):
+        for values in zip(*(column.tolist() for column in self)):
+            yield HealthStatsRow(*values)
+
+def load_metric_arrays(session: Session, as_of: datetime, since: Optional[datetime] = None, member_ids: list = None):
+    clauses = ["date_recorded <= %(as_of)s"]
+    params = {"as_of": as_of}
+    if since is not None:
+        clauses.append("date_recorded >= %(since)s")
+        params["since"] = since
+    if member_ids is not None:
+        clauses.append("member_id = ANY(%(member_ids)s)")
+        params["member_ids"] = list(member_ids)
+
+    # Runs on the session's connection, inside its transaction
+    cursor = session.connection().connection.cursor()
+    try:
+        sql = cursor.mogrify(COPY_SQL.format(where=" AND ".join(clauses)), params).decode()
+        buffer = io.BytesIO()
+        cursor.copy_expert(sql, buffer)
+    finally:
+        cursor.close()
+
+    data = buffer.getbuffer()
+    count = (len(data) - COPY_HEADER_SIZE - COPY_TRAILER_SIZE) // COPY_ROW.itemsize
+    rows = np.frombuffer(data, dtype=COPY_ROW, count=count, offset=COPY_HEADER_SIZE)
+    # Sorting here is far cheaper than an ORDER BY merging every partition on the server
+    order = np.lexsort((rows["t"], rows["member_id"]))
+    return MetricArrays(
+        rows["member_id"][order].astype(np.int32),
+        rows["t"][order] / 1e6 + PG_EPOCH_OFFSET,
+        rows["weight"][order].astype(np.float64),
+        rows["height"][order].astype(np.float64),
+        rows["heart_rate"][order].astype(np.float64),
+    )
+
+def _last_valid(values: np.ndarray, starts: np.ndarray, ends: np.ndarray):
+    # Latest non-NaN value in each group (rows are time-ordered within a group)
+    index = np.where(np.isnan(values), -1, np.arange(len(values)))
+    last = np.maximum.accumulate(index)[ends - 1]
+    found = last >= starts
+    out = np.full(len(starts), np.nan)
+    out[found] = values[last[found]]
+    return out
+
+def _grouped_sum(group: np.ndarray, values: np.ndarray, groups: int):
+    return np.bincount(group, weights=values, minlength=groups)
+
+def _window_mean(group: np.ndarray, groups: int, values: np.ndarray, in_window: np.ndarray):
+    use = in_window & ~np.isnan(values)
+    total = _grouped_sum(group, np.where(use, values, 0.0), groups)
+    count = _grouped_sum(group, use.astype(np.float64), groups)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(count > 0, total / count, np.nan)
+
+def _window_slope(group: np.ndarray, groups: int, x: np.ndarray, y: np.ndarray, in_window: np.ndarray):
+    # Per-group least squares: slope = (n*Sxy - Sx*Sy) / (n*Sxx - Sx^2)
+    use = in_window & ~np.isnan(y)
+    xs = np.where(use, x, 0.0)
+    ys = np.where(use, y, 0.0)
+    n = _grouped_sum(group, use.astype(np.float64), groups)
+    sx = _grouped_sum(group, xs, groups)
+    sy = _grouped_sum(group, ys, groups)
+    sxx = _grouped_sum(group, xs * xs, groups)
+    sxy = _grouped_sum(group, xs * ys, groups)
+    denominator = n * sxx - sx * sx
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where((n >= 2) & (denominator > 1e-9), (n * sxy - sx * sy) / denominator, np.nan)
+
+def compute_stats(arrays: MetricArrays, as_of: datetime, trend_days: int = 30):
+    member_id, t, weight, height, heart_rate = arrays
+    n = len(member_id)
+    if n == 0:
+        empty = np.empty(0)
+        return HealthStats(np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int64), *([empty] * 6))
+
+    starts = np.flatnonzero(np.r_[True, member_id[1:] != member_id[:-1]])
+    ends = np.r_[starts[1:], n]
+    groups = len(starts)
+    group = np.repeat(np.arange(groups), ends - starts)
+
+    # Days relative to as_of (<= 0); keeps the slope sums well conditioned
+    days = (t - (as_of - EPOCH).total_seconds()) / DAY_SECONDS
+
+    latest_weight = _last_valid(weight, starts, ends)
+    latest_height = _last_valid(height, starts, ends)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        bmi = latest_weight / (latest_height / 100.0) ** 2
+
+    return HealthStats(
+        member_id=member_id[starts],
+        samples=ends - starts,
+        latest_weight=latest_weight,
+        latest_height=latest_height,
+        bmi=bmi,
+        hr_avg_7d=_window_mean(group, groups, heart_rate, days >= -7),
+        hr_avg_30d=_window_mean(group, groups, heart_rate, days >= -30),
+        weight_change_per_week=_window_slope(group, groups, days, weight, days >= -trend_days) * 7,
+    )
+
+def member_health_stats(session: Session, as_of: datetime = None, since: datetime = None, member_ids: list = None, trend_days: int = 30):
+    as_of = as_of or datetime.now()
+    return compute_stats(load_metric_arrays(session, as_of, since, member_ids), as_of, trend_days)
@@ -0,0 +1,108 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import select, func
+from collections import OrderedDict
+import sys, os
+import threading
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from models.schemas import Member, Trainer, Admin
+
+# Case-insensitive name/contact -> entity resolution for login and lookups.
+# Queries use the lower(...) expression indexes (ix_*_lower); results are cached in-process
+# as lowercased value -> primary key, so a repeat login is an identity-map or primary-key get.
+# Names aren't unique: the lowest id wins, as a plain ORDER BY id LIMIT 1 would pick.
+# Only hits are cached. A cached id is re-checked against the loaded row, so renames
+# made by other processes are caught at once; TTL bounds how long anything lives.
+
+class LRUTTLCache:
+    def __init__(self, maxsize: int = 4096, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def discard_value(self, kind: str, value):
+        # Every key of this kind that points at the given primary key
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if key[0] == kind and entry[0] == value]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+# kind -> (model, primary key column, {field name: column})
+LOOKUPS = {
+    "member": (Member, Member.member_id, {"name": Member.name, "contact": Member.contact_detail}),
+    "trainer": (Trainer, Trainer.trainer_id, {"name": Trainer.name}),
+    "admin": (Admin, Admin.admin_id, {"name": Admin.name}),
+}
+
+cache = LRUTTLCache()
+
+def _normalize(value: str):
+    return value.strip().lower()
+
+def find(session: Session, kind: str, field: str, value: str):
+    if not value:
+        return None
+    model, pk, fields = LOOKUPS[kind]
+    column = fields[field]
+    key = (kind, field, _normalize(value))
+
+    cached_id = cache.get(key)
+    if cached_id is not None:
+        entity = session.get(model, cached_id)
+        if entity is not None and _normalize(getattr(entity, column.key)) == key[2]:
+            return entity
+        cache.discard(key)
+
+    entity = session.scalars(
+        select(model).where(func.lower(column) == key[2]).order_by(pk).limit(1)
+    ).first()
+    if entity is not None:
+        cache.put(key, getattr(entity, pk.key))
+    return entity
+
+def find_member(session: Session, name: str = None, contact: str = None):
+    return find(session, "member", "contact", contact) if contact else find(session, "member", "name", name)
+
+def find_trainer(session: Session, name: str):
+    return find(session, "trainer", "name", name)
+
+def find_admin(session: Session, name: str):
+    return find(session, "admin", "name", name)
+
+# Called whenever a name/contact is created or changed
+def invalidate(kind: str, field: str, value: str):
+    if value:
+        cache.discard((kind, field, _normalize(value)))
+
+def invalidate_entity(kind: str, entity_id: int):
+    cache.discard_value(kind, entity_id)
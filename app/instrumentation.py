@@ -0,0 +1,272 @@
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from contextvars import ContextVar
+from collections import deque
+from datetime import datetime
+from typing import NamedTuple
+import functools
+import heapq
+import inspect
+import json
+import threading
+import time
+import types
+
+# Per-operation SQL instrumentation. trace_module() wraps a module's public functions; while
+# profiling is on, every statement sent through an instrumented engine is charged to the outermost
+# traced call running in that thread (or task), including the pages of listings that are fetched
+# lazily as the caller iterates. Each call records its statement count, DB time and slowest
+# statements, and flags the same statement text run N_PLUS_ONE_THRESHOLD or more times in one call
+# (one query per row of an earlier result: the N+1 pattern).
+# Off by default: the engine listeners are only attached while enabled, and a traced function then
+# costs one flag check. Turn it on from the Debug Menu, with DB_PROFILE=true, or enable(engine).
+
+N_PLUS_ONE_THRESHOLD = 5
+SLOWEST_KEPT = 3
+RECENT_OPERATIONS = 200
+SQL_PREVIEW = 300  # characters of statement text kept in reports
+OUTSIDE = "(outside any traced operation)"
+
+class StatementStats(NamedTuple):
+    sql: str
+    count: int
+    distinct_params: int
+    total_ms: float
+    max_ms: float
+
+class OperationReport(NamedTuple):
+    name: str
+    started_at: datetime
+    seconds: float  # wall time inside the call (and while its pages were being fetched)
+    statements: int
+    db_ms: float
+    slowest: list  # [(ms, sql)] slowest first
+    repeated: list[StatementStats]  # likely N+1: same statement N_PLUS_ONE_THRESHOLD+ times
+
+    @property
+    def suspect_n_plus_one(self):
+        return bool(self.repeated)
+
+class OperationSummary(NamedTuple):
+    name: str
+    calls: int
+    statements: int
+    max_statements: int
+    db_ms: float
+    n_plus_one_calls: int
+
+class _Operation:
+    # Mutable record of one traced call while it runs
+    __slots__ = ("name", "started_at", "seconds", "statements", "db_seconds", "by_sql", "slowest", "pages", "paging", "page_sql")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started_at = datetime.now()
+        self.seconds = 0.0
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.by_sql = {}  # sql -> [count, total seconds, max seconds, set of parameter reprs]
+        self.slowest = []  # min-heap of (seconds, sql)
+        self.pages = 0
+        self.paging = False
+        self.page_sql = set()  # statements run while fetching a listing page
+
+    def add(self, sql: str, parameters, seconds: float):
+        self.statements += 1
+        self.db_seconds += seconds
+        entry = self.by_sql.get(sql)
+        if entry is None:
+            entry = self.by_sql[sql] = [0, 0.0, 0.0, set()]
+        entry[0] += 1
+        if self.paging:
+            self.page_sql.add(sql)
+        entry[1] += seconds
+        entry[2] = max(entry[2], seconds)
+        if len(entry[3]) < N_PLUS_ONE_THRESHOLD * 4:
+            entry[3].add(repr(parameters))
+        if len(self.slowest) < SLOWEST_KEPT:
+            heapq.heappush(self.slowest, (seconds, sql))
+        elif seconds > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, (seconds, sql))
+
+    def repeats(self, sql: str, count: int):
+        # A keyset listing runs its page query once per page; only runs beyond that are repeats
+        return count - self.pages if sql in self.page_sql else count
+
+    def report(self):
+        repeated = sorted((StatementStats(sql[:SQL_PREVIEW], count, len(params), round(total * 1000, 3), round(longest * 1000, 3))
+                           for sql, (count, total, longest, params) in self.by_sql.items()
+                           if self.repeats(sql, count) >= N_PLUS_ONE_THRESHOLD),
+                          key=lambda stats: -stats.count)
+        return OperationReport(self.name, self.started_at, round(self.seconds, 6), self.statements, round(self.db_seconds * 1000, 3),
+                               [(round(s * 1000, 3), sql[:SQL_PREVIEW]) for s, sql in sorted(self.slowest, reverse=True)], repeated)
+
+class _Profiler:
+    def __init__(self):
+        self.enabled = False
+        self.engines = []
+        self.lock = threading.Lock()
+        self.recent = deque(maxlen=RECENT_OPERATIONS)
+        self.summary = {}  # name -> [calls, statements, max statements, db seconds, n+1 calls]
+
+    def finish(self, operation: _Operation):
+        report = operation.report()
+        if not report.statements:
+            return report  # never reached the database (validation failures, cached answers)
+        with self.lock:
+            self.recent.append(report)
+            totals = self.summary.setdefault(report.name, [0, 0, 0, 0.0, 0])
+            totals[0] += 1
+            totals[1] += report.statements
+            totals[2] = max(totals[2], report.statements)
+            totals[3] += operation.db_seconds
+            totals[4] += report.suspect_n_plus_one
+        return report
+
+    def outside(self, seconds: float):
+        with self.lock:
+            totals = self.summary.setdefault(OUTSIDE, [0, 0, 1, 0.0, 0])
+            totals[0] += 1
+            totals[1] += 1
+            totals[3] += seconds
+
+_profiler = _Profiler()
+_current: ContextVar = ContextVar("sql_operation", default=None)
+
+# Engine events (attached only while enabled)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("profile_started", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stack = conn.info.get("profile_started")
+    if not stack:
+        return  # started before profiling was switched on
+    seconds = time.perf_counter() - stack.pop()
+    operation = _current.get()
+    if operation is None:
+        # Lazy loads and ad-hoc queries between traced calls are only totalled
+        _profiler.outside(seconds)
+        return
+    operation.add(statement, parameters, seconds)
+
+def _handle_error(exception_context):
+    stack = exception_context.connection.info.get("profile_started") if exception_context.connection is not None else None
+    if stack:
+        stack.pop()
+
+def enable(engine: Engine):
+    with _profiler.lock:
+        if engine not in _profiler.engines:
+            event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+            event.listen(engine, "handle_error", _handle_error)
+            _profiler.engines.append(engine)
+        _profiler.enabled = True
+
+def disable():
+    with _profiler.lock:
+        for engine in _profiler.engines:
+            event.remove(engine, "before_cursor_execute", _before_cursor_execute)
+            event.remove(engine, "after_cursor_execute", _after_cursor_execute)
+            event.remove(engine, "handle_error", _handle_error)
+        _profiler.engines.clear()
+        _profiler.enabled = False
+
+def is_enabled():
+    return _profiler.enabled
+
+def reset():
+    with _profiler.lock:
+        _profiler.recent.clear()
+        _profiler.summary.clear()
+
+# Tagging operations
+
+def _traced_pages(operation: _Operation, pages):
+    # Listings fetch page by page as the caller iterates; charge those queries to the same call
+    try:
+        while True:
+            token = _current.set(operation)
+            operation.paging = True
+            started = time.perf_counter()
+            try:
+                page = next(pages)
+            except StopIteration:
+                return
+            finally:
+                operation.seconds += time.perf_counter() - started
+                operation.paging = False
+                _current.reset(token)
+            operation.pages += 1
+            yield page
+    finally:
+        pages.close()
+        _profiler.finish(operation)
+
+def traced(fn, name: str = None):
+    name = name or f"{fn.__module__}.{fn.__qualname__}"
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not _profiler.enabled or _current.get() is not None:
+            return fn(*args, **kwargs)  # off, or nested inside another traced call
+        operation = _Operation(name)
+        token = _current.set(operation)
+        started = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        finally:
+            operation.seconds += time.perf_counter() - started
+            _current.reset(token)
+        if isinstance(result, types.GeneratorType):
+            return _traced_pages(operation, result)
+        _profiler.finish(operation)
+        return result
+
+    return wrapper
+
+def trace_module(module: types.ModuleType):
+    # Wrap every public function defined in `module`; call at the end of the module
+    for attr, value in list(vars(module).items()):
+        if not attr.startswith("_") and inspect.isfunction(value) and value.__module__ == module.__name__:
+            setattr(module, attr, traced(value))
+
+# Reports
+
+def recent(limit: int = None, suspects_only: bool = False):
+    with _profiler.lock:
+        reports = list(_profiler.recent)
+    if suspects_only:
+        reports = [report for report in reports if report.suspect_n_plus_one]
+    return reports[-limit:] if limit else reports
+
+def summary():
+    # Per operation name, most statements first
+    with _profiler.lock:
+        rows = [OperationSummary(name, calls, statements, most, round(db * 1000, 3), suspects)
+                for name, (calls, statements, most, db, suspects) in _profiler.summary.items()]
+    return sorted(rows, key=lambda row: -row.statements)
+
+def _jsonable(value):
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    if hasattr(value, "_asdict"):
+        value = value._asdict()
+    if isinstance(value, dict):
+        return {key: _jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(item) for item in value]
+    return value
+
+def dump_json(path: str):
+    payload = {
+        "generated_at": datetime.now(),
+        "enabled": _profiler.enabled,
+        "n_plus_one_threshold": N_PLUS_ONE_THRESHOLD,
+        "summary": summary(),
+        "recent": recent(),
+    }
+    with open(path, "w") as f:
+        json.dump(_jsonable(payload), f, indent=2)
+    return path
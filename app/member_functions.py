@@ -1,36 +1,47 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import Numeric, text
+from sqlalchemy import Numeric, text, select, func
+from sqlalchemy.exc import IntegrityError
 import sys, os
-from datetime import date, datetime
+from datetime import date, datetime, timedelta
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from models.schemas import Member, GoalType, HealthMetric, HealthGoal, TrainingSession, RoomBooking, GroupMember, FitnessClass, Trainer, Availability, Room
+from models.schemas import Member, GoalType, HealthMetric, HealthMetricDaily, HealthMetricWeekly, HealthGoal, TrainingSession, RoomBooking, GroupMember, FitnessClass, Trainer, Availability, Room, ClassAvailability
+from models.records import MetricRecord, GoalRecord, SessionRecord, ClassRecord, TrendRecord, DashboardRecord, MemberRecord, HealthMetricRecord, AvailableClassRecord, Outcome
+import scheduling
+import admin_functions
+import identity
+from database import retry_on_conflict
+from pagination import keyset_pages, PAGE_SIZE
+import instrumentation
+
+# Writes, registrations and logins return an Outcome (models/records.py); reads return records,
+# or None when the member is missing. Nothing here prints: terminal_UI shows the messages.
 
 def register_member(session: Session, name: str, date_of_birth: date, gender: str, contact_detail: str):
-    existing_member = session.query(Member).filter_by(contact_detail=contact_detail).first()
+    existing_member = identity.find_member(session, contact=contact_detail)
     if existing_member:
-        print("Error: contact details must be unique!")
-    else:
-        member = Member(name=name, date_of_birth=date_of_birth, gender=gender, contact_detail=contact_detail)
-        session.add(member)
-        session.commit()
-        print(f"{name} has successfully been registered as a member.")
+        return Outcome(Outcome.CONFLICT, "Error: contact details must be unique!")
+    member = Member(name=name, date_of_birth=date_of_birth, gender=gender, contact_detail=contact_detail)
+    session.add(member)
+    session.commit()
+    identity.invalidate("member", "name", name)
+    return Outcome(Outcome.OK, f"{name} has successfully been registered as a member.", member)
 
 def login_member(session: Session, name: str):
-    member = session.query(Member).filter(Member.name == name).first()
+    member = identity.find_member(session, name=name)
     if member:
-        print(f"Welcome back, {member.name}!")
-        return member
-    else:
-        print("Member not found. Please register first.")
-        return None
+        return Outcome(Outcome.OK, f"Welcome back, {member.name}!", member)
+    return Outcome(Outcome.NOT_FOUND, "Member not found. Please register first.")
 
-def view_members(session: Session):
-    members = session.query(Member).all()
-    for member in members:
-        print(member)
+def view_members(session: Session, page_size: int = PAGE_SIZE, after: tuple = None, name: str = None):
+    stmt = select(Member.member_id, Member.name, Member.date_of_birth, Member.gender, Member.contact_detail)
+    if name:
+        stmt = stmt.where(Member.name.ilike(f"%{name}%"))
+    return keyset_pages(session, stmt, [Member.member_id], page_size, after, MemberRecord)
 
 def update_personal_details(session: Session, member: Member, name=None, date_of_birth=None, gender=None, contact=None):
+    if not member:
+        return Outcome(Outcome.NOT_FOUND, "Member not found.")
     changed = False
     if name:
         member.name = name
@@ -47,27 +58,70 @@ def update_personal_details(session: Session, member: Member, name=None, date_of
         changed = True
     if changed:
         session.commit()
-
-def view_health_metrics(session: Session, member: Member):
+        # Old and new name/contact both stop resolving to what they did
+        identity.invalidate_entity("member", member.member_id)
+        identity.invalidate("member", "name", name)
+        identity.invalidate("member", "contact", contact)
+        return Outcome(Outcome.OK, "Personal details updated.", member)
+    return Outcome(Outcome.OK, "Nothing to update.", member)
+
+def view_health_metrics(session: Session, member: Member, page_size: int = PAGE_SIZE, after: tuple = None, start=None, end=None):
     if not member:
-        print("Member not found.")
-        return
+        return None
 
-    for health_metric in member.health_metrics:
-        print(health_metric)
+    # Date bounds prune HealthMetric down to the monthly partitions they cover
+    stmt = select(HealthMetric.metric_id, HealthMetric.date_recorded, HealthMetric.weight, HealthMetric.height, HealthMetric.heart_rate)
+    stmt = stmt.where(HealthMetric.member_id == member.member_id)
+    if start:
+        stmt = stmt.where(HealthMetric.date_recorded >= start)
+    if end:
+        stmt = stmt.where(HealthMetric.date_recorded < end)
+    return keyset_pages(session, stmt, [HealthMetric.date_recorded, HealthMetric.metric_id], page_size, after, HealthMetricRecord)
+
+# Trends come from the rollup tables, never from raw HealthMetric rows
+TREND_PERIODS = {
+    "day": (HealthMetricDaily, HealthMetricDaily.day),
+    "week": (HealthMetricWeekly, HealthMetricWeekly.week_start),
+}
+
+def health_trend(session: Session, member_id: int, period: str = "week", start: date = None, end: date = None, limit: int = None):
+    rollup, period_start = TREND_PERIODS[period]
+    stmt = select(
+        period_start.label("period_start"),
+        rollup.samples,
+        (rollup.weight_sum / func.nullif(rollup.weight_count, 0)).label("avg_weight"),
+        rollup.heart_rate_min,
+        rollup.heart_rate_max,
+        (rollup.heart_rate_sum / func.nullif(rollup.heart_rate_count, 0)).label("avg_heart_rate"),
+    ).where(rollup.member_id == member_id)
+    if start:
+        stmt = stmt.where(period_start >= start)
+    if end:
+        stmt = stmt.where(period_start < end)
+    # Most recent periods when limited, always returned oldest first
+    rows = session.execute(stmt.order_by(period_start.desc()).limit(limit)).all()
+    return [
+        TrendRecord(row.period_start, row.samples,
+                    round(float(row.avg_weight), 2) if row.avg_weight is not None else None,
+                    row.heart_rate_min, row.heart_rate_max,
+                    round(float(row.avg_heart_rate), 1) if row.avg_heart_rate is not None else None)
+        for row in reversed(rows)
+    ]
 
 def view_fitness_goals(session: Session, member: Member):
+    # In goal order, the numbering update_fitness_goals takes
     if not member:
-        print("Member not found.")
-        return
+        return None
 
-    for i, goal in enumerate(member.goals):
-        print(f"Goal {i + 1}: {goal.goal_type.description} (target: {goal.goal_type.target})")
+    rows = session.execute(select(GoalType.description, GoalType.target)
+                           .join(HealthGoal, HealthGoal.goal_type_id == GoalType.goal_type_id)
+                           .where(HealthGoal.member_id == member.member_id)
+                           .order_by(HealthGoal.goal_id))
+    return [GoalRecord._make(row) for row in rows]
 
 def add_fitness_goals(session: Session, member: Member, description: str, target: str):
     if not member:
-        print("Member not found.")
-        return
+        return Outcome(Outcome.NOT_FOUND, "Member not found.")
     
     goal_type = GoalType(description=description, target=target)
     session.add(goal_type)
@@ -76,279 +130,320 @@ def add_fitness_goals(session: Session, member: Member, description: str, target
     goal = HealthGoal(member=member, goal_type=goal_type)
     session.add(goal)
     session.commit()
+    return Outcome(Outcome.OK, "Goal added.", goal)
 
 def update_fitness_goals(session: Session, user_index: int, member: Member, goal_id: int, target: str):
     if not member:
-        print("Member not found.")
-        return
+        return Outcome(Outcome.NOT_FOUND, "Member not found.")
     if user_index - 1 >= len(member.goals):
-        print("Goal index out of range.")
-        return
+        return Outcome(Outcome.NOT_FOUND, "Goal index out of range.")
     
     goal = member.goals[user_index - 1]
     goal.goal_type.target = target
     session.commit()
+    return Outcome(Outcome.OK, "Goal updated.", goal)
     
 def input_health_metric(session: Session, member: Member, date_recorded: date, weight: float, height: float, heart_rate: int):
     if not member:
-        print("Member not found.")
-        return
+        return Outcome(Outcome.NOT_FOUND, "Member not found.")
     
+    # Back-dated or far-future entries get their month's partition on the way in
+    session.execute(text("SELECT healthmetric_ensure_partitions(CAST(:d AS timestamp), CAST(:d AS timestamp))"), {"d": date_recorded})
     healthMetric = HealthMetric(member=member, date_recorded=date_recorded, weight=weight, height=height, heart_rate=heart_rate)
     session.add(healthMetric)
     session.commit()
-
-def dashboard(session: Session, member: Member) -> None:
+    return Outcome(Outcome.OK, "Health metric recorded.", healthMetric)
+
+# One round trip: every section is limited, ordered and counted in the database
+DASHBOARD_SQL = text("""
+    WITH member_classes AS (
+        SELECT fc.class_id, fc.class_name, t.name AS trainer_name, rb.start_time, rb.end_time
+        FROM "GroupMember" gm
+        JOIN "FitnessClass" fc ON fc.class_id = gm.class_id
+        JOIN "RoomBooking" rb ON rb.booking_id = fc.booking_id
+        JOIN "Trainer" t ON t.trainer_id = fc.trainer_id
+        WHERE gm.member_id = :member_id
+    )
+    SELECT
+        (SELECT coalesce(json_agg(m ORDER BY m.date_recorded DESC), '[]')
+         FROM (SELECT date_recorded, weight, height, heart_rate
+               FROM "HealthMetric"
+               WHERE member_id = :member_id
+                 -- The latest metrics fall within the member's latest :metric_limit recorded days;
+                 -- bounding by that day (from the daily rollup) prunes every older partition
+                 AND date_recorded >= (SELECT coalesce(CAST(min(day) AS timestamp), 'infinity')
+                                       FROM (SELECT day FROM "HealthMetricDaily"
+                                             WHERE member_id = :member_id
+                                             ORDER BY day DESC
+                                             LIMIT :metric_limit) d)
+               ORDER BY date_recorded DESC
+               LIMIT :metric_limit) m) AS latest_metrics,
+        (SELECT coalesce(json_agg(w ORDER BY w.week_start), '[]')
+         FROM (SELECT week_start, samples,
+                      round(weight_sum / nullif(weight_count, 0), 2) AS avg_weight,
+                      heart_rate_min, heart_rate_max,
+                      round(CAST(heart_rate_sum AS numeric) / nullif(heart_rate_count, 0), 1) AS avg_heart_rate
+               FROM "HealthMetricWeekly"
+               WHERE member_id = :member_id
+               ORDER BY week_start DESC
+               LIMIT :trend_weeks) w) AS weekly_trend,
+        (SELECT coalesce(json_agg(g ORDER BY g.goal_id), '[]')
+         FROM (SELECT hg.goal_id, gt.description, gt.target
+               FROM "HealthGoal" hg
+               JOIN "GoalType" gt ON gt.goal_type_id = hg.goal_type_id
+               WHERE hg.member_id = :member_id) g) AS active_goals,
+        (SELECT count(*) FROM member_classes WHERE end_time < :now) AS past_class_count,
+        (SELECT coalesce(json_agg(s ORDER BY s.start_time), '[]')
+         FROM (SELECT ts.session_id, t.name AS trainer_name, rb.start_time, rb.end_time
+               FROM "TrainingSession" ts
+               JOIN "RoomBooking" rb ON rb.booking_id = ts.booking_id
+               JOIN "Trainer" t ON t.trainer_id = ts.trainer_id
+               WHERE ts.member_id = :member_id AND rb.start_time >= :now
+               ORDER BY rb.start_time
+               LIMIT :upcoming_limit) s) AS upcoming_sessions,
+        (SELECT coalesce(json_agg(c ORDER BY c.start_time), '[]')
+         FROM (SELECT class_id, class_name, trainer_name, start_time, end_time
+               FROM member_classes
+               WHERE start_time >= :now
+               ORDER BY start_time
+               LIMIT :upcoming_limit) c) AS upcoming_classes
+""")
+
+def _parse_ts(value):
+    return datetime.fromisoformat(value) if value is not None else None
+
+def dashboard(session: Session, member: Member, metric_limit: int = 5, upcoming_limit: int = 10, trend_weeks: int = 8):
     if not member:
-        print("Member not found.")
-        return
-    now = datetime.now()
+        return None
 
-    # 1) Latest 5 health stats (most recent first)
-    latest_metrics = sorted(member.health_metrics, key=lambda m: m.date_recorded, reverse=True)[:5]
-
-    # 2) Active goals (all HealthGoal rows for this member, joined to GoalType for details)
-    active_goals = []
-    for goal in member.goals:
-        active_goals.append((goal, goal.goal_type))
-
-    # 3) Past class count:
-    #    GroupMember → FitnessClass → RoomBooking, where the booking has already ended
-    past_class_count = 0
-    for group_member in member.group_classes:
-        if group_member.fitness_class.booking.end_time < now:
-            past_class_count += 1
-
-    # 4) Upcoming sessions:
-    #    TrainingSession for this member, with a RoomBooking whose start_time is in the future
-    upcoming_sessions = []
-    for training_session in member.training_sessions:
-        if training_session.booking.start_time >= now:
-            upcoming_sessions.append(training_session)
-    upcoming_sessions.sort(key=lambda training_session: training_session.booking.start_time)
-
-    # 5) Upcoming group classes:
-    #    GroupMember → FitnessClass → RoomBooking (+ Trainer), where start_time is in the future
-    upcoming_classes = []
-    for group_member in member.group_classes:
-        if group_member.fitness_class.booking.start_time >= now:
-            upcoming_classes.append(group_member.fitness_class)
-    upcoming_classes.sort(key=lambda fc: fc.booking.start_time)
-    
-    # ==== PRINT DASHBOARD (terminal UI can format this however you like) ====
-    print("\n====== DASHBOARD ======")
-
-    print("\nLatest Health Metrics (up to 5, most recent first):")
-    if not latest_metrics:
-        print("  No health metrics recorded yet.")
-    else:
-        for metric in latest_metrics:
-            print(
-                f"  Date: {metric.date_recorded}, "
-                f"Weight: {metric.weight}, "
-                f"Height: {metric.height}, "
-                f"Heart rate: {metric.heart_rate}"
-            )
-
-    print("\nActive Goals:")
-    if not active_goals:
-        print("  No goals set.")
-    else:
-        for goal, goaltype in active_goals:
-            print(f"  {goaltype.description} (target: {goaltype.target})")
-
-    print(f"\nPast class count: {past_class_count}")
-
-    print("\nUpcoming Sessions:")
-    if not upcoming_sessions:
-        print("  No upcoming sessions.")
-    else:
-        for training_session in upcoming_sessions:
-            print(
-                f"  {training_session.booking.start_time}–{training_session.booking.end_time} "
-                f"with {training_session.trainer.name} (session_id={training_session.session_id})"
-            )
-
-    print("\nUpcoming Group Classes:")
-    if not upcoming_classes:
-        print("  No upcoming classes.")
-    else:
-        for fitness_class in upcoming_classes:
-            print(
-                f"  {fitness_class.booking.start_time}–{fitness_class.booking.end_time} "
-                f"{fitness_class.class_name} with {fitness_class.trainer.name} "
-                f"(class_id={fitness_class.class_id})"
-            )
-    print("=======================\n")
-    return
+    row = session.execute(DASHBOARD_SQL, {
+        "member_id": member.member_id,
+        "now": datetime.now(),
+        "metric_limit": metric_limit,
+        "upcoming_limit": upcoming_limit,
+        "trend_weeks": trend_weeks,
+    }).one()
+
+    # JSON columns come back as lists of dicts; timestamps as ISO strings
+    return DashboardRecord(
+        latest_metrics=[
+            MetricRecord(_parse_ts(m["date_recorded"]), m["weight"], m["height"], m["heart_rate"])
+            for m in row.latest_metrics
+        ],
+        weekly_trend=[
+            TrendRecord(date.fromisoformat(w["week_start"]), w["samples"], w["avg_weight"],
+                        w["heart_rate_min"], w["heart_rate_max"], w["avg_heart_rate"])
+            for w in row.weekly_trend
+        ],
+        active_goals=[GoalRecord(g["description"], g["target"]) for g in row.active_goals],
+        past_class_count=row.past_class_count,
+        upcoming_sessions=[
+            SessionRecord(s["session_id"], s["trainer_name"], _parse_ts(s["start_time"]), _parse_ts(s["end_time"]))
+            for s in row.upcoming_sessions
+        ],
+        upcoming_classes=[
+            ClassRecord(c["class_id"], c["class_name"], c["trainer_name"], _parse_ts(c["start_time"]), _parse_ts(c["end_time"]))
+            for c in row.upcoming_classes
+        ],
+    )
 
 
 # DEFAULT_ADMIN_ID_FOR_BOOKINGS = 1  # adjust if needed
 
-def view_room_bookings(session: Session):
-    bookings = session.query(RoomBooking).order_by(RoomBooking.start_time.asc()).all()
-    #If no bookings found
-    if not bookings:
-        print("No room bookings found in the specified time range.")
-        return
-
-    for booking in bookings:
-        print(
-            f"Booking ID: {booking.booking_id}, "
-            f"Room: {booking.room.room_name}, "
-            f"Booked: {booking.is_booked}, "
-            f"Start: {booking.start_time}, "
-            f"End: {booking.end_time}"
-        )
+def view_room_bookings(session: Session, page_size: int = PAGE_SIZE, after: tuple = None, start=None, end=None, room_name: str = None, is_booked: bool = None):
+    # Same listing the admins see
+    return admin_functions.view_room_bookings(session, page_size, after, start, end, room_name, is_booked)
 
 def view_pt_sessions(session: Session, member: Member):
-    pt_sessions = session.query(TrainingSession).filter(TrainingSession.member == member).all()
-    if not pt_sessions:
-        print("No PT sessions found.")
-        return
-    pt_sessions.sort(key=lambda ts: ts.booking.start_time)
-
-    for training_session in pt_sessions:
-        print(
-            f"Session ID: {training_session.session_id}, "
-            f"Trainer: {training_session.trainer.name}, "
-            f"Start: {training_session.booking.start_time}, "
-            f"End: {training_session.booking.end_time}"
-        )
-
+    # Soonest first, with the trainer's name and the booking's times joined in (no lazy loads per session)
+    rows = session.execute(select(TrainingSession.session_id, Trainer.name, RoomBooking.start_time, RoomBooking.end_time)
+                           .join(Trainer, Trainer.trainer_id == TrainingSession.trainer_id)
+                           .join(RoomBooking, RoomBooking.booking_id == TrainingSession.booking_id)
+                           .where(TrainingSession.member_id == member.member_id)
+                           .order_by(RoomBooking.start_time, TrainingSession.session_id))
+    return [SessionRecord._make(row) for row in rows]
+
+# Scheduling writes start over on a conflict (app/database.py): two desks can both pass the
+# trainer and booking checks, but only one of them commits.
+@retry_on_conflict()
 def reschedule_pt_session(session: Session, member: Member, training_session: TrainingSession, new_booking: RoomBooking, new_trainer: Trainer = None):
     if not member:
-        print("Member not found.")
-        return None
+        return Outcome(Outcome.NOT_FOUND, "Member not found.")
     if not training_session or training_session.member != member:
-        print("PT session not found for this member.")
-        return None
+        return Outcome(Outcome.NOT_FOUND, "PT session not found for this member.")
     if not new_booking:
-        print("New booking not found.")
-        return None
+        return Outcome(Outcome.NOT_FOUND, "New booking not found.")
+    if new_booking.is_booked and new_booking.booking_id != training_session.booking_id:
+        return Outcome(Outcome.CONFLICT, "That room booking is already taken.")
 
     # Choose which trainer to use
     trainer = new_trainer if new_trainer is not None else training_session.trainer
     if not trainer:
-        print("Trainer not found.")
-        return None
+        return Outcome(Outcome.NOT_FOUND, "Trainer not found.")
 
-    desired_start = new_booking.start_time
-    desired_end = new_booking.end_time
-
-    # Check trainer availability for the new time window
-    for availability in trainer.availability:
-        if availability.start_time <= desired_start and availability.end_time >= desired_end:
-            break
-    else:
-        print("Trainer is not available for the new booking time.")
-        return None
-
-    # Check for conflicts with other PT sessions (exclude the session being rescheduled)
-    for other_ts in trainer.sessions:
-        if other_ts.session_id == training_session.session_id:
-            continue
-        other = other_ts.booking
-        if other.start_time < desired_end and other.end_time > desired_start:
-            print("Trainer already has another PT session at that time.")
-            return None
-
-    # Check for conflicts with fitness classes
-    for fitness_class in trainer.classes:
-        other = fitness_class.booking
-        if other.start_time < desired_end and other.end_time > desired_start:
-            print("Trainer is teaching a class at that time.")
-            return None
+    # Check trainer availability and conflicts for the new time window (excluding the session being rescheduled)
+    seen = scheduling.schedule_version(session, trainer.trainer_id)
+    reason = scheduling.trainer_conflict(session, trainer.trainer_id, new_booking.start_time, new_booking.end_time, exclude_session_id=training_session.session_id)
+    if reason:
+        return Outcome(Outcome.CONFLICT, reason)
+    scheduling.claim_trainer(session, trainer.trainer_id, seen)
 
     # All checks passed → update the session's booking and trainer (if changed)
     training_session.booking.is_booked = False
     new_booking.is_booked = True
     training_session.booking = new_booking
     training_session.trainer = trainer
-    session.commit()
-    print("PT session rescheduled successfully.")
-    return training_session
+    try:
+        session.commit()
+    except IntegrityError:
+        # A free slot overlapping one already booked can't be taken (ex_roombooking_room_overlap)
+        session.rollback()
+        return Outcome(Outcome.CONFLICT, "That room is already booked for part of that time.")
+    return Outcome(Outcome.OK, "PT session rescheduled successfully.", training_session)
 
+@retry_on_conflict()
 def book_pt_session(session: Session, member: Member, trainer: Trainer, booking: RoomBooking):
     if not member or not trainer or not booking:
-        print("Member, Trainer or Booking not found")
-        return None
-
-    # 3) Use booking's time window as the PT session time
-    desired_start = booking.start_time
-    desired_end = booking.end_time
-
-    # 4) Check trainer availability for that whole time window
-    for availability in trainer.availability:
-        if availability.start_time <= desired_start and availability.end_time >= desired_end:
-            break
-    else:
-        print("Trainer is not available for that booking time.")
-        return None
-
-    # 5) Check for conflicts with other PT sessions
-    for training_session in trainer.sessions:
-        other = training_session.booking
-        if other.start_time < desired_end and other.end_time > desired_start:
-            print("Trainer already has another PT session at that time.")
-            return None
-
-    # 6) Check for conflicts with fitness classes
-    for fitness_class in trainer.classes:
-        other = fitness_class.booking
-        if other.start_time < desired_end and other.end_time > desired_start:
-            print("Trainer is teaching a class at that time.")
-            return None
-
-    # 7) All good → create the PT session tied to that booking
+        return Outcome(Outcome.NOT_FOUND, "Member, Trainer or Booking not found")
+    if booking.is_booked:
+        return Outcome(Outcome.CONFLICT, "That room booking is already taken.")
+
+    # 3) Use booking's time window as the PT session time and check the trainer is free for it
+    seen = scheduling.schedule_version(session, trainer.trainer_id)
+    reason = scheduling.trainer_conflict(session, trainer.trainer_id, booking.start_time, booking.end_time)
+    if reason:
+        return Outcome(Outcome.CONFLICT, reason)
+    scheduling.claim_trainer(session, trainer.trainer_id, seen)
+
+    # 4) All good → create the PT session tied to that booking
     pt_session = TrainingSession(trainer=trainer, booking=booking, member=member)
     booking.is_booked = True
 
     session.add(pt_session)
-    session.commit()
-    print("PT session booked successfully.")
-    return pt_session
-
-def view_available_classes(session: Session):
-    # Try to use view first
     try:
-        result = session.execute(text("SELECT * FROM view_available_classes ORDER BY class_name ASC"))
-        rows = result.mappings().all()
-        if not rows:
-            print("No available classes.")
-            return
-        for mapping in rows:
-            print(
-                f"Class ID: {mapping.get('class_id')}, "
-                f"Trainer ID: {mapping.get('trainer_id')}, "
-                f"Booking ID: {mapping.get('booking_id')}, "
-                f"Name: {mapping.get('class_name')}, "
-                f"Capacity: {mapping.get('num_signed_up')}/{mapping.get('capacity')}"
-            )
-        return
-    except Exception as e:
-        print("View not available or failed; falling back to table query.", e)
-
-    #Backup: direct table query
-    classes = session.query(FitnessClass).order_by(FitnessClass.class_name.asc()).all()
-    for fitness_class in classes:
-        print(fitness_class)
-
-def class_registration(session: Session, member: Member, fitness_class: FitnessClass):     
+        session.commit()
+    except IntegrityError:
+        session.rollback()
+        return Outcome(Outcome.CONFLICT, "That room is already booked for part of that time.")
+    return Outcome(Outcome.OK, "PT session booked successfully.", pt_session)
+
+def view_available_classes(session: Session, page_size: int = PAGE_SIZE, after: tuple = None, days: int = 14):
+    # Future classes with seats left starting within `days`, soonest first (ClassAvailability, trigger-maintained)
+    now = datetime.now()
+    stmt = (select(ClassAvailability.class_id, ClassAvailability.class_name, ClassAvailability.trainer_name,
+                   ClassAvailability.room_name, ClassAvailability.start_time, ClassAvailability.end_time,
+                   ClassAvailability.capacity, ClassAvailability.seats_left)
+            .where(ClassAvailability.start_time > now, ClassAvailability.start_time < now + timedelta(days=days)))
+    return keyset_pages(session, stmt, [ClassAvailability.start_time, ClassAvailability.class_id], page_size, after, AvailableClassRecord)
+
+# One statement: take a seat only while num_signed_up < capacity (the row lock makes
+# concurrent signups queue on the class row and re-check the condition), then add the roster row.
+# ON CONFLICT covers a duplicate signup racing past the NOT EXISTS check; its seat is rolled back.
+CLASS_REGISTRATION_SQL = text("""
+    WITH seat AS (
+        UPDATE "FitnessClass"
+        SET num_signed_up = num_signed_up + 1, version = version + 1
+        WHERE class_id = :class_id
+          AND num_signed_up < capacity
+          AND NOT EXISTS (SELECT 1 FROM "GroupMember" WHERE class_id = :class_id AND member_id = :member_id)
+        RETURNING class_id
+    ), joined AS (
+        INSERT INTO "GroupMember" (class_id, member_id)
+        SELECT class_id, :member_id FROM seat
+        ON CONFLICT DO NOTHING
+        RETURNING class_id
+    )
+    SELECT EXISTS (SELECT 1 FROM seat) AS seat_taken,
+           EXISTS (SELECT 1 FROM joined) AS joined,
+           EXISTS (SELECT 1 FROM "GroupMember" WHERE class_id = :class_id AND member_id = :member_id) AS already_member
+""")
+
+REGISTERED = "registered"
+ALREADY_REGISTERED = "already registered"
+CLASS_FULL = "full"
+
+def register_for_class(session: Session, member_id: int, class_id: int):
+    # Commits on success, rolls back otherwise; returns REGISTERED, ALREADY_REGISTERED or CLASS_FULL
+    row = session.execute(CLASS_REGISTRATION_SQL, {"class_id": class_id, "member_id": member_id}).one()
+    if row.joined:
+        session.commit()
+        return REGISTERED
+    session.rollback()
+    return ALREADY_REGISTERED if row.already_member or row.seat_taken else CLASS_FULL
+
+# Many signups for one class in one statement, admitted in arrival order (ordinality) while
+# seats last. The class row is locked first, so batches and single signups for a class take turns.
+BATCH_REGISTRATION_SQL = text("""
+    WITH req AS (
+        SELECT member_id, ord FROM unnest(CAST(:member_ids AS integer[])) WITH ORDINALITY AS r(member_id, ord)
+    ), cls AS (
+        SELECT greatest(capacity - num_signed_up, 0) AS free
+        FROM "FitnessClass" WHERE class_id = :class_id
+        FOR UPDATE
+    ), existing AS (
+        SELECT gm.member_id FROM "GroupMember" gm
+        WHERE gm.class_id = :class_id AND gm.member_id IN (SELECT member_id FROM req)
+    ), fresh AS (
+        SELECT DISTINCT ON (member_id) member_id, ord FROM req
+        WHERE member_id NOT IN (SELECT member_id FROM existing)
+        ORDER BY member_id, ord
+    ), admitted AS (
+        SELECT member_id FROM fresh ORDER BY ord LIMIT (SELECT free FROM cls)
+    ), inserted AS (
+        INSERT INTO "GroupMember" (class_id, member_id)
+        SELECT :class_id, member_id FROM admitted
+        ON CONFLICT DO NOTHING
+        RETURNING member_id
+    ), bumped AS (
+        UPDATE "FitnessClass" SET num_signed_up = num_signed_up + (SELECT count(*) FROM inserted), version = version + 1
+        WHERE class_id = :class_id
+    )
+    SELECT 'registered' AS status, member_id FROM inserted
+    UNION ALL
+    SELECT 'existing', member_id FROM existing
+    UNION ALL
+    SELECT 'conflict', member_id FROM admitted WHERE member_id NOT IN (SELECT member_id FROM inserted)
+""")
+
+def register_batch(session: Session, class_id: int, member_ids: list):
+    # One transaction for the whole batch; returns a result per request, in order.
+    # "existing" comes from the statement's snapshot, taken before it waited for the class row,
+    # so a member another batch signed up meanwhile only shows as an ON CONFLICT loss ("conflict").
+    # Those losses took seats from `free`; with the class row still locked, a second statement
+    # (fresh snapshot, nobody else can sign up) gives the members turned away an exact answer.
+    rows = session.execute(BATCH_REGISTRATION_SQL, {"class_id": class_id, "member_ids": list(member_ids)}).all()
+    reported = {row.member_id for row in rows}
+    if any(row.status == "conflict" for row in rows):
+        turned_away = [member_id for member_id in dict.fromkeys(member_ids) if member_id not in reported]
+        if turned_away:
+            rows += session.execute(BATCH_REGISTRATION_SQL, {"class_id": class_id, "member_ids": turned_away}).all()
+    session.commit()
+    registered = {row.member_id for row in rows if row.status == "registered"}
+    existing = {row.member_id for row in rows if row.status in ("existing", "conflict")}
+    results = []
+    answered = set()
+    for member_id in member_ids:
+        if member_id in existing or member_id in answered and member_id in registered:
+            results.append(ALREADY_REGISTERED)
+        elif member_id in registered:
+            results.append(REGISTERED)
+        else:
+            results.append(CLASS_FULL)
+        answered.add(member_id)
+    return results
+
+# Already atomic (CLASS_REGISTRATION_SQL): signups queue on the class row, so only deadlocks retry
+@retry_on_conflict()
+def class_registration(session: Session, member: Member, fitness_class: FitnessClass):
     if not member or not fitness_class:
-        print("Member or class not found.")
-        return False
+        return Outcome(Outcome.NOT_FOUND, "Member or class not found.")
 
-    if any(group_member.member == member for group_member in fitness_class.members):
-        print("Member is already signed up for this class.")
-        return False
-    
-    if fitness_class.num_signed_up >= fitness_class.capacity:
-        print("Class is full.")
-        return False
+    result = register_for_class(session, member.member_id, fitness_class.class_id)
+    if result == ALREADY_REGISTERED:
+        return Outcome(Outcome.CONFLICT, "Member is already signed up for this class.")
+    if result == CLASS_FULL:
+        return Outcome(Outcome.CONFLICT, "Class is full.")
+    return Outcome(Outcome.OK, "Registered for class.", fitness_class)
 
-    fitness_class.num_signed_up += 1
-    group_member = GroupMember(fitness_class=fitness_class, member=member)
-    session.add(group_member)
-    session.commit()
-    return fitness_class
+# Every public function above is a traced operation (app/instrumentation.py)
+instrumentation.trace_module(sys.modules[__name__])
@@ -0,0 +1,270 @@
+from sqlalchemy import text, inspect
+from sqlalchemy.schema import AddConstraint
+from sqlalchemy.engine import Engine, Connection
+from sqlalchemy.exc import ProgrammingError
+from pathlib import Path
+import sys, os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from models.schemas import (Base, Room, Member, Trainer, Admin, ClassAvailability, BillingPayment, MemberBalance, LedgerDaily, Availability,
+                            HealthGoal, GroupMember, TrainingSession, RoomBooking, FitnessClass, RoomBookingChange)
+
+# Versioned, idempotent schema bootstrap.
+# schema_version records every applied step. A warm start is a single
+# SELECT max(version); only missing steps run, each in its own transaction under an
+# advisory lock, so kiosks starting together apply each step exactly once.
+# Every step must be safe to re-run (IF NOT EXISTS / OR REPLACE / checkfirst).
+# New tables in later steps: Model.__table__.create(conn, checkfirst=True).
+
+SQL_DIR = Path(__file__).parent.parent / "sql"
+MIGRATION_LOCK_KEY = 3005  # pg_advisory_xact_lock key shared by every process
+
+def run_sql_file(conn: Connection, name: str):
+    conn.execute(text((SQL_DIR / name).read_text()))
+
+ROOM_OVERLAP_CONSTRAINT = "ex_roombooking_room_overlap"
+
+def _room_overlap_constraint():
+    return next(c for c in RoomBooking.__table__.constraints if c.name == ROOM_OVERLAP_CONSTRAINT)
+
+# Indexes the baseline added to tables that databases made by the old reset-on-start main.py
+# already have; create_all skips existing tables, so a legacy database gets them by name
+LEGACY_INDEXES = ("ix_roombooking_time", "ix_fitnessclass_trainer", "ix_fitnessclass_booking",
+                  "ix_trainingsession_trainer", "ix_trainingsession_booking", "ix_availability_trainer_time")
+
+def _park_legacy_health_metrics(conn: Connection):
+    # A plain (unpartitioned) HealthMetric predates schema_version; move it aside, names and all,
+    # so create_all can make the partitioned table. True if there was one.
+    relkind = conn.execute(text("""SELECT relkind FROM pg_class WHERE oid = to_regclass('"HealthMetric"')""")).scalar()
+    if relkind != "r":
+        return False
+    conn.execute(text('ALTER TABLE "HealthMetric" RENAME TO "HealthMetric_legacy"'))
+    conn.execute(text('ALTER TABLE "HealthMetric_legacy" RENAME CONSTRAINT "HealthMetric_pkey" TO "HealthMetric_legacy_pkey"'))
+    conn.execute(text('ALTER SEQUENCE IF EXISTS "HealthMetric_metric_id_seq" RENAME TO "HealthMetric_legacy_metric_id_seq"'))
+    return True
+
+def _restore_legacy_health_metrics(conn: Connection):
+    # Rows go in through the parent so the rollup triggers fill HealthMetricDaily/Weekly; the
+    # months they land in the default partition are then given partitions of their own
+    conn.execute(text("""
+        INSERT INTO "HealthMetric" (metric_id, member_id, date_recorded, weight, height, heart_rate)
+        SELECT metric_id, member_id, date_recorded, weight, height, heart_rate FROM "HealthMetric_legacy"
+    """))
+    conn.execute(text("SELECT healthmetric_maintain_partitions(3)"))
+    conn.execute(text("""
+        SELECT setval(pg_get_serial_sequence('"HealthMetric"', 'metric_id'), max(metric_id))
+        FROM "HealthMetric" HAVING max(metric_id) IS NOT NULL
+    """))
+    conn.execute(text('DROP TABLE "HealthMetric_legacy"'))
+
+def _add_room_overlap_constraint(conn: Connection):
+    # Stops with the offending pairs when existing rows would break the constraint
+    overlaps = conn.execute(text("""
+        SELECT a.booking_id, b.booking_id
+        FROM "RoomBooking" a JOIN "RoomBooking" b
+          ON b.room_id = a.room_id AND b.booking_id > a.booking_id
+         AND tsrange(a.start_time, a.end_time) && tsrange(b.start_time, b.end_time)
+        ORDER BY 1, 2 LIMIT 10
+    """)).all()
+    if overlaps:
+        pairs = ", ".join(f"{a}/{b}" for a, b in overlaps)
+        raise RuntimeError(f"RoomBooking rows of the same room overlap ({pairs}); resolve them before upgrading")
+    conn.execute(AddConstraint(_room_overlap_constraint()))
+
+def _adopt_legacy_room_bookings(conn: Connection):
+    # The old room_booking probe kept every booking apart, so the constraint normally goes straight
+    # on; if it can't, stop rather than dropping the trigger unguarded
+    if conn.execute(text("SELECT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = :name)"), {"name": ROOM_OVERLAP_CONSTRAINT}).scalar():
+        return
+    _add_room_overlap_constraint(conn)
+
+def _baseline(conn: Connection):
+    run_sql_file(conn, "extensions.sql")
+    legacy_metrics = _park_legacy_health_metrics(conn)
+    Base.metadata.create_all(bind=conn)
+    run_sql_file(conn, "health_metrics.sql")
+    if legacy_metrics:
+        _restore_legacy_health_metrics(conn)
+    # No-ops on a fresh database, where create_all made all of these
+    _adopt_legacy_room_bookings(conn)
+    for model in (RoomBooking, FitnessClass, TrainingSession, Availability):
+        for index in model.__table__.indexes:
+            if index.name in LEGACY_INDEXES:
+                index.create(conn, checkfirst=True)
+    run_sql_file(conn, "view.sql")
+    # Drops the old overlap trigger now that the constraint is in place
+    run_sql_file(conn, "trigger.sql")
+
+def _default_rooms(conn: Connection):
+    if conn.execute(text('SELECT NOT EXISTS (SELECT 1 FROM "Room")')).scalar():
+        conn.execute(Room.__table__.insert(), [{"room_name": name} for name in ("Room A", "Room B", "Room C")])
+
+def _name_indexes(conn: Connection):
+    # lower(...) expression indexes behind app/identity.py
+    for model in (Member, Trainer, Admin):
+        for index in model.__table__.indexes:
+            if index.name.endswith("_lower"):
+                index.create(conn, checkfirst=True)
+
+def _class_availability(conn: Connection):
+    # Trigger-maintained table of bookable classes behind view_available_classes
+    ClassAvailability.__table__.create(conn, checkfirst=True)
+    run_sql_file(conn, "class_availability.sql")
+    run_sql_file(conn, "view.sql")
+
+def _class_availability_functions(conn: Connection):
+    # Re-creates the functions (now pruning on every refresh) and re-runs the backfill
+    run_sql_file(conn, "class_availability.sql")
+
+def _billing_idempotency(conn: Connection):
+    # Columns behind set-based billing cycles (app/billing.py); fresh databases get them from create_all
+    columns = {column["name"] for column in inspect(conn).get_columns("BillingPayment")}
+    if "idempotency_key" not in columns:
+        conn.execute(text('''ALTER TABLE "BillingPayment" ADD COLUMN billing_period date, ADD COLUMN idempotency_key varchar(100) UNIQUE'''))
+
+def _ledger(conn: Connection):
+    # Canonical statuses, payment/issue times, and the trigger-maintained ledger summaries
+    columns = {column["name"] for column in inspect(conn).get_columns("BillingPayment")}
+    if "created_at" not in columns:
+        conn.execute(text('''ALTER TABLE "BillingPayment" ADD COLUMN created_at timestamp NOT NULL DEFAULT localtimestamp, ADD COLUMN paid_at timestamp'''))
+    conn.execute(text('''
+        UPDATE "BillingPayment" SET status = CASE WHEN lower(trim(status)) = 'paid' THEN 'paid' ELSE 'due' END
+        WHERE status NOT IN ('due', 'paid')
+    '''))
+    if "ck_billingpayment_status" not in {check["name"] for check in inspect(conn).get_check_constraints("BillingPayment")}:
+        conn.execute(text('''ALTER TABLE "BillingPayment" ADD CONSTRAINT ck_billingpayment_status CHECK (status IN ('due', 'paid'))'''))
+    for index in BillingPayment.__table__.indexes:
+        index.create(conn, checkfirst=True)
+    MemberBalance.__table__.create(conn, checkfirst=True)
+    LedgerDaily.__table__.create(conn, checkfirst=True)
+    run_sql_file(conn, "ledger.sql")
+
+def _availability_time_index(conn: Connection):
+    # Every trainer's availability in a date window (app/slot_finder.py)
+    for index in Availability.__table__.indexes:
+        index.create(conn, checkfirst=True)
+
+def _recurring_availability(conn: Connection):
+    # Recurrence rules on Availability (app/recurrence.py); rows only flagged is_recurring repeat weekly
+    columns = {column["name"] for column in inspect(conn).get_columns("Availability")}
+    if "recurrence" not in columns:
+        conn.execute(text('''ALTER TABLE "Availability" ADD COLUMN recurrence varchar(10), ADD COLUMN repeat_until date, ADD COLUMN skip_dates date[]'''))
+    conn.execute(text('''UPDATE "Availability" SET recurrence = 'weekly' WHERE is_recurring AND recurrence IS NULL'''))
+    if "ck_availability_recurrence" not in {check["name"] for check in inspect(conn).get_check_constraints("Availability")}:
+        conn.execute(text('''ALTER TABLE "Availability" ADD CONSTRAINT ck_availability_recurrence CHECK (recurrence IN ('weekly', 'biweekly'))'''))
+    for index in Availability.__table__.indexes:
+        index.create(conn, checkfirst=True)
+
+# Indexes vetted with bench/index_advisor.py (seq scans of member-keyed tables, keyset listing sorts)
+ADVISED_INDEXES = ("ix_healthgoal_member", "ix_groupmember_member", "ix_trainingsession_member",
+                   "ix_roombooking_start", "ix_fitnessclass_name")
+
+def _advised_indexes(conn: Connection):
+    for model in (HealthGoal, GroupMember, TrainingSession, RoomBooking, FitnessClass):
+        for index in model.__table__.indexes:
+            if index.name in ADVISED_INDEXES:
+                index.create(conn, checkfirst=True)
+
+def _room_booking_changes(conn: Connection):
+    # Per-room change counters behind the cached occupancy heatmaps (app/occupancy.py)
+    RoomBookingChange.__table__.create(conn, checkfirst=True)
+    run_sql_file(conn, "occupancy.sql")
+
+def _version_columns(conn: Connection):
+    # Optimistic-concurrency counters for scheduling writes (app/database.py, scheduling.claim_trainer)
+    for model, name in ((FitnessClass, "version"), (RoomBooking, "version"), (TrainingSession, "version"), (Trainer, "schedule_version")):
+        columns = {column["name"] for column in inspect(conn).get_columns(model.__tablename__)}
+        if name not in columns:
+            conn.execute(text(f'ALTER TABLE "{model.__tablename__}" ADD COLUMN {name} integer NOT NULL DEFAULT 1'))
+
+def _room_overlap_rule(conn: Connection):
+    # Re-creates the constraint when whether it is partial (WHERE is_booked) differs from the model's;
+    # it was narrowed to booked rows by step 12 and covers every row again from step 13
+    partial = conn.execute(text("""
+        SELECT i.indpred IS NOT NULL FROM pg_constraint c JOIN pg_index i ON i.indexrelid = c.conindid
+        WHERE c.conname = :name
+    """), {"name": ROOM_OVERLAP_CONSTRAINT}).scalar()
+    if partial is not None and partial != (_room_overlap_constraint().where is not None):
+        conn.execute(text(f'ALTER TABLE "RoomBooking" DROP CONSTRAINT {ROOM_OVERLAP_CONSTRAINT}'))
+        _add_room_overlap_constraint(conn)
+
+# (version, name, step) in order; append only, never renumber
+MIGRATIONS = [
+    (1, "baseline schema", _baseline),
+    (2, "default rooms", _default_rooms),
+    (3, "case-insensitive name indexes", _name_indexes),
+    (4, "class availability", _class_availability),
+    (5, "billing idempotency keys", _billing_idempotency),
+    (6, "ledger summaries", _ledger),
+    (7, "availability time index", _availability_time_index),
+    (8, "recurring availability", _recurring_availability),
+    (9, "advised indexes", _advised_indexes),
+    (10, "room booking change counters", _room_booking_changes),
+    (11, "scheduling version columns", _version_columns),
+    (12, "booked-only room overlap constraint", _room_overlap_rule),
+    (13, "room overlap constraint over every booking", _room_overlap_rule),
+    (14, "prune ClassAvailability on refresh", _class_availability_functions),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def current_version(engine: Engine):
+    # The one query a warm start makes
+    with engine.connect() as conn:
+        try:
+            return conn.execute(text("SELECT coalesce(max(version), 0) FROM schema_version")).scalar()
+        except ProgrammingError:
+            return 0  # no schema_version table yet
+
+def migrate(engine: Engine, progress=print):
+    version = current_version(engine)
+    if version >= LATEST_VERSION:
+        return version
+
+    with engine.begin() as conn:
+        # Concurrent CREATE TABLE IF NOT EXISTS can still collide, so take the lock first
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version integer PRIMARY KEY,
+                name text NOT NULL,
+                applied_at timestamp NOT NULL DEFAULT now()
+            )
+        """))
+
+    for step_version, name, step in MIGRATIONS:
+        if step_version <= version:
+            continue
+        with engine.begin() as conn:
+            conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+            # Another process may have applied it while we waited for the lock
+            applied = conn.execute(text("SELECT EXISTS (SELECT 1 FROM schema_version WHERE version = :v)"), {"v": step_version}).scalar()
+            if not applied:
+                if progress:
+                    progress(f"Applying schema migration {step_version}: {name}")
+                step(conn)
+                conn.execute(text("INSERT INTO schema_version (version, name) VALUES (:v, :name)"), {"v": step_version, "name": name})
+        version = step_version
+    return version
+
+# Housekeeping on every start, after migrate(); each statement is cheap when there is nothing to do
+MAINTENANCE = [
+    "SELECT class_availability_prune()",  # classes that started while nothing refreshed ClassAvailability
+    "SELECT healthmetric_maintain_partitions()",  # the coming months' partitions; drains HealthMetric_default
+]
+
+def maintain(engine: Engine):
+    with engine.begin() as conn:
+        for statement in MAINTENANCE:
+            conn.execute(text(statement))
+
+def reset(engine: Engine):
+    # Destructive: disconnects every other client and drops all data
+    with engine.begin() as conn:
+        conn.execute(text("""
+            SELECT pg_terminate_backend(pid)
+            FROM pg_stat_activity
+            WHERE datname = current_database() AND pid <> pg_backend_pid();
+        """))
+        conn.execute(text("DROP SCHEMA public CASCADE;"))
+        conn.execute(text("CREATE SCHEMA public;"))
@@ -0,0 +1,150 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from datetime import datetime, timedelta
+from typing import NamedTuple
+import itertools
+import sys, os
+import numpy as np
+from identity import LRUTTLCache
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from models.records import RoomUtilizationRecord, PeakHourRecord
+
+# Room occupancy by hour of the week, computed with NumPy.
+# Booked RoomBooking rows overlapping [start, end) come back as (room rank, start, end) in seconds
+# from the range start. Each booking splits into its first hour, its last hour and the whole hours
+# in between. The partial hours are bincounted onto a (room, hour of the range) grid; the whole
+# hours are +1/-1 marks whose running sum fills them in. The grid then folds onto the 168 hours of
+# the week. A room's booked rows never overlap (ex_roombooking_room_overlap), so nothing exceeds 100%.
+# Results are cached per (range, room set). A cached answer is reused only while every room's
+# RoomBookingChange version (sql/occupancy.sql) and name are unchanged, so a booking made by any
+# process shows up on the next read.
+
+HOUR = 3600
+HOURS_PER_WEEK = 168
+DAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+
+# Read before the bookings: a change committed in between leaves the cached entry behind the
+# counters, so the next read recomputes rather than keeping stale numbers
+ROOMS_SQL = """
+    SELECT r.room_id, r.room_name, coalesce(c.version, 0)
+    FROM "Room" r LEFT JOIN "RoomBookingChange" c ON c.room_id = r.room_id
+    {room_filter}
+    ORDER BY r.room_id
+"""
+
+BOOKED_SQL = """
+    SELECT rb.room_id,
+           greatest(0, CAST(extract(epoch FROM rb.start_time - CAST(:start AS timestamp)) AS bigint)),
+           least(:span, CAST(extract(epoch FROM rb.end_time - CAST(:start AS timestamp)) AS bigint))
+    FROM "RoomBooking" rb
+    WHERE rb.is_booked AND rb.end_time > :start AND rb.start_time < :end {room_filter}
+"""
+
+class Occupancy(NamedTuple):
+    start: datetime  # on the hour
+    end: datetime
+    room_ids: np.ndarray  # rank -> room_id
+    room_names: tuple
+    booked_hours: np.ndarray  # (rooms, 168) hours booked per room and hour of the week; 0 = Monday 00:00
+    open_hours: np.ndarray  # (168,) how many of each hour of the week the range holds
+
+    def utilization(self):
+        # (rooms, 168) percent booked
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(self.open_hours > 0, self.booked_hours / self.open_hours * 100.0, 0.0)
+
+    def club_utilization(self):
+        # (168,) percent of all the rooms' hours booked
+        rooms = len(self.room_ids)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where((self.open_hours > 0) & (rooms > 0),
+                            self.booked_hours.sum(axis=0) / (self.open_hours * max(rooms, 1)) * 100.0, 0.0)
+
+    def heatmap(self):
+        # (7, 24) club utilization, day by hour
+        return self.club_utilization().reshape(7, 24)
+
+    def room_rows(self):
+        utilization = self.utilization()
+        total_hours = float(self.open_hours.sum())
+        for rank, (room_id, room_name) in enumerate(zip(self.room_ids.tolist(), self.room_names)):
+            booked = float(self.booked_hours[rank].sum())
+            peak = int(np.argmax(utilization[rank]))
+            yield RoomUtilizationRecord(room_id, room_name, round(booked, 2), round(booked / total_hours * 100.0, 2) if total_hours else 0.0,
+                                        peak // 24, peak % 24, round(float(utilization[rank, peak]), 2))
+
+    def peak_hours(self, top: int = 10):
+        # Busiest hours of the week across the rooms, busiest first
+        club = self.club_utilization()
+        if not len(self.room_ids):
+            return []
+        utilization = self.utilization()
+        busiest = np.argmax(utilization, axis=0)
+        order = np.argsort(-club, kind="stable")[:top]
+        return [PeakHourRecord(int(h) // 24, int(h) % 24, round(float(club[h]), 2), self.room_names[busiest[h]],
+                               round(float(utilization[busiest[h], h]), 2))
+                for h in order if club[h] > 0]
+
+def hour_of_week(moment: datetime):
+    return moment.weekday() * 24 + moment.hour
+
+def _range(start: datetime, end: datetime):
+    # Whole hours covering [start, end)
+    start = start.replace(minute=0, second=0, microsecond=0)
+    floor = end.replace(minute=0, second=0, microsecond=0)
+    return start, floor if floor == end else floor + timedelta(hours=1)
+
+def bin_booked_seconds(ranks: np.ndarray, starts: np.ndarray, ends: np.ndarray, rooms: int, hours: int):
+    # Booked seconds per (room rank, hour of the range), flattened room-major
+    keep = ends > starts
+    ranks, starts, ends = ranks[keep], starts[keep], ends[keep]
+    size = rooms * hours
+    first = starts // HOUR
+    last = (ends - 1) // HOUR  # the hour holding the booking's final second
+    base = ranks * hours
+    single = first == last
+    seconds = np.bincount(base + first, weights=np.where(single, ends - starts, (first + 1) * HOUR - starts), minlength=size)
+    spans = ~single
+    seconds += np.bincount(base[spans] + last[spans], weights=ends[spans] - last[spans] * HOUR, minlength=size)
+    # Whole hours strictly between first and last: +HOUR from first + 1, -HOUR from last, running sum.
+    # Every mark pair stays inside its room's stretch, so the sum is back to 0 at each room boundary
+    marks = np.bincount(base[spans] + first[spans] + 1, minlength=size) - np.bincount(base[spans] + last[spans], minlength=size)
+    seconds += np.cumsum(marks) * HOUR
+    return seconds
+
+def compute_occupancy(start: datetime, end: datetime, room_ids, room_names, ranks: np.ndarray, starts: np.ndarray, ends: np.ndarray):
+    rooms = len(room_ids)
+    hours = int((end - start).total_seconds()) // HOUR
+    week_hour = (hour_of_week(start) + np.arange(hours)) % HOURS_PER_WEEK
+    seconds = bin_booked_seconds(ranks, starts, ends, rooms, hours)
+    folded = (np.arange(rooms)[:, None] * HOURS_PER_WEEK + week_hour[None, :]).ravel()
+    booked = np.bincount(folded, weights=seconds, minlength=rooms * HOURS_PER_WEEK).reshape(rooms, HOURS_PER_WEEK) / HOUR
+    open_hours = np.bincount(week_hour, minlength=HOURS_PER_WEEK).astype(np.float64)
+    for array in (booked, open_hours):
+        array.flags.writeable = False  # shared by every reader of the cache
+    return Occupancy(start, end, np.asarray(room_ids, dtype=np.int64), tuple(room_names), booked, open_hours)
+
+cache = LRUTTLCache(maxsize=64, ttl=3600.0)
+
+def room_occupancy(session: Session, start: datetime, end: datetime, room_ids: list = None):
+    start, end = _range(start, end)
+    params = {"start": start, "end": end, "span": int((end - start).total_seconds())}
+    room_filter = ""
+    if room_ids is not None:
+        params["room_ids"] = sorted(set(room_ids))
+        room_filter = "WHERE r.room_id = ANY(:room_ids)"
+    rooms = tuple(tuple(row) for row in session.execute(text(ROOMS_SQL.format(room_filter=room_filter)), params))
+    key = (start, end, None if room_ids is None else tuple(params["room_ids"]))
+    cached = cache.get(key)
+    if cached is not None and cached[0] == rooms:
+        return cached[1]
+
+    rows = session.execute(text(BOOKED_SQL.format(room_filter="AND rb.room_id = ANY(:room_ids)" if room_ids is not None else "")), params).all()
+    data = np.fromiter(itertools.chain.from_iterable(rows), dtype=np.int64, count=len(rows) * 3).reshape(len(rows), 3)
+    ids = np.array([room[0] for room in rooms], dtype=np.int64)
+    ranks = np.minimum(np.searchsorted(ids, data[:, 0]), max(len(ids) - 1, 0))
+    known = ids[ranks] == data[:, 0] if len(ids) else np.zeros(len(data), dtype=bool)  # a room added after ROOMS_SQL ran waits for the next read
+    occupancy = compute_occupancy(start, end, ids, [room[1] for room in rooms], ranks[known], data[known, 1], data[known, 2])
+    cache.put(key, (rooms, occupancy))
+    return occupancy
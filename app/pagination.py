@@ -0,0 +1,32 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import Select, tuple_
+import sys, os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from models.records import Page
+
+PAGE_SIZE = 50
+
+# Keyset pagination for listings. Each page is its own short query,
+# WHERE (keys) > (last row's keys) ORDER BY keys LIMIT page_size, streamed off a
+# server-side cursor, so memory and query cost stay bounded by the page size
+# whatever the table size. `keys` must be selected by `stmt` and end in a unique column.
+# With `record` (a NamedTuple from models.records whose fields match the selected columns), each
+# row is handed back as that plain tuple instead of a Row.
+def keyset_pages(session: Session, stmt: Select, keys: list, page_size: int = PAGE_SIZE, after: tuple = None, record: type = None):
+    key_names = [key.key for key in keys]
+    while True:
+        page_stmt = stmt
+        if after is not None:
+            page_stmt = page_stmt.where(tuple_(*keys) > tuple_(*after))
+        page_stmt = page_stmt.order_by(*keys).limit(page_size).execution_options(yield_per=page_size)
+
+        rows = []
+        for partition in session.execute(page_stmt).partitions():
+            rows.extend(map(record._make, partition) if record else partition)
+        if not rows:
+            return
+        after = tuple(getattr(rows[-1], name) for name in key_names)
+        yield Page(rows, after if len(rows) == page_size else None)
+        if len(rows) < page_size:
+            return
@@ -0,0 +1,139 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from datetime import date, datetime, time, timedelta
+from typing import NamedTuple, Optional
+from bisect import bisect_right
+import functools
+import itertools
+
+# Recurring trainer availability. A recurring Availability row is a rule: its start_time/end_time
+# are the first occurrence, repeated every week or every other week up to repeat_until (the last
+# day an occurrence may start), minus the dates in skip_dates. Rules are only ever expanded over
+# the window being asked about, never stored one row per week. Expansions are memoized per
+# (trainer's rules, window): the rules themselves are part of the key, so an edit anywhere
+# (this kiosk or another) is simply a different key and nothing has to be invalidated.
+
+WEEKLY = "weekly"
+BIWEEKLY = "biweekly"
+PERIODS = {WEEKLY: timedelta(weeks=1), BIWEEKLY: timedelta(weeks=2)}
+CYCLE = timedelta(weeks=2)  # every pattern repeats after this once its rules have started
+
+EXPANSION_CACHE_SIZE = 4096
+
+# One-off rows overlapping the window, and rules with an occurrence that can reach into it
+RULES_SQL = text("""
+    SELECT availability_id, trainer_id, is_recurring, recurrence, start_time, end_time, repeat_until, skip_dates
+    FROM "Availability"
+    WHERE (CAST(:trainer_id AS integer) IS NULL OR trainer_id = :trainer_id)
+      AND ((is_recurring AND start_time < :end
+            AND (repeat_until IS NULL OR repeat_until + 1 + (end_time - start_time) > :start))
+           OR (NOT is_recurring AND NOT :recurring_only AND end_time > :start AND start_time < :end))
+    ORDER BY trainer_id, availability_id
+""")
+
+class Rule(NamedTuple):
+    availability_id: int
+    start_time: datetime
+    end_time: datetime
+    recurrence: Optional[str]  # None: a one-off window
+    repeat_until: Optional[date]
+    skip_dates: frozenset
+
+    @classmethod
+    def of(cls, availability):
+        # From an Availability object or a RULES_SQL row; rows only flagged is_recurring repeat weekly
+        recurrence = (availability.recurrence or WEEKLY) if availability.is_recurring else None
+        return cls(availability.availability_id, availability.start_time, availability.end_time,
+                   recurrence, availability.repeat_until, frozenset(availability.skip_dates or ()))
+
+    @property
+    def length(self):
+        return self.end_time - self.start_time
+
+    def last_end(self):
+        # When the last occurrence can end; None if the rule never stops
+        if self.recurrence is None:
+            return self.end_time
+        if self.repeat_until is None:
+            return None
+        return datetime.combine(self.repeat_until + timedelta(days=1), time()) + self.length
+
+    def repeats_on(self, day: date):
+        # Whether the pattern has an occurrence starting on `day` (skipped or not)
+        first = self.start_time.date()
+        if self.recurrence is None:
+            return day == first
+        return (first <= day and (self.repeat_until is None or day <= self.repeat_until)
+                and (day - first) % PERIODS[self.recurrence] == timedelta(0))
+
+    def occurrences(self, start: datetime, end: datetime):
+        # (start, end) of every occurrence overlapping [start, end), in order
+        if self.recurrence is None:
+            if self.end_time > start and self.start_time < end:
+                yield self.start_time, self.end_time
+            return
+        period = PERIODS[self.recurrence]
+        n = max(0, (start - self.end_time) // period + 1)  # first occurrence ending after start
+        while True:
+            occurrence = self.start_time + n * period
+            if occurrence >= end or (self.repeat_until and occurrence.date() > self.repeat_until):
+                return
+            if occurrence.date() not in self.skip_dates:
+                yield occurrence, occurrence + self.length
+            n += 1
+
+class Expansion(NamedTuple):
+    # Availability windows sorted by start; reach[i] = latest end among the first i + 1
+    starts: tuple
+    ends: tuple
+    reach: tuple
+
+    def intervals(self):
+        return zip(self.starts, self.ends)
+
+    def covers(self, start: datetime, end: datetime):
+        # True if one window spans all of [start, end]
+        i = bisect_right(self.starts, start) - 1
+        return i >= 0 and self.reach[i] >= end
+
+@functools.lru_cache(maxsize=EXPANSION_CACHE_SIZE)
+def expand(rules: tuple, start: datetime, end: datetime):
+    # Every occurrence of `rules` (one trainer's) overlapping [start, end)
+    intervals = sorted(itertools.chain.from_iterable(rule.occurrences(start, end) for rule in rules))
+    starts = tuple(s for s, _ in intervals)
+    ends = tuple(e for _, e in intervals)
+    return Expansion(starts, ends, tuple(itertools.accumulate(ends, max)))
+
+def load_rules(session: Session, start: datetime, end: datetime, trainer_id: int = None, recurring_only: bool = False):
+    # trainer_id -> tuple of Rules that can put availability inside [start, end)
+    rows = session.execute(RULES_SQL, {"trainer_id": trainer_id, "start": start, "end": end, "recurring_only": recurring_only})
+    return {trainer: tuple(Rule.of(row) for row in group) for trainer, group in itertools.groupby(rows, key=lambda row: row.trainer_id)}
+
+def trainer_windows(session: Session, trainer_id: int, start: datetime, end: datetime):
+    # One trainer's availability in [start, end): one-off rows and recurring occurrences together
+    rules = load_rules(session, start, end, trainer_id).get(trainer_id, ())
+    return expand(rules, start, end)
+
+def recurring_windows(session: Session, start: datetime, end: datetime, trainer_id: int = None):
+    # (trainer_id, start, end) of every recurring occurrence in [start, end), one cached expansion per trainer
+    for trainer, rules in load_rules(session, start, end, trainer_id, recurring_only=True).items():
+        for window in expand(rules, start, end).intervals():
+            yield (trainer, *window)
+
+def overlaps(a: Rule, b: Rule):
+    # Whether any occurrences of two rules overlap. Once both have started and the last skipped date
+    # is behind, the pair repeats every CYCLE, so one cycle past that answers it for all time.
+    longest = max(a.length, b.length)
+    lo = max(a.start_time, b.start_time) - longest
+    last_skip = max(itertools.chain(a.skip_dates, b.skip_dates), default=None)
+    settled = max(lo, datetime.combine(last_skip + timedelta(days=1), time())) if last_skip else lo
+    hi = settled + CYCLE + 2 * longest
+    for rule in (a, b):
+        last_end = rule.last_end()
+        if last_end is not None:
+            hi = min(hi, last_end)
+    if hi <= lo:
+        return False
+    ours = list(a.occurrences(lo, hi))
+    return any(start < other_end and end > other_start
+               for other_start, other_end in b.occurrences(lo, hi) for start, end in ours)
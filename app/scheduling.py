@@ -0,0 +1,98 @@
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy import text
+import sys, os
+from datetime import datetime
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import recurrence
+
+# Trainer conflict checks shared by PT booking, rescheduling and class creation.
+# Every candidate window is answered by one indexed query instead of walking
+# trainer.availability / trainer.sessions / trainer.classes in Python. Availability
+# (one-off rows and recurring rules) is expanded once over the whole batch (app/recurrence.py).
+
+TRAINER_WINDOWS_SQL = text("""
+    SELECT
+        w.idx,
+        EXISTS (
+            SELECT 1 FROM "TrainingSession" ts
+            JOIN "RoomBooking" rb ON rb.booking_id = ts.booking_id
+            WHERE ts.trainer_id = :trainer_id
+              AND (CAST(:exclude_session_id AS integer) IS NULL OR ts.session_id <> :exclude_session_id)
+              AND rb.end_time > w.start_time
+              AND rb.start_time < w.end_time
+              AND rb.end_time > :min_start
+              AND rb.start_time < :max_end
+        ) AS session_clash,
+        EXISTS (
+            SELECT 1 FROM "FitnessClass" fc
+            JOIN "RoomBooking" rb ON rb.booking_id = fc.booking_id
+            WHERE fc.trainer_id = :trainer_id
+              AND rb.end_time > w.start_time
+              AND rb.start_time < w.end_time
+              AND rb.end_time > :min_start
+              AND rb.start_time < :max_end
+        ) AS class_clash
+    -- :min_start / :max_end bound the whole batch with plain constants so the
+    -- planner can pick the time indexes even though each window is only known per row
+    FROM unnest(CAST(:starts AS timestamp[]), CAST(:ends AS timestamp[])) WITH ORDINALITY AS w(start_time, end_time, idx)
+    ORDER BY w.idx
+""")
+
+NOT_AVAILABLE = "Trainer is not available for that booking time."
+SESSION_CLASH = "Trainer already has another PT session at that time."
+CLASS_CLASH = "Trainer is teaching a class at that time."
+
+def trainer_conflicts(session: Session, trainer_id: int, windows: list[tuple[datetime, datetime]], exclude_session_id: int = None):
+    # Returns one entry per (start, end) window: None if the trainer is free, else the reason
+    if not windows:
+        return []
+
+    min_start = min(start for start, _ in windows)
+    max_end = max(end for _, end in windows)
+    availability = recurrence.trainer_windows(session, trainer_id, min_start, max_end)
+    rows = session.execute(TRAINER_WINDOWS_SQL, {
+        "trainer_id": trainer_id,
+        "exclude_session_id": exclude_session_id,
+        "starts": [start for start, _ in windows],
+        "ends": [end for _, end in windows],
+        "min_start": min_start,
+        "max_end": max_end,
+    }).all()
+
+    reasons = []
+    for (start, end), row in zip(windows, rows):
+        if not availability.covers(start, end):
+            reasons.append(NOT_AVAILABLE)
+        elif row.session_clash:
+            reasons.append(SESSION_CLASH)
+        elif row.class_clash:
+            reasons.append(CLASS_CLASH)
+        else:
+            reasons.append(None)
+    return reasons
+
+def trainer_conflict(session: Session, trainer_id: int, start: datetime, end: datetime, exclude_session_id: int = None):
+    return trainer_conflicts(session, trainer_id, [(start, end)], exclude_session_id)[0]
+
+# A conflict check only holds until someone else books the trainer. Writers read the trainer's
+# schedule_version before checking and claim it (version + 1) before committing; the claim of a
+# writer whose check went stale matches no row, and the retry wrapper (app/database.py) runs it
+# again. The trainer row stays locked only from the claim to that transaction's commit.
+SCHEDULE_VERSION_SQL = text('SELECT schedule_version FROM "Trainer" WHERE trainer_id = :trainer_id')
+
+CLAIM_TRAINER_SQL = text("""
+    UPDATE "Trainer" SET schedule_version = schedule_version + 1
+    WHERE trainer_id = :trainer_id AND schedule_version = :seen
+""")
+
+def schedule_version(session: Session, trainer_id: int):
+    return session.execute(SCHEDULE_VERSION_SQL, {"trainer_id": trainer_id}).scalar()
+
+def claim_trainer(session: Session, trainer_id: int, seen: int):
+    if session.execute(CLAIM_TRAINER_SQL, {"trainer_id": trainer_id, "seen": seen}).rowcount != 1:
+        raise StaleDataError(f"Trainer {trainer_id}'s schedule changed since it was checked.")
+
+def trainer_is_free(session: Session, trainer_id: int, start: datetime, end: datetime, exclude_session_id: int = None):
+    return trainer_conflict(session, trainer_id, start, end, exclude_session_id) is None
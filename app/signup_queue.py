@@ -0,0 +1,95 @@
+from sqlalchemy.orm import sessionmaker
+from typing import NamedTuple
+import asyncio
+import time
+import member_functions
+
+# asyncio front-end for class-opening bursts.
+# register() parks each request on its class's queue. One flusher per class waits max_wait
+# for the burst to build up, then applies up to max_batch requests in a single transaction
+# (member_functions.register_batch, arrival order, up to capacity) on a worker thread and
+# resolves every caller's future with its own result. Different classes flush in parallel.
+
+class SignupStats(NamedTuple):
+    requests: int
+    batches: int  # = commits
+    avg_batch: float
+    max_batch: int
+    p50_wait_ms: float  # enqueue -> result
+    p95_wait_ms: float
+
+class SignupQueue:
+    def __init__(self, Session: sessionmaker, max_batch: int = 200, max_wait: float = 0.005):
+        self.Session = Session
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._pending = {}  # class_id -> [(member_id, future, enqueued_at)]
+        self._flushers = {}  # class_id -> task
+        self._batch_sizes = []
+        self._waits = []
+
+    async def register(self, member_id: int, class_id: int):
+        future = asyncio.get_running_loop().create_future()
+        self._pending.setdefault(class_id, []).append((member_id, future, time.perf_counter()))
+        if class_id not in self._flushers:
+            self._flushers[class_id] = asyncio.create_task(self._flush_class(class_id))
+        return await future
+
+    async def drain(self):
+        while self._flushers:
+            await asyncio.gather(*list(self._flushers.values()), return_exceptions=True)
+
+    async def _flush_class(self, class_id: int):
+        batch = []
+        try:
+            while self._pending.get(class_id):
+                await asyncio.sleep(self.max_wait)
+                queue = self._pending[class_id]
+                batch = queue[:self.max_batch]
+                del queue[:self.max_batch]
+                try:
+                    results = await asyncio.to_thread(self._apply, class_id, [member_id for member_id, _, _ in batch])
+                except Exception as e:
+                    for _, future, _ in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                finished = time.perf_counter()
+                self._batch_sizes.append(len(batch))
+                for (_, future, enqueued_at), result in zip(batch, results):
+                    self._waits.append(finished - enqueued_at)
+                    if not future.done():
+                        future.set_result(result)
+        finally:
+            # No await between the empty check above and here, so nothing can slip in unseen.
+            # Cancelled (e.g. at shutdown) instead: fail every caller still waiting rather than
+            # leave it hanging; a batch in flight may or may not have committed.
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(RuntimeError("Signup queue stopped; the registration may or may not have been applied."))
+            for _, future, _ in self._pending.pop(class_id, ()):
+                if not future.done():
+                    future.set_exception(RuntimeError("Signup queue stopped before the registration was applied."))
+            self._flushers.pop(class_id, None)
+
+    def _apply(self, class_id: int, member_ids: list):
+        with self.Session() as session:
+            try:
+                return member_functions.register_batch(session, class_id, member_ids)
+            except Exception:
+                session.rollback()
+                raise
+
+    def stats(self):
+        waits = sorted(self._waits)
+        def percentile(pct):
+            return round(waits[min(len(waits) - 1, int(len(waits) * pct))] * 1000, 3) if waits else 0.0
+        batches = len(self._batch_sizes)
+        return SignupStats(
+            requests=sum(self._batch_sizes),
+            batches=batches,
+            avg_batch=round(sum(self._batch_sizes) / batches, 1) if batches else 0.0,
+            max_batch=max(self._batch_sizes, default=0),
+            p50_wait_ms=percentile(0.5),
+            p95_wait_ms=percentile(0.95),
+        )
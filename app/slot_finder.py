@@ -0,0 +1,219 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from datetime import datetime, timedelta
+from typing import NamedTuple
+import itertools
+import sys
+import numpy as np
+import recurrence
+import instrumentation
+
+# Free PT slots for every trainer at once, computed with a sorted-interval sweep in NumPy.
+# Each trainer gets its own stretch of one integer axis: key = rank * span + seconds since the
+# window start, with span longer than the window. Availability windows and busy intervals
+# (TrainingSession / FitnessClass bookings) of every trainer then sort into one array and a single
+# cumulative sum over +1/-1 events gives, for every stretch between events, "available" and "busy" depths.
+# Free = available and not busy. Like scheduling.trainer_conflict, a slot must also fit inside
+# one availability window (a one-off row or one occurrence of a recurring rule, see app/recurrence.py),
+# and a busy interval only touching it doesn't clash.
+
+DEFAULT_STEP = timedelta(minutes=15)
+
+# Times come back as whole seconds since the window start, clipped to [0, window]
+SECONDS = "greatest(0, least(:window, CAST(extract(epoch FROM {column} - CAST(:start AS timestamp)) AS bigint)))"
+
+AVAILABILITY_SQL = """
+    SELECT a.trainer_id, """ + SECONDS.format(column="a.start_time") + ", " + SECONDS.format(column="a.end_time") + """
+    FROM "Availability" a
+    WHERE NOT a.is_recurring AND a.end_time > :start AND a.start_time < :end {availability_filter}
+"""
+
+BUSY_SQL = """
+    SELECT ts.trainer_id, """ + SECONDS.format(column="rb.start_time") + ", " + SECONDS.format(column="rb.end_time") + """
+    FROM "TrainingSession" ts
+    JOIN "RoomBooking" rb ON rb.booking_id = ts.booking_id
+    WHERE rb.end_time > :start AND rb.start_time < :end {session_filter}
+    UNION ALL
+    SELECT fc.trainer_id, """ + SECONDS.format(column="rb.start_time") + ", " + SECONDS.format(column="rb.end_time") + """
+    FROM "FitnessClass" fc
+    JOIN "RoomBooking" rb ON rb.booking_id = fc.booking_id
+    WHERE rb.end_time > :start AND rb.start_time < :end {class_filter}
+"""
+
+FREE_ROOM_BOOKINGS_SQL = text("""
+    SELECT rb.booking_id, """ + SECONDS.format(column="rb.start_time") + ", " + SECONDS.format(column="rb.end_time") + """
+    FROM "RoomBooking" rb
+    WHERE NOT rb.is_booked AND rb.start_time >= :start AND rb.end_time <= :end
+      AND rb.end_time - rb.start_time >= :duration
+    ORDER BY rb.start_time, rb.booking_id
+""")
+
+BOOKING_DETAILS_SQL = text("""
+    SELECT rb.booking_id, r.room_name, rb.start_time, rb.end_time FROM "RoomBooking" rb
+    JOIN "Room" r ON r.room_id = rb.room_id
+    WHERE rb.booking_id = ANY(:ids)
+""")
+
+TRAINER_NAMES_SQL = text('SELECT trainer_id, name FROM "Trainer" WHERE trainer_id = ANY(:ids)')
+
+class FreeTime(NamedTuple):
+    # Everything in seconds on the per-trainer key axis (see module comment)
+    start: datetime  # window start; key 0 of every trainer's stretch
+    span: int
+    trainer_ids: np.ndarray  # rank -> trainer_id
+    free_start: np.ndarray  # merged free intervals, sorted by key
+    free_end: np.ndarray
+    avail_start: np.ndarray  # availability windows sorted by key start
+    avail_reach: np.ndarray  # running max of their ends (how far any row started so far reaches)
+
+    def contains(self, ranks: np.ndarray, starts: np.ndarray, ends: np.ndarray):
+        # Per (rank, start, end) in window seconds: free throughout and inside one availability window
+        key_start = ranks * self.span + starts
+        key_end = ranks * self.span + ends
+        i = np.searchsorted(self.free_start, key_start, side="right") - 1
+        free = (i >= 0) & (self.free_end[np.maximum(i, 0)] >= key_end)
+        j = np.searchsorted(self.avail_start, key_start, side="right") - 1
+        inside = (j >= 0) & (self.avail_reach[np.maximum(j, 0)] >= key_end)
+        return free & inside
+
+class SlotRow(NamedTuple):
+    trainer_id: int
+    trainer_name: str
+    start_time: datetime
+    end_time: datetime
+
+class Slots(NamedTuple):
+    # Every feasible start, ordered by trainer then time
+    trainer_id: np.ndarray
+    start_time: np.ndarray  # datetime64[s]
+    duration: timedelta
+    trainer_names: dict
+
+    def rows(self):
+        for trainer_id, start in zip(self.trainer_id.tolist(), self.start_time.astype(datetime).tolist()):
+            yield SlotRow(trainer_id, self.trainer_names.get(trainer_id, ""), start, start + self.duration)
+
+class BookableSlotRow(NamedTuple):
+    trainer_id: int
+    trainer_name: str
+    booking_id: int
+    room_name: str
+    start_time: datetime
+    end_time: datetime
+
+class BookableSlots(NamedTuple):
+    # (trainer, free room booking) pairs ordered by booking time, then trainer
+    trainer_id: np.ndarray
+    booking_id: np.ndarray
+
+    def __len__(self):
+        return len(self.booking_id)
+
+    def rows(self, session: Session):
+        # Names and times for display, looked up in two queries
+        names = dict(session.execute(TRAINER_NAMES_SQL, {"ids": np.unique(self.trainer_id).tolist()}).all())
+        bookings = {row.booking_id: row for row in session.execute(BOOKING_DETAILS_SQL, {"ids": np.unique(self.booking_id).tolist()})}
+        for trainer_id, booking_id in zip(self.trainer_id.tolist(), self.booking_id.tolist()):
+            booking = bookings[booking_id]
+            yield BookableSlotRow(trainer_id, names.get(trainer_id, ""), booking_id, booking.room_name, booking.start_time, booking.end_time)
+
+def _union(keys_start: np.ndarray, keys_end: np.ndarray):
+    # Merge overlapping/touching intervals; input in any order
+    if len(keys_start) == 0:
+        return keys_start, keys_end
+    order = np.argsort(keys_start, kind="stable")
+    keys_start, keys_end = keys_start[order], keys_end[order]
+    reach = np.maximum.accumulate(keys_end)
+    new_run = np.ones(len(keys_start), dtype=bool)
+    new_run[1:] = keys_start[1:] > reach[:-1]
+    run_starts = np.flatnonzero(new_run)
+    return keys_start[run_starts], np.maximum.reduceat(keys_end, run_starts)
+
+def _columns(rows, count: int):
+    # Integer result rows -> one int64 array per column
+    table = np.fromiter(itertools.chain.from_iterable(rows), dtype=np.int64, count=len(rows) * count).reshape(len(rows), count)
+    return tuple(table[:, i] for i in range(count))
+
+def free_time(session: Session, start: datetime, end: datetime, trainer_id: int = None):
+    window = int((end - start).total_seconds())
+    span = window + 1
+    params = {"start": start, "end": end, "window": window, "trainer_id": trainer_id}
+    def only_trainer(alias):
+        return f"AND {alias}.trainer_id = :trainer_id" if trainer_id is not None else ""
+    def seconds(moment):
+        return min(window, max(0, int((moment - start).total_seconds())))
+    one_off = session.execute(text(AVAILABILITY_SQL.format(availability_filter=only_trainer("a"))), params).all()
+    recurring = [(trainer, seconds(s), seconds(e)) for trainer, s, e in recurrence.recurring_windows(session, start, end, trainer_id)]
+    a_ids, a_start, a_end = _columns(one_off + recurring, 3)
+    b_ids, b_start, b_end = _columns(session.execute(text(BUSY_SQL.format(session_filter=only_trainer("ts"), class_filter=only_trainer("fc"))), params).all(), 3)
+
+    trainer_ids = np.unique(a_ids)
+    if len(trainer_ids) == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return FreeTime(start, span, trainer_ids, empty, empty, empty, empty)
+
+    # Onto the key axis; busy intervals only matter for trainers with availability
+    a_rank = np.searchsorted(trainer_ids, a_ids)
+    a_start, a_end = a_rank * span + a_start, a_rank * span + a_end
+    known = np.isin(b_ids, trainer_ids)
+    b_rank = np.searchsorted(trainer_ids, b_ids[known])
+    b_start, b_end = b_rank * span + b_start[known], b_rank * span + b_end[known]
+
+    # Sweep: +1/-1 events for available and busy depth, one cumulative sum over every trainer
+    keys = np.concatenate([a_start, a_end, b_start, b_end])
+    d_avail = np.concatenate([np.ones_like(a_start), -np.ones_like(a_end), np.zeros_like(b_start), np.zeros_like(b_end)])
+    d_busy = np.concatenate([np.zeros_like(a_start), np.zeros_like(a_end), np.ones_like(b_start), -np.ones_like(b_end)])
+    order = np.argsort(keys, kind="stable")
+    keys, depth_avail, depth_busy = keys[order], np.cumsum(d_avail[order]), np.cumsum(d_busy[order])
+    # Stretch i runs from keys[i] to keys[i + 1], after every event at keys[i]
+    last_at_key = np.ones(len(keys), dtype=bool)
+    last_at_key[:-1] = keys[1:] != keys[:-1]
+    keys, depth_avail, depth_busy = keys[last_at_key], depth_avail[last_at_key], depth_busy[last_at_key]
+    free = (depth_avail[:-1] > 0) & (depth_busy[:-1] == 0)
+    free_start, free_end = _union(keys[:-1][free], keys[1:][free])
+
+    order = np.argsort(a_start, kind="stable")
+    return FreeTime(start, span, trainer_ids, free_start, free_end, a_start[order], np.maximum.accumulate(a_end[order]))
+
+def find_slots(session: Session, start: datetime, end: datetime, duration: timedelta, trainer_id: int = None, step: timedelta = DEFAULT_STEP):
+    # Every start on the step grid (aligned to the clock, e.g. :00/:15/:30/:45) where the trainer is free for `duration`
+    free = free_time(session, start, end, trainer_id)
+    length = int(duration.total_seconds())
+    stride = int(step.total_seconds())
+
+    rank = free.free_start // free.span
+    local_start = free.free_start - rank * free.span
+    local_end = free.free_end - rank * free.span
+    clock_offset = int((start - datetime.min).total_seconds()) % stride
+    first = local_start + (-(local_start + clock_offset)) % stride
+    counts = np.where(local_end - length >= first, (local_end - length - first) // stride + 1, 0)
+
+    # Expand each interval into its grid of starts
+    total = int(counts.sum())
+    interval = np.repeat(np.arange(len(counts)), counts)
+    position = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    slot_rank = rank[interval]
+    slot_start = first[interval] + position * stride
+    keep = free.contains(slot_rank, slot_start, slot_start + length)
+
+    trainer_ids = free.trainer_ids[slot_rank[keep]]
+    names = dict(session.execute(TRAINER_NAMES_SQL, {"ids": np.unique(trainer_ids).tolist()}).all()) if total else {}
+    starts = np.datetime64(start, "s") + slot_start[keep].astype("timedelta64[s]")
+    return Slots(trainer_ids, starts, duration, names)
+
+def bookable_slots(session: Session, start: datetime, end: datetime, trainer_id: int = None, duration: timedelta = timedelta(0)):
+    # (trainer, free room booking) pairs a PT session can be booked on right away: the booking is
+    # unbooked, at least `duration` long, and the trainer is free for all of it
+    free = free_time(session, start, end, trainer_id)
+    params = {"start": start, "end": end, "window": free.span - 1, "duration": duration}
+    booking_ids, b_start, b_end = _columns(session.execute(FREE_ROOM_BOOKINGS_SQL, params).all(), 3)
+    trainers = len(free.trainer_ids)
+
+    # Every booking against every trainer, booking-major so the result stays in time order
+    booking_index = np.repeat(np.arange(len(booking_ids)), trainers)
+    ranks = np.tile(np.arange(trainers), len(booking_ids))
+    ok = free.contains(ranks, b_start[booking_index], b_end[booking_index])
+    return BookableSlots(free.trainer_ids[ranks[ok]], booking_ids[booking_index[ok]])
+
+# Every public function above is a traced operation (app/instrumentation.py)
+instrumentation.trace_module(sys.modules[__name__])
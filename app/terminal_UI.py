@@ -3,9 +3,26 @@ import time
 import member_functions
 import trainer_functions
 import admin_functions
+import billing
+import slot_finder
+import recurrence
+import instrumentation
+import occupancy
+import database
 from sqlalchemy.orm import Session
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
+from typing import Callable, ContextManager
 from models.schemas import Admin, Trainer, Member, RoomBooking, FitnessClass, TrainingSession, BillingPayment
+from models.records import Page
+
+# One unit of work per menu action: every action opens `with scope() as session`, which commits
+# (or rolls back) and closes when the action is done, so a desk left at a menu all shift holds no
+# connection or open transaction between actions and nothing loaded for one action lingers into
+# the next (bench/kiosk_memory.py). Logged-in members, trainers and admins are handed between
+# actions by primary key and reloaded with session.get, so each action reads current rows instead
+# of objects cached since login. Anything shown after its scope closed is a record
+# (models/records.py), never an ORM object.
+Scope = Callable[[], ContextManager[Session]]
 
 def clear_screen():
 	if os.name == "nt":
@@ -30,7 +47,97 @@ def prompt_int(text, required=True):
 			return int(val)
 		print("Enter a valid integer.")
 
-def main_menu(session: Session = None):
+def prompt_date(text):
+	while True:
+		val = prompt(text, required=False)
+		if not val:
+			return None
+		try:
+			return datetime.strptime(val, "%Y-%m-%d")
+		except ValueError:
+			print("Enter a date as YYYY-MM-DD.")
+
+# The domain functions don't print; their Outcomes (models/records.py) are shown here. Call it inside
+# the action's scope, since id_attr is read from the ORM object the outcome carries.
+def show_outcome(outcome, id_attr=None):
+	if outcome and id_attr:
+		print(f"{outcome.message} (id: {getattr(outcome.value, id_attr)})")
+	else:
+		print(outcome.message)
+	return outcome
+
+# Listings arrive a page at a time (see pagination.keyset_pages)
+def show_pages(pages, format_row, empty_message="Nothing to show."):
+	shown = 0
+	for page in pages:
+		for row in page.rows:
+			print(format_row(row))
+		shown += len(page.rows)
+		if page.after is None:
+			break
+		if prompt(f"-- {shown} shown; Enter for more, q to stop", required=False).lower() == "q":
+			break
+	if shown == 0:
+		print(empty_message)
+
+# Rows already in memory, shown through show_pages like the database listings
+def list_pages(rows, page_size=50):
+	for i in range(0, len(rows), page_size):
+		yield Page(rows[i:i + page_size], (i + page_size,) if i + page_size < len(rows) else None)
+
+def format_member(row):
+	return f"Member({row.member_id}, {row.name!r}, {row.date_of_birth}, {row.gender!r}, {row.contact_detail!r})"
+
+def format_trainer(row):
+	return f"Trainer({row.trainer_id}, {row.name!r})"
+
+def format_admin(row):
+	return f"Admin({row.admin_id}, {row.name!r})"
+
+def format_room(row):
+	return f"Room({row.room_id}, {row.room_name!r})"
+
+def format_room_booking(row):
+	return (
+		f"Booking ID: {row.booking_id}, "
+		f"Room: {row.room_name}, "
+		f"Booked: {row.is_booked}, "
+		f"Start: {row.start_time}, "
+		f"End: {row.end_time}"
+	)
+
+def format_available_class(row):
+	return (
+		f"Class ID: {row.class_id}, {row.class_name} with {row.trainer_name}, "
+		f"Room: {row.room_name}, Start: {row.start_time}, End: {row.end_time}, "
+		f"Seats left: {row.seats_left}/{row.capacity}"
+	)
+
+def format_fitness_class(row):
+	return (
+		f"Class ID: {row.class_id}, {row.class_name} with {row.trainer_name}, "
+		f"Room: {row.room_name}, Start: {row.start_time}, End: {row.end_time}, "
+		f"Signed up: {row.num_signed_up}/{row.capacity}"
+	)
+
+def format_equipment(row):
+	return f"{row.equipment_id} | {row.admin_id} | {row.admin_operation} | {row.status}"
+
+def format_billing(row):
+	return (
+		f"Billing ID: {row.billing_id}, Member: {row.member_id}, {row.type_of_billing}, "
+		f"${row.amount_due}, {row.status}, {row.payment_method or '-'}"
+	)
+
+def format_balance(row):
+	last = f"{row.last_payment_at:%Y-%m-%d} (${row.last_payment_amount})" if row.last_payment_at else "never"
+	return f"Member {row.member_id}: ${row.outstanding} outstanding on {row.open_invoices} open invoices, last payment {last}"
+
+def format_revenue(row):
+	return (f"{row.period_start} {row.type_of_billing}: invoiced {row.invoiced_count} (${row.invoiced_amount}), "
+			f"paid {row.paid_count} (${row.paid_amount})")
+
+def main_menu(scope: Scope = database.session_scope):
 	print("Welcome to the Health & Fitness Club Management System!")
 	while True:
 		clear_screen()
@@ -42,13 +149,13 @@ def main_menu(session: Session = None):
 		print("0) Quit")
 		c = prompt("Choose role (0-4)")
 		if c == "1":
-			member_flow(session)
+			member_flow(scope)
 		elif c == "2":
-			trainer_flow(session)
+			trainer_flow(scope)
 		elif c == "3":
-			admin_flow(session)
+			admin_flow(scope)
 		elif c == "4":
-			debug_flow(session)
+			debug_flow(scope)
 		elif c == "0":
 			print("Bye")
 			break
@@ -56,23 +163,82 @@ def main_menu(session: Session = None):
 			print("Invalid choice")
 			time.sleep(0.8)
 
-def debug_flow(session: Session):
+def format_operation_summary(row):
+	flag = f"  N+1 suspected in {row.n_plus_one_calls} call(s)" if row.n_plus_one_calls else ""
+	return (f"{row.name}: {row.calls} call(s), {row.statements} statements (max {row.max_statements} in one call), "
+			f"{row.db_ms:.1f} ms in the database{flag}")
+
+def format_retry_summary(row):
+	return f"{row.operation}: {row.calls} call(s), {row.retries} retried conflict(s) ({row.retry_rate:.0%}), gave up {row.gave_up}"
+
+def format_operation_report(report):
+	lines = [f"{report.started_at:%H:%M:%S} {report.name}: {report.statements} statements, {report.db_ms:.1f} ms DB / {report.seconds * 1000:.1f} ms total"]
+	for stats in report.repeated:
+		lines.append(f"\tN+1? {stats.count}x ({stats.distinct_params} distinct parameter sets, {stats.total_ms:.1f} ms): {' '.join(stats.sql.split())[:160]}")
+	for ms, sql in report.slowest:
+		lines.append(f"\tslowest {ms:.2f} ms: {' '.join(sql.split())[:160]}")
+	return "\n".join(lines)
+
+def debug_flow(scope: Scope):
 	while True:
 		clear_screen()
 		print("Debug Menu")
 		print("1) View Members")
 		print("2) View Trainers")
 		print("3) View Admins")
+		print(f"4) SQL profiling: {'ON, turn off' if instrumentation.is_enabled() else 'off, turn on'}")
+		print("5) SQL profile per operation")
+		print("6) Recent operations (N+1 suspects)")
+		print("7) Dump SQL profile to JSON")
+		print("8) Write conflicts and retries")
 		print("0) Back")
 		c = prompt("Choice")
 		if c == "1":
-			member_functions.view_members(session)
+			with scope() as session:
+				show_pages(member_functions.view_members(session), format_member, "No members.")
 			input("Press Enter to continue...")
 		elif c == "2":
-			trainer_functions.view_trainers(session)
+			with scope() as session:
+				show_pages(trainer_functions.view_trainers(session), format_trainer, "No trainers.")
 			input("Press Enter to continue...")
 		elif c == "3":
-			admin_functions.view_admins(session)
+			with scope() as session:
+				show_pages(admin_functions.view_admins(session), format_admin, "No admins.")
+			input("Press Enter to continue...")
+		elif c == "4":
+			if instrumentation.is_enabled():
+				instrumentation.disable()
+				print("SQL profiling off.")
+			else:
+				with scope() as session:
+					instrumentation.enable(session.get_bind())
+				print("SQL profiling on: use the app, then come back here.")
+			input("Press Enter to continue...")
+		elif c == "5":
+			rows = instrumentation.summary()
+			for row in rows:
+				print(format_operation_summary(row))
+			if not rows:
+				print("Nothing recorded yet (is profiling on?).")
+			input("Press Enter to continue...")
+		elif c == "6":
+			suspects_only = prompt("Only N+1 suspects? (y/n)", required=True).lower() in ("y", "yes")
+			reports = instrumentation.recent(limit=20, suspects_only=suspects_only)
+			for report in reports:
+				print(format_operation_report(report))
+			if not reports:
+				print("Nothing recorded yet.")
+			input("Press Enter to continue...")
+		elif c == "7":
+			path = prompt("File", required=False) or f"sql_profile_{datetime.now():%Y%m%d_%H%M%S}.json"
+			print("Written to", instrumentation.dump_json(path))
+			input("Press Enter to continue...")
+		elif c == "8":
+			rows = database.retry_snapshot()
+			for row in rows:
+				print(format_retry_summary(row))
+			if not rows:
+				print("No scheduling writes yet.")
 			input("Press Enter to continue...")
 		elif c == "0":
 			break
@@ -81,7 +247,7 @@ def debug_flow(session: Session):
 			input("Press Enter to continue...")
 
 # Member UI
-def member_flow(session: Session):
+def member_flow(scope: Scope):
 	while True:
 		clear_screen()
 		print("Member Menu")
@@ -94,19 +260,22 @@ def member_flow(session: Session):
 			dob = prompt("Enter your date of birth (ex: YYYY-MM-DD)")
 			gender = prompt("What is your gender?")
 			contact = prompt("Enter your contact details")
-			member_functions.register_member(session, name, dob, gender, contact)
+			with scope() as session:
+				show_outcome(member_functions.register_member(session, name, dob, gender, contact))
 		elif choice == "2":
 			name = prompt("Enter your username", True)
-			member = member_functions.login_member(session, name)
-			if member:
-				member_dashboard(session, member)
+			with scope() as session:
+				login = show_outcome(member_functions.login_member(session, name))
+				member_id = login.value.member_id if login else None
+			if member_id:
+				member_dashboard(scope, member_id)
 		elif choice == "0":
 			break
 		else:
 			print("Invalid")
 		input("Press Enter to continue...")
 
-def trainer_flow(session: Session):
+def trainer_flow(scope: Scope):
 	while True:
 		clear_screen()
 		print("Trainer Menu")
@@ -116,19 +285,22 @@ def trainer_flow(session: Session):
 		choice = prompt("Choice")
 		if choice == "1":
 			name = prompt("Enter your name", True)
-			trainer_functions.register_trainer(session, name)
+			with scope() as session:
+				show_outcome(trainer_functions.register_trainer(session, name))
 		elif choice == "2":
 			name = prompt("Enter your username", True)
-			trainer = trainer_functions.login_trainer(session, name)
-			if trainer:
-				trainer_dashboard(session, trainer)
+			with scope() as session:
+				login = show_outcome(trainer_functions.login_trainer(session, name))
+				trainer_id = login.value.trainer_id if login else None
+			if trainer_id:
+				trainer_dashboard(scope, trainer_id)
 		elif choice == "0":
 			break
 		else:
 			print("Invalid")
 		input("Press Enter to continue...")
 
-def member_dashboard(session: Session, member: Member):
+def member_dashboard(scope: Scope, member_id: int):
 	while True:
 		clear_screen()
 		print("Member Dashboard")
@@ -141,34 +313,116 @@ def member_dashboard(session: Session, member: Member):
 		print("0) Logout")
 		c = prompt("Choice")
 		if c == "1":
-			print("Current name: ", member.name)
-			print("Current date of birth: ", member.date_of_birth)
-			print("Current gender: ", member.gender)
-			print("Current contact details: ", member.contact_detail)
+			with scope() as session:
+				member = session.get(Member, member_id)
+				print("Current name: ", member.name)
+				print("Current date of birth: ", member.date_of_birth)
+				print("Current gender: ", member.gender)
+				print("Current contact details: ", member.contact_detail)
 			name = prompt("Enter new name (leave empty for nothing)", required=False)
 			dob = prompt("Enter new date of birth (leave empty for nothing)", required=False)
 			gender = prompt("Enter new gender (leave empty for nothing)", required=False)
 			contact = prompt("Enter new contact details (leave empty for nothing)", required=False)
-			member_functions.update_personal_details(session, member, name, dob, gender, contact)
+			with scope() as session:
+				show_outcome(member_functions.update_personal_details(session, session.get(Member, member_id), name, dob, gender, contact))
 		elif c == "2":
-			manage_health_metrics(session, member)
+			manage_health_metrics(scope, member_id)
 		elif c == "3":
-			manage_goal_flow(session, member)
+			manage_goal_flow(scope, member_id)
 		elif c == "4":
-			manage_pt_session_flow(session, member)
+			manage_pt_session_flow(scope, member_id)
 		elif c == "5":
-			register_fitness_class_flow(session, member)
+			register_fitness_class_flow(scope, member_id)
 		elif c == "6":
-			member_functions.dashboard(session, member)
+			with scope() as session:
+				dashboard = member_functions.dashboard(session, session.get(Member, member_id))
+			show_dashboard(dashboard)
 		elif c == "0":
 			break
 		else:
 			print("Invalid")
 		input("Press Enter to continue...")
 
-def manage_health_metrics(session: Session, member: Member):
+def show_dashboard(dashboard):
+	if not dashboard:
+		print("Member not found.")
+		return
+	print("\n====== DASHBOARD ======")
+
+	print("\nLatest Health Metrics (up to 5, most recent first):")
+	if not dashboard.latest_metrics:
+		print("  No health metrics recorded yet.")
+	else:
+		for metric in dashboard.latest_metrics:
+			print(
+				f"  Date: {metric.date_recorded}, "
+				f"Weight: {metric.weight}, "
+				f"Height: {metric.height}, "
+				f"Heart rate: {metric.heart_rate}"
+			)
+
+	print("\nWeekly Trend:")
+	if not dashboard.weekly_trend:
+		print("  No weekly data yet.")
+	else:
+		for week in dashboard.weekly_trend:
+			print(format_trend(week))
+
+	print("\nActive Goals:")
+	if not dashboard.active_goals:
+		print("  No goals set.")
+	else:
+		for goal in dashboard.active_goals:
+			print(f"  {goal.description} (target: {goal.target})")
+
+	print(f"\nPast class count: {dashboard.past_class_count}")
+
+	print("\nUpcoming Sessions:")
+	if not dashboard.upcoming_sessions:
+		print("  No upcoming sessions.")
+	else:
+		for training_session in dashboard.upcoming_sessions:
+			print(
+				f"  {training_session.start_time}–{training_session.end_time} "
+				f"with {training_session.trainer_name} (session_id={training_session.session_id})"
+			)
+
+	print("\nUpcoming Group Classes:")
+	if not dashboard.upcoming_classes:
+		print("  No upcoming classes.")
+	else:
+		for fitness_class in dashboard.upcoming_classes:
+			print(
+				f"  {fitness_class.start_time}–{fitness_class.end_time} "
+				f"{fitness_class.class_name} with {fitness_class.trainer_name} "
+				f"(class_id={fitness_class.class_id})"
+			)
+	print("=======================\n")
+
+def format_metric(row):
+	return f"HealthMetric(date={row.date_recorded}, weight={row.weight}, height={row.height}, hr={row.heart_rate})"
+
+def format_health_stats(row):
+	return (f"Member {row.member_id}: {row.samples} readings, weight {row.latest_weight} kg, BMI {row.bmi:.1f}, "
+			f"HR avg 7d {row.hr_avg_7d:.0f} / 30d {row.hr_avg_30d:.0f}, weight change {row.weight_change_per_week:+.2f} kg/week")
+
+def format_trend(trend):
+	return (f"  {trend.period_start}: {trend.samples} readings, avg weight {trend.avg_weight}, "
+			f"heart rate {trend.min_heart_rate}-{trend.max_heart_rate} (avg {trend.avg_heart_rate})")
+
+def manage_health_metrics(scope: Scope, member_id: int):
+	print("Weekly trend (last 12 weeks):")
+	with scope() as session:
+		trend = member_functions.health_trend(session, member_id, "week", limit=12)
+	for week in trend:
+		print(format_trend(week))
+	if not trend:
+		print("  No health metrics recorded yet.")
 	print("Current Health Metrics:")
-	member_functions.view_health_metrics(session, member)
+	start = prompt_date("From date (YYYY-MM-DD, empty for the last 30 days)") or datetime.today() - timedelta(days=30)
+	end = prompt_date("Until date (YYYY-MM-DD)")
+	with scope() as session:
+		show_pages(member_functions.view_health_metrics(session, session.get(Member, member_id), start=start, end=end), format_metric, "No health metrics in that range.")
 	while True:
 		choice = prompt("Add a health metric? (y/n)", required=True).lower()
 		if choice in ("n", "no"):
@@ -178,14 +432,25 @@ def manage_health_metrics(session: Session, member: Member):
 			height = prompt("Enter height (cm)", required=False)
 			heart_rate = prompt("Enter heart rate (bpm)", required=False)
 			current_date = datetime.today().isoformat()
-			member_functions.input_health_metric(session, member, current_date, weight, height, heart_rate)
+			with scope() as session:
+				show_outcome(member_functions.input_health_metric(session, session.get(Member, member_id), current_date, weight, height, heart_rate))
 		else:
 			print("Invalid")
 		input("Press Enter to continue...")
 
-def manage_goal_flow(session: Session, member: Member):
+def show_goals(goals):
+	if goals is None:
+		print("Member not found.")
+	for i, goal in enumerate(goals or []):
+		print(f"Goal {i + 1}: {goal.description} (target: {goal.target})")
+	if goals == []:
+		print("No goals set.")
+
+def manage_goal_flow(scope: Scope, member_id: int):
 	print("Current Fitness Goals:")
-	member_functions.view_fitness_goals(session, member)
+	with scope() as session:
+		goals = member_functions.view_fitness_goals(session, session.get(Member, member_id))
+	show_goals(goals)
 	while True:
 		choice = prompt("Add a fitness goal? (y/n)", required=True).lower()
 		if choice in ("n", "no"):
@@ -193,14 +458,44 @@ def manage_goal_flow(session: Session, member: Member):
 		if choice in ("y", "yes"):
 			description = prompt("Enter goal description", required=True)
 			target = prompt("Enter goal target", required=True)
-			member_functions.add_fitness_goals(session, member, description, target)
+			with scope() as session:
+				show_outcome(member_functions.add_fitness_goals(session, session.get(Member, member_id), description, target))
 		else:
 			print("Invalid")
 		input("Press Enter to continue...")
 
-def manage_pt_session_flow(session: Session, member: Member):
+def format_pt_slot(option):
+	number, slot = option
+	return f"{number}) {slot.start_time:%Y-%m-%d %H:%M}-{slot.end_time:%H:%M} with {slot.trainer_name} (trainer {slot.trainer_id}) in {slot.room_name}"
+
+# Only (trainer, free room booking) pairs that book_pt_session will accept are offered (app/slot_finder.py)
+def choose_pt_slot(scope: Scope):
+	day = prompt_date("First day (YYYY-MM-DD, empty for today)") or datetime.combine(date.today(), datetime.min.time())
+	days = prompt_int("Number of days (empty for 1)", required=False) or 1
+	trainer_id = prompt_int("Trainer ID (empty for any trainer)", required=False)
+	start = max(day, datetime.now())
+	with scope() as session:
+		options = list(slot_finder.bookable_slots(session, start, day + timedelta(days=days), trainer_id).rows(session))
+	if not options:
+		print("No trainer is free for any open room booking in that window.")
+		return None
+	show_pages(list_pages(list(enumerate(options, 1))), format_pt_slot)
+	number = prompt_int("Option number (empty to cancel)", required=False)
+	if not number or not 1 <= number <= len(options):
+		return None
+	return options[number - 1]
+
+def format_pt_session(row):
+	return f"Session ID: {row.session_id}, Trainer: {row.trainer_name}, Start: {row.start_time}, End: {row.end_time}"
+
+def show_pt_sessions(scope: Scope, member_id: int):
+	with scope() as session:
+		rows = member_functions.view_pt_sessions(session, session.get(Member, member_id))
+	show_pages(list_pages(rows), format_pt_session, "No PT sessions found.")
+
+def manage_pt_session_flow(scope: Scope, member_id: int):
 	print("Manage Personal Training Sessions")
-	member_functions.view_pt_sessions(session, member)
+	show_pt_sessions(scope, member_id)
 
 	while True:
 		print("\nActions:")
@@ -213,108 +508,165 @@ def manage_pt_session_flow(session: Session, member: Member):
 			break
 
 		if choice in ("1"):
-			print("Available trainers:")
-			trainer_functions.view_trainers(session)
-			trainer_id = prompt_int("Trainer ID", required=True)
-			trainer = session.get(Trainer, trainer_id)
-			print("Available room bookings:")
-			member_functions.view_room_bookings(session)
-
-			booking_id = prompt_int("Choose a booking ID from the above available room bookings", required=True)
-			booking = session.get(RoomBooking, booking_id)
-			pt_session = member_functions.book_pt_session(session=session, member=member, trainer=trainer, booking=booking)
-
-			if pt_session:
-				print("PT session booked (id:", getattr(pt_session, "session_id", None), ")")
-			else:
-				print("Unable to book PT session — conflict or error.")
+			slot = choose_pt_slot(scope)
+			if slot:
+				with scope() as session:
+					show_outcome(member_functions.book_pt_session(session=session, member=session.get(Member, member_id),
+																  trainer=session.get(Trainer, slot.trainer_id), booking=session.get(RoomBooking, slot.booking_id)), "session_id")
 		elif choice in ("2"):
-			member_functions.view_pt_sessions(session, member)
+			show_pt_sessions(scope, member_id)
 			session_id = prompt_int("Enter Session ID to reschedule", required=True)
-			training_session = session.get(TrainingSession, session_id)
-			if not training_session or training_session.member != member:
+			with scope() as session:
+				training_session = session.get(TrainingSession, session_id)
+				found = training_session is not None and training_session.member_id == member_id
+			if not found:
 				print("PT session not found for this member.")
 			else:
 				print("Available trainers (choose trainer for the rescheduled session):")
-				trainer_functions.view_trainers(session)
+				with scope() as session:
+					show_pages(trainer_functions.view_trainers(session), format_trainer, "No trainers.")
 				trainer_id = prompt_int("Trainer ID", required=True)
-				new_trainer = session.get(Trainer, trainer_id)
-				if not new_trainer:
+				with scope() as session:
+					trainer_found = session.get(Trainer, trainer_id) is not None
+				if not trainer_found:
 					print("Trainer not found.")
 					input("Press Enter to continue...")
 					continue
 
 				print("Available room bookings:")
-				member_functions.view_room_bookings(session)
+				with scope() as session:
+					show_pages(member_functions.view_room_bookings(session, start=datetime.now(), is_booked=False), format_room_booking, "No free room bookings.")
 				booking_id = prompt_int("Choose a new booking ID from the above", required=True)
-				new_booking = session.get(RoomBooking, booking_id)
-				res = member_functions.reschedule_pt_session(session, member, training_session, new_booking, new_trainer)
-				if res:
-					print("PT session rescheduled (id:", getattr(res, "session_id", None), ")")
-				else:
-					print("Unable to reschedule PT session — conflict or/or error.")
+				with scope() as session:
+					show_outcome(member_functions.reschedule_pt_session(session, session.get(Member, member_id), session.get(TrainingSession, session_id),
+																		session.get(RoomBooking, booking_id), session.get(Trainer, trainer_id)), "session_id")
 		else:
 			print("Invalid")
 		input("Press Enter to continue...")
 
-def register_fitness_class_flow(session: Session, member: Member):
+def register_fitness_class_flow(scope: Scope, member_id: int):
 	print("Register for Fitness Classes")
-	member_functions.view_available_classes(session)
+	days = prompt_int("Show classes in the next how many days (empty for 14)", required=False) or 14
+	with scope() as session:
+		show_pages(member_functions.view_available_classes(session, days=days), format_available_class, "No available classes.")
 	while True:
 		choice = prompt("Register for a class? (y/n)", required=True).lower()
 		if choice in ("n", "no"):
 			break
 		if choice in ("y", "yes"):
 			class_id = prompt_int("Class ID", required=True)
-			fitness_class = session.get(FitnessClass, class_id)
-			success = member_functions.class_registration(session, member, fitness_class)
-			if success:
-				print("Registered for class.")
-			else:
-				print("Unable to register — class may be full")
+			with scope() as session:
+				show_outcome(member_functions.class_registration(session, session.get(Member, member_id), session.get(FitnessClass, class_id)))
 		input("Press Enter to continue...")
 
 # Trainer UI
-def trainer_dashboard(session: Session, trainer: Trainer):
+def trainer_dashboard(scope: Scope, trainer_id: int):
 	while True:
 		clear_screen()
 		print("Trainer Menu")
 		print("1) Manage Availability")
 		print("2) View Schedule")
 		print("3) Member Lookup")
+		print("4) Club Health Analytics")
 		print("0) Back")
 		c = prompt("Choice")
 		if c == "1":
-			availability_flow(session, trainer)
+			availability_flow(scope, trainer_id)
 		elif c == "2":
-			trainer_functions.schedule_view(session, trainer)
+			with scope() as session:
+				schedule = trainer_functions.schedule_view(session, session.get(Trainer, trainer_id))
+			show_schedule(schedule)
 		elif c == "3":
-			member_functions.view_members(session)
+			with scope() as session:
+				show_pages(member_functions.view_members(session), format_member, "No members.")
 			name = prompt("Member name to lookup")
-			trainer_functions.member_lookup(session, name)
+			with scope() as session:
+				lookup = trainer_functions.member_lookup(session, name)
+			show_member_lookup(lookup)
+		elif c == "4":
+			with scope() as session:
+				stats = trainer_functions.club_health_stats(session)
+			show_pages(list_pages(list(stats.rows())), format_health_stats, "No health metrics recorded yet.")
 		elif c == "0":
 			break
 		else:
 			print("Invalid")
 		input("Press Enter to continue...")
 
-def availability_flow(session: Session, trainer: Trainer):
+def show_schedule(schedule):
+	if not schedule:
+		print("Trainer not found")
+		return
+	print("PT sessions:")
+	for training_session in schedule.sessions:
+		print(f"  {training_session.start_time}–{training_session.end_time} with {training_session.member_name} (session_id={training_session.session_id})")
+	if not schedule.sessions:
+		print("  None.")
+	print("Classes:")
+	for fitness_class in schedule.classes:
+		print(f"  {fitness_class.start_time}–{fitness_class.end_time} {fitness_class.class_name} (class_id={fitness_class.class_id})")
+	if not schedule.classes:
+		print("  None.")
+
+def show_member_lookup(lookup):
+	if not lookup:
+		print("Member not found")
+		return
+	print(f"Member {lookup.member_id}: {lookup.name}")
+	for goal in lookup.goals:
+		print(f"Goal: {goal.description} (target: {goal.target})")
+	print("Latest Health Metric:", format_metric(lookup.latest_metric) if lookup.latest_metric else None)
+	for week in lookup.weekly_trend:
+		print(format_trend(week))
+
+def format_availability(row):
+	if not row.is_recurring:
+		return f"#{row.availability_id}: {row.start_time}–{row.end_time}"
+	until = f" until {row.repeat_until}" if row.repeat_until else ""
+	skips = f", skipping {', '.join(str(day) for day in sorted(row.skip_dates))}" if row.skip_dates else ""
+	return f"#{row.availability_id}: {row.start_time}–{row.end_time}, repeats {row.recurrence or recurrence.WEEKLY}{until}{skips}"
+
+def show_availability(availability, days=trainer_functions.AVAILABILITY_DAYS):
+	if not availability:
+		print("Trainer not found")
+		return
+	for row in availability.rules:
+		print(format_availability(row))
+	print(f"Next {days} days:")
+	for start, end in availability.windows:
+		print(f"  {start:%a %Y-%m-%d %H:%M} – {end:%a %H:%M}")
+	if not availability.windows:
+		print("  (none)")
+
+def availability_flow(scope: Scope, trainer_id: int):
 	print("Current Availability:")
-	trainer_functions.view_availability(session, trainer)
+	with scope() as session:
+		availability = trainer_functions.view_availability(session, session.get(Trainer, trainer_id))
+	show_availability(availability)
 	while True:
-		more = prompt("Add more availability? (y/n)", required=True).lower()
+		more = prompt("Add more availability (y), skip a date of a recurring window (s) or done (n)?", required=True).lower()
 		if more in ("n", "no"):
 			break
 		if more in ("y", "yes"):
 			start_time = prompt("Start (YYYY-MM-DD HH:MM)")
 			end_time = prompt("End (YYYY-MM-DD HH:MM)")
 			rec = prompt("Recurring? (y/n)", required=True).lower() in ("y", "yes")
-			trainer_functions.set_availability(session, trainer, start_time, end_time, rec)
+			repeat, until = None, None
+			if rec:
+				repeat = recurrence.BIWEEKLY if prompt("Every week or every other week? (w/b)", required=True).lower().startswith("b") else recurrence.WEEKLY
+				until = prompt("Repeat until (YYYY-MM-DD, blank for no end)", required=False) or None
+			with scope() as session:
+				show_outcome(trainer_functions.set_availability(session, session.get(Trainer, trainer_id), start_time, end_time, rec, repeat, until))
+		elif more in ("s", "skip"):
+			availability_id = prompt_int("Availability # (see list above)")
+			day = prompt("Date to skip (YYYY-MM-DD)")
+			with scope() as session:
+				show_outcome(trainer_functions.skip_availability(session, session.get(Trainer, trainer_id), availability_id, day))
 		else:
 			print("Invalid")
 		input("Press Enter to continue...")
 
-def admin_flow(session: Session):
+def admin_flow(scope: Scope):
 	while True:
 		clear_screen()
 		print("Admin Menu")
@@ -324,12 +676,15 @@ def admin_flow(session: Session):
 		choice = prompt("Choice")
 		if choice == "1":
 			name = prompt("Enter your name", True)
-			admin_functions.register_admin(session, name)
+			with scope() as session:
+				show_outcome(admin_functions.register_admin(session, name))
 		elif choice == "2":
 			name = prompt("Enter your username", True)
-			admin = admin_functions.login_admin(session, name)
-			if admin:
-				admin_dashboard(session, admin)
+			with scope() as session:
+				login = show_outcome(admin_functions.login_admin(session, name))
+				admin_id = login.value.admin_id if login else None
+			if admin_id:
+				admin_dashboard(scope, admin_id)
 		elif choice == "0":
 			break
 		else:
@@ -337,7 +692,7 @@ def admin_flow(session: Session):
 		input("Press Enter to continue...")
 
 # Admin UI
-def admin_dashboard(session: Session, admin: Admin):
+def admin_dashboard(scope: Scope, admin_id: int):
 	while True:
 		clear_screen()
 		print("Admin Menu")
@@ -345,51 +700,89 @@ def admin_dashboard(session: Session, admin: Admin):
 		print("2) Equipment Maintenance")
 		print("3) Class Management")
 		print("4) Billing & Payment")
+		print("5) Room Utilization")
 		print("0) Back")
 		c = prompt("Choice")
 		if c == "1":
-			room_booking_flow(session, admin)
+			room_booking_flow(scope, admin_id)
 		elif c == "2":
-			equipment_maintenance_flow(session, admin)
+			equipment_maintenance_flow(scope, admin_id)
 		elif c == "3":
-			class_management_flow(session, admin)
+			class_management_flow(scope, admin_id)
 		elif c == "4":
-			billing_management_flow(session)
+			billing_management_flow(scope)
+		elif c == "5":
+			room_utilization_flow(scope)
 		elif c == "0":
 			break
 		else:
 			print("Invalid")
 		input("Press Enter to continue...")
 
-def room_booking_flow(session: Session, admin: Admin):
-	print("All room bookings:")
-	admin_functions.view_room_bookings(session)
+def room_booking_flow(scope: Scope, admin_id: int):
+	print("Room bookings (leave filters blank to see all):")
+	start = prompt_date("From date (YYYY-MM-DD)")
+	end = prompt_date("Until date (YYYY-MM-DD)")
+	room_filter = prompt("Room name", required=False) or None
+	with scope() as session:
+		show_pages(admin_functions.view_room_bookings(session, start=start, end=end, room_name=room_filter), format_room_booking, "No room bookings found.")
 	while True:
 		more = prompt("Add a room booking? (y/n)", required=True).lower()
 		if more in ("n", "no"):
 			break
 		if more in ("y", "yes"):
 			print("Available rooms:")
-			admin_functions.view_rooms(session)
+			with scope() as session:
+				show_pages(admin_functions.view_rooms(session), format_room, "No rooms.")
 			room_name = prompt("Room name")
 			start_date = prompt("Start date (YYYY-MM-DD)")
 			end_date = prompt("End date (YYYY-MM-DD)")
 			start_time = prompt("Start time (HH:MM)")
 			end_time = prompt("End time (HH:MM)")
-			rb = admin_functions.room_booking(session, admin, room_name, start_date, start_time, end_date, end_time)
-			if rb:
-				print("Room booked (booking id:", getattr(rb, "booking_id", None), ")")
-			else:
-				print("Unable to book room — conflict or error.")
+			with scope() as session:
+				show_outcome(admin_functions.room_booking(session, session.get(Admin, admin_id), room_name, start_date, start_time, end_date, end_time), "booking_id")
 		else:
 			print("Invalid")
 		input("Press Enter to continue...")
 		
-def equipment_maintenance_flow(session: Session, admin: Admin):
+HEAT_SHADES = " .:-=+*#%@"  # 0-9%, 10-19%, ... 90-100%
+
+def format_room_utilization(row):
+	if not row.booked_hours:
+		return f"{row.room_name:<20} no bookings"
+	return (f"{row.room_name:<20} {row.booked_hours:>9.1f} h booked  {row.utilization:>5.1f}%  "
+			f"peak {occupancy.DAYS[row.peak_day]} {row.peak_hour:02d}:00 ({row.peak_utilization:.0f}%)")
+
+def format_peak_hour(row):
+	return f"{occupancy.DAYS[row.day]} {row.hour:02d}:00  {row.utilization:>5.1f}%  busiest: {row.busiest_room} ({row.busiest_utilization:.0f}%)"
+
+def show_heatmap(heatmap):
+	print("     " + "".join(f"{hour:<3d}" for hour in range(24)))
+	for day, row in zip(occupancy.DAYS, heatmap):
+		print(f"{day}  " + "".join(HEAT_SHADES[min(int(value // 10), 9)] * 2 + " " for value in row))
+	print(f"     each cell: share of room-hours booked, '{HEAT_SHADES[0]}' under 10% ... '{HEAT_SHADES[-1]}' 90% or more")
+
+def room_utilization_flow(scope: Scope):
+	start = prompt_date("From (YYYY-MM-DD, empty for a year ago)") or datetime.combine(date.today() - timedelta(days=365), datetime.min.time())
+	end = prompt_date("To (YYYY-MM-DD, empty for today)") or datetime.combine(date.today(), datetime.min.time())
+	with scope() as session:
+		result = admin_functions.room_utilization(session, start, end + timedelta(days=1))
+	if result is None:
+		print("Error: the range must end after it starts.")
+		return
+	print(f"Room utilization {result.start:%Y-%m-%d} to {result.end:%Y-%m-%d}:")
+	show_heatmap(result.heatmap())
+	print()
+	show_pages(list_pages(list(result.room_rows())), format_room_utilization, "No rooms.")
+	print("\nPeak hours:")
+	show_pages(list_pages(result.peak_hours()), format_peak_hour, "No booked hours in that range.")
+
+def equipment_maintenance_flow(scope: Scope, admin_id: int):
 	while True:
 		print("All equipment maintenance records:")
 		print("Equipement ID | Admin ID | Operation | Status")
-		admin_functions.view_equipment_maintenance(admin)
+		with scope() as session:
+			show_pages(admin_functions.view_equipment_maintenance(session, session.get(Admin, admin_id)), format_equipment, "No records yet.")
 		print("1) Add record")
 		print("2) Edit record")
 		print("3) Go back")
@@ -398,52 +791,61 @@ def equipment_maintenance_flow(session: Session, admin: Admin):
 		if c == "1":
 			op = prompt("Operation description", required=True)
 			status = prompt("Status (open/closed)", required=True)
-			admin_functions.add_equipment_maintenance(session, admin, op, status=status)
+			with scope() as session:
+				show_outcome(admin_functions.add_equipment_maintenance(session, session.get(Admin, admin_id), op, status=status))
 		elif c == "2":
 			print("Edit equipment maintenance record:")
 			equipment_id = prompt_int("Equipment ID", required=True)
 			status = prompt("New status (open/closed)", required=True)
-			admin_functions.edit_equipment_maintenance(session, equipment_id, status=status)
+			with scope() as session:
+				show_outcome(admin_functions.edit_equipment_maintenance(session, equipment_id, status=status))
 		elif c == "3":
 			break
 		else:
 			print("Invalid")
 		input("Press Enter to continue...")
 
-def class_management_flow(session: Session, admin: Admin):
+def class_management_flow(scope: Scope, admin_id: int):
 	print("All classes:")
-	admin_functions.view_fitness_classes(session)
+	with scope() as session:
+		show_pages(admin_functions.view_fitness_classes(session), format_fitness_class, "No classes.")
 	while True:
 		more = prompt("Add a fitness class? (y/n)", required=True).lower()
 		if more in ("n", "no"):
 			break
 		if more in ("y", "yes"):
-			trainer_functions.view_trainers(session)
+			with scope() as session:
+				show_pages(trainer_functions.view_trainers(session), format_trainer, "No trainers.")
 			trainer_id = prompt_int("Trainer ID")
-			trainer = session.get(Trainer, trainer_id)
 			class_name = prompt("Class name")
 			capacity = prompt_int("Capacity")
-			admin_functions.view_rooms(session)
+			with scope() as session:
+				show_pages(admin_functions.view_rooms(session), format_room, "No rooms.")
 			room_name = prompt("Room name")
 			start_date = prompt("Start date (YYYY-MM-DD)")
 			start_time = prompt("Start time (HH:MM)")
 			end_date = prompt("End date (YYYY-MM-DD)")
 			end_time = prompt("End time (HH:MM)")
-			admin_functions.add_fitness_class(session, admin, trainer, class_name, capacity, room_name, start_date, start_time, end_date, end_time)
+			with scope() as session:
+				show_outcome(admin_functions.add_fitness_class(session, session.get(Admin, admin_id), session.get(Trainer, trainer_id), class_name, capacity, room_name, start_date, start_time, end_date, end_time), "class_id")
 		input("Press Enter to continue...")
 
-def billing_management_flow(session: Session):
+def billing_management_flow(scope: Scope):
 	while True:
 		clear_screen()
 		print("1) Create invoice")
 		print("2) Record payment")
 		print("3) View all invoices")
-		print("4) Go back")
+		print("4) Run monthly billing cycle")
+		print("5) Member balance")
+		print("6) Revenue report")
+		print("7) Go back")
 		sub = prompt("Choice")
 		if sub == "1":
 			member_id = prompt_int("Member ID")
-			member = session.get(Member, member_id)
-			if not member:
+			with scope() as session:
+				member_found = session.get(Member, member_id) is not None
+			if not member_found:
 				print("Member doesn't exist")
 				return 
 			type_b = prompt("Type of billing")
@@ -453,19 +855,41 @@ def billing_management_flow(session: Session):
 				amount_f = float(amount_s)
 			else:
 				amount_f = 0.0
-			bp = admin_functions.billing_and_payments(session, action = "create", member = member, type_of_billing = type_b, amount = amount_f)
-			print("Invoice created (id:", getattr(bp, "billing_id", None), ")")
+			with scope() as session:
+				show_outcome(admin_functions.billing_and_payments(session, action = "create", member = session.get(Member, member_id), type_of_billing = type_b, amount = amount_f), "billing_id")
 		elif sub == "2":
 			billing_id = prompt_int("Billing ID")
 			method = prompt("Payment method")
-			bp = admin_functions.billing_and_payments(session, action = "pay", billing_id = billing_id, payment_method = method)
-			if bp:
-				print("Payment recorded.")
-			else:
-				print("Billing record not found.")
+			with scope() as session:
+				show_outcome(admin_functions.billing_and_payments(session, action = "pay", billing_id = billing_id, payment_method = method))
 		elif sub == "3":
-			admin_functions.view_billings(session)
+			status = prompt("Status filter (due/paid, blank for all)", required=False) or None
+			with scope() as session:
+				show_pages(admin_functions.view_billings(session, status=status), format_billing, "No invoices.")
 		elif sub == "4":
+			period = prompt_date("Any day of the month to bill (YYYY-MM-DD, empty for this month)") or date.today()
+			amount = prompt(f"Amount per member (empty for ${billing.MEMBERSHIP_FEE})", required=False)
+			amount_f = float(amount) if amount.replace('.', '', 1).isdigit() else billing.MEMBERSHIP_FEE
+			with scope() as session:
+				report = billing.run_billing_cycle(session, period, amount_f, dry_run=True)
+			print(f"{report.period:%Y-%m}: {report.eligible} eligible members, {report.created} to invoice, {report.skipped} already billed")
+			if report.created and prompt("Create these invoices? (y/n)").lower() in ("y", "yes"):
+				with scope() as session:
+					report = billing.run_billing_cycle(session, period, amount_f)
+				print(f"Created {report.created} invoices ({report.skipped} already billed) in {report.seconds:.2f} s")
+		elif sub == "5":
+			member_id = prompt_int("Member ID")
+			with scope() as session:
+				balance = billing.member_balance(session, member_id)
+			print(format_balance(balance))
+		elif sub == "6":
+			period = prompt("Per day or month? (d/m)", required=False).lower()
+			start = prompt_date("From (YYYY-MM-DD, empty for a year ago)") or date.today() - timedelta(days=365)
+			end = prompt_date("To (YYYY-MM-DD, empty for today)") or date.today()
+			with scope() as session:
+				rows = billing.revenue(session, start, end + timedelta(days=1), "day" if period.startswith("d") else "month")
+			show_pages(list_pages(rows), format_revenue, "No billing activity in that range.")
+		elif sub == "7":
 			break
 		else:
 			print("Invalid")
@@ -1,89 +1,145 @@
 from sqlalchemy.orm import Session
+from sqlalchemy import select, func
 import sys, os
-from datetime import datetime
+from datetime import date, datetime, timedelta
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from models.schemas import Availability, TrainingSession, FitnessClass, Member, HealthGoal, GoalType, HealthMetric, Trainer
+from models.schemas import Availability, TrainingSession, FitnessClass, Member, HealthGoal, GoalType, HealthMetric, HealthMetricDaily, Trainer, RoomBooking
+from models.records import TrainerRecord, AvailabilityRecord, TrainerAvailabilityRecord, TrainerSessionRecord, ClassRecord, ScheduleRecord, MetricRecord, MemberLookupRecord, Outcome
+from pagination import keyset_pages, PAGE_SIZE
+import member_functions
+import identity
+import health_analytics
+import recurrence
+import instrumentation
+
+TREND_WEEKS = 4
+AVAILABILITY_DAYS = 14
+
+# Writes, registrations and logins return an Outcome (models/records.py); reads return records,
+# or None when the trainer or member is missing. terminal_UI prints the messages.
 
 #Register trainer
 def register_trainer(session: Session, name: str):
-    existing_member = session.query(Trainer).filter_by(name=name).first()
+    existing_member = identity.find_trainer(session, name)
     if existing_member:
-        print("Error: contact details must be unique!")
-    else:
-        trainer = Trainer(name=name)
-        session.add(trainer)
-        session.commit()
-        print(f"{name} has successfully been registered as a trainer.")
+        return Outcome(Outcome.CONFLICT, "Error: name must be unique!")
+    trainer = Trainer(name=name)
+    session.add(trainer)
+    session.commit()
+    identity.invalidate("trainer", "name", name)
+    return Outcome(Outcome.OK, f"{name} has successfully been registered as a trainer.", trainer)
 
 #Login trainer
 def login_trainer(session: Session, name: str):
-    trainer = session.query(Trainer).filter(Trainer.name == name).first()
+    trainer = identity.find_trainer(session, name)
     if trainer:
-        print(f"Welcome back, {trainer.name}!")
-        return trainer
-    else:
-        print("Trainer not found. Please register first.")
-        return None
+        return Outcome(Outcome.OK, f"Welcome back, {trainer.name}!", trainer)
+    return Outcome(Outcome.NOT_FOUND, "Trainer not found. Please register first.")
     
-def view_trainers(session: Session):
-    trainers = session.query(Trainer).all()
-    for trainer in trainers:
-        print(trainer)
+def view_trainers(session: Session, page_size: int = PAGE_SIZE, after: tuple = None):
+    stmt = select(Trainer.trainer_id, Trainer.name)
+    return keyset_pages(session, stmt, [Trainer.trainer_id], page_size, after, TrainerRecord)
 
-#View availability for trainer
-def view_availability(session: Session, trainer: Trainer):
+#View availability for trainer: the stored rows, then what they add up to over the next few days
+def view_availability(session: Session, trainer: Trainer, days: int = AVAILABILITY_DAYS):
     if not trainer:
-        print("Trainer not found")
-        return
+        return None
 
-    for availability in trainer.availability:
-        print(availability)
+    rows = session.execute(select(Availability.availability_id, Availability.start_time, Availability.end_time, Availability.is_recurring,
+                                  Availability.recurrence, Availability.repeat_until, Availability.skip_dates)
+                           .where(Availability.trainer_id == trainer.trainer_id)
+                           .order_by(Availability.start_time, Availability.availability_id))
+    now = datetime.now().replace(second=0, microsecond=0)
+    windows = recurrence.trainer_windows(session, trainer.trainer_id, now, now + timedelta(days=days))
+    return TrainerAvailabilityRecord([AvailabilityRecord._make(row) for row in rows], list(windows.intervals()))
 
-#Add availability for trainer
-def set_availability(session: Session, trainer: Trainer, start_time: str, end_time: str, is_recurring: bool):
+#Add availability for trainer; recurring windows repeat weekly or biweekly from the first one, until repeat_until if given
+def set_availability(session: Session, trainer: Trainer, start_time: str, end_time: str, is_recurring: bool, recurrence_rule: str = None, repeat_until: str = None):
     start_time = datetime.fromisoformat(start_time)
     end_time = datetime.fromisoformat(end_time)
+    repeat_until = date.fromisoformat(repeat_until) if repeat_until else None
 
     if not trainer:
-        print("Trainer not found")
-        return
-    
-    for availability in trainer.availability:
-        if start_time < availability.end_time and end_time > availability.start_time:
-            print("Error: Conflict with:", availability)
-            return
-        
-    availability = Availability(trainer=trainer, start_time=start_time, end_time=end_time, is_recurring=is_recurring)
+        return Outcome(Outcome.NOT_FOUND, "Trainer not found")
+    if end_time <= start_time:
+        return Outcome(Outcome.INVALID, "Error: end must be after start")
+    if is_recurring:
+        recurrence_rule = recurrence_rule or recurrence.WEEKLY
+        if recurrence_rule not in recurrence.PERIODS:
+            return Outcome(Outcome.INVALID, f"Error: repeat must be one of {', '.join(recurrence.PERIODS)}")
+        if end_time - start_time > recurrence.PERIODS[recurrence_rule]:
+            return Outcome(Outcome.INVALID, "Error: a recurring window can't be longer than its repeat period")
+    else:
+        recurrence_rule, repeat_until = None, None
+
+    availability = Availability(trainer_id=trainer.trainer_id, start_time=start_time, end_time=end_time, is_recurring=is_recurring,
+                                recurrence=recurrence_rule, repeat_until=repeat_until)
+    # Only the trainer's rows that can reach into the new window's span are loaded and checked
+    new_rule = recurrence.Rule.of(availability)
+    candidates = recurrence.load_rules(session, start_time, new_rule.last_end() or datetime.max, trainer.trainer_id).get(trainer.trainer_id, ())
+    conflict = next((rule for rule in candidates if recurrence.overlaps(new_rule, rule)), None)
+    if conflict:
+        return Outcome(Outcome.CONFLICT, f"Error: Conflict with: {session.get(Availability, conflict.availability_id)}")
+
     session.add(availability)
     session.commit()
-    print("Availability set.")
+    return Outcome(Outcome.OK, "Availability set.", availability)
 
-#View schedule for trainer
+#Skip one date of a recurring availability window (holidays, sick days)
+def skip_availability(session: Session, trainer: Trainer, availability_id: int, day: str):
+    day = date.fromisoformat(day)
+    availability = session.get(Availability, availability_id)
+    if not trainer or not availability or availability.trainer_id != trainer.trainer_id or not availability.is_recurring:
+        return Outcome(Outcome.NOT_FOUND, "Recurring availability not found")
+    if not recurrence.Rule.of(availability).repeats_on(day):
+        return Outcome(Outcome.INVALID, f"Error: that window doesn't repeat on {day}")
+
+    availability.skip_dates = sorted(set(availability.skip_dates or ()) | {day})
+    session.commit()
+    return Outcome(Outcome.OK, "Date skipped.", availability)
+
+#View schedule for trainer: PT sessions and classes, each in time order
 def schedule_view(session: Session, trainer: Trainer):
     if not trainer:
-        print("Trainer not found")
-        return
+        return None
+
+    sessions = session.execute(select(TrainingSession.session_id, Member.name, RoomBooking.start_time, RoomBooking.end_time)
+                               .join(Member, Member.member_id == TrainingSession.member_id)
+                               .join(RoomBooking, RoomBooking.booking_id == TrainingSession.booking_id)
+                               .where(TrainingSession.trainer_id == trainer.trainer_id)
+                               .order_by(RoomBooking.start_time, TrainingSession.session_id))
+    classes = session.execute(select(FitnessClass.class_id, FitnessClass.class_name, Trainer.name, RoomBooking.start_time, RoomBooking.end_time)
+                              .join(Trainer, Trainer.trainer_id == FitnessClass.trainer_id)
+                              .join(RoomBooking, RoomBooking.booking_id == FitnessClass.booking_id)
+                              .where(FitnessClass.trainer_id == trainer.trainer_id)
+                              .order_by(RoomBooking.start_time, FitnessClass.class_id))
+    return ScheduleRecord([TrainerSessionRecord._make(row) for row in sessions], [ClassRecord._make(row) for row in classes])
 
-    # All training sessions
-    for training_session in trainer.sessions:
-        print(training_session)
 
-    # All fitness classes
-    for fitness_class in trainer.classes:
-        print(fitness_class)
-    
 #Show goal and latest health metric for member
 def member_lookup(session: Session, member_name: str):
-    member = session.query(Member).filter(Member.name == member_name).first()
+    member = identity.find_member(session, name=member_name)
     if not member:
-        print("Member not found")
-        return
-    
-    #Get goals
-    for goal in member.goals:
-        print("Goal:", goal.goal_type)
+        return None
+
+    #Get health metrics (bounded by the member's last recorded day, so only its partition is read)
+    last_day = select(func.max(HealthMetricDaily.day)).where(HealthMetricDaily.member_id == member.member_id).scalar_subquery()
+    latest_metric = session.execute(
+        select(HealthMetric.date_recorded, HealthMetric.weight, HealthMetric.height, HealthMetric.heart_rate)
+        .where(HealthMetric.member_id == member.member_id, HealthMetric.date_recorded >= last_day)
+        .order_by(HealthMetric.date_recorded.desc())
+        .limit(1)
+    ).first()
+
+    #Goals, and the weekly trend from the rollups
+    return MemberLookupRecord(member.member_id, member.name, member_functions.view_fitness_goals(session, member),
+                              MetricRecord._make(latest_metric) if latest_metric else None,
+                              member_functions.health_trend(session, member.member_id, "week", limit=TREND_WEEKS))
+
+#BMI, heart-rate averages and weight trend for every member (one bulk read, computed with NumPy)
+def club_health_stats(session: Session, as_of: datetime = None):
+    return health_analytics.member_health_stats(session, as_of)
 
-    #Get health metrics
-    latest_metric = max(member.health_metrics, key=lambda m: m.date_recorded, default=None)
-    print("Latest Health Metric:", latest_metric)
\ No newline at end of file
+# Every public function above is a traced operation (app/instrumentation.py)
+instrumentation.trace_module(sys.modules[__name__])
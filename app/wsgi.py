@@ -0,0 +1,5 @@
+from api import create_app
+
+# WSGI entry point: gunicorn -c gunicorn.conf.py wsgi:app
+# (gunicorn.conf.py migrates once before forking, so workers skip it)
+app = create_app(migrate=False)
@@ -0,0 +1,165 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+from sqlalchemy import text
+import argparse
+import json
+import os
+import random
+import secrets
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from common import BASE_DIR, BENCH_DATABASE_URL, bench_engine, fresh_schema
+from datagen import SCALES, generate
+
+# Load against the HTTP API (app/api.py) under gunicorn: seeds the bench database, starts
+# gunicorn on it (or uses --url), then --clients threads replay a front-desk / member-app /
+# trainer-tablet mix for --seconds. Reports requests/s and p50/p95/p99 latency per endpoint.
+# 409s (class full, already registered) are answers, not errors; errors are 5xx and failed connections.
+# The started server gets fresh API tokens; with --url, set API_TOKEN and API_ADMIN_TOKEN to the server's.
+#
+#   python api_load.py --scale small --workers 4 --clients 32 --seconds 20
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.statuses = {}
+
+    def record(self, endpoint, status, seconds):
+        with self.lock:
+            self.latencies.setdefault(endpoint, []).append(seconds)
+            counts = self.statuses.setdefault(endpoint, {})
+            counts[status] = counts.get(status, 0) + 1
+
+# Endpoints on the admin blueprint, called with the admin token
+ADMIN_ENDPOINTS = ("GET member balance", "GET billings")
+
+def request(base_url, method, path, params=None, body=None, token=""):
+    url = base_url + path + ("?" + urlencode(params) if params else "")
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(url, data=data, method=method,
+                                 headers={"Content-Type": "application/json", "Authorization": f"Bearer {token}"})
+    try:
+        with urllib.request.urlopen(req, timeout=30) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as error:
+        error.read()
+        return error.code
+    except OSError:
+        return 0  # connection refused / reset / timed out
+
+def endpoints(ids, rng):
+    # (weight, name, method, path, params, body) builders; names group the URLs in the report
+    now = datetime.now().replace(second=0, microsecond=0)
+    member = lambda: rng.choice(ids["members"])
+    trainer = lambda: rng.choice(ids["trainers"])
+    return [
+        (20, "GET member dashboard", lambda: ("GET", f"/members/{member()}/dashboard", None, None)),
+        (15, "GET available classes", lambda: ("GET", "/classes/available", {"days": 7}, None)),
+        (10, "GET member balance", lambda: ("GET", f"/members/{member()}/balance", None, None)),
+        (10, "GET trainer availability", lambda: ("GET", f"/trainers/{trainer()}/availability", {"days": 7}, None)),
+        (5, "GET bookable PT slots", lambda: ("GET", "/pt-slots/bookable", {"trainer_id": trainer(), "start": now.isoformat()}, None)),
+        (10, "GET free room bookings", lambda: ("GET", "/room-bookings", {"start": now.isoformat(), "is_booked": "false", "page_size": 20}, None)),
+        (5, "GET member search", lambda: ("GET", "/members", {"name": f"{rng.randrange(100)}", "page_size": 20}, None)),
+        (10, "POST class signup", lambda: ("POST", f"/members/{member()}/classes", None, {"class_id": rng.choice(ids["classes"])})),
+        (10, "POST health metric", lambda: ("POST", f"/members/{member()}/health-metrics", None,
+                                            {"weight": round(rng.uniform(50, 110), 1), "height": 175, "heart_rate": rng.randrange(55, 95)})),
+        (5, "GET billings", lambda: ("GET", "/billings", {"member_id": member()}, None)),
+    ]
+
+def wait_until_up(base_url, deadline):
+    while time.perf_counter() < deadline:
+        if request(base_url, "GET", "/health") == 200:
+            return True
+        time.sleep(0.2)
+    return False
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", choices=list(SCALES), default="small")
+    parser.add_argument("--url", default=None, help="load an already running server (its database must be seeded)")
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn worker processes")
+    parser.add_argument("--threads", type=int, default=1, help="threads per gunicorn worker")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--seed", type=int, default=3005)
+    args = parser.parse_args()
+
+    engine = bench_engine()
+    server = None
+    if args.url is None:
+        fresh_schema(engine)
+        generate(engine, SCALES[args.scale], args.seed, progress=None)
+    with engine.connect() as conn:
+        ids = {
+            "members": conn.execute(text('SELECT member_id FROM "Member"')).scalars().all(),
+            "trainers": conn.execute(text('SELECT trainer_id FROM "Trainer"')).scalars().all(),
+            "classes": conn.execute(text('SELECT class_id FROM "ClassAvailability"')).scalars().all(),
+        }
+    print(f"{len(ids['members'])} members, {len(ids['trainers'])} trainers, {len(ids['classes'])} open classes")
+
+    base_url = args.url
+    api_token, admin_token = os.environ.get("API_TOKEN", ""), os.environ.get("API_ADMIN_TOKEN", "")
+    if base_url is None:
+        base_url = f"http://127.0.0.1:{args.port}"
+        api_token, admin_token = secrets.token_urlsafe(), secrets.token_urlsafe()
+        env = dict(os.environ, DATABASE_URL=BENCH_DATABASE_URL, API_BIND=f"127.0.0.1:{args.port}",
+                   API_WORKERS=str(args.workers), API_THREADS=str(args.threads), API_TOKEN=api_token, API_ADMIN_TOKEN=admin_token)
+        server = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "wsgi:app"],
+                                  cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_until_up(base_url, time.perf_counter() + 30):
+            sys.exit(f"API at {base_url} did not come up")
+
+        recorder = Recorder()
+        deadline = time.perf_counter() + args.seconds
+
+        def client(number):
+            rng = random.Random(args.seed + number)
+            mix = endpoints(ids, rng)
+            weights = [weight for weight, _, _ in mix]
+            while time.perf_counter() < deadline:
+                _, name, build = rng.choices(mix, weights)[0]
+                method, path, params, body = build()
+                started = time.perf_counter()
+                status = request(base_url, method, path, params, body, admin_token if name in ADMIN_ENDPOINTS else api_token)
+                recorder.record(name, status, time.perf_counter() - started)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(args.clients) as executor:
+            list(executor.map(client, range(args.clients)))
+        elapsed = time.perf_counter() - started
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    setup = f"{args.workers} workers x {args.threads} threads" if args.url is None else base_url
+    print(f"{args.clients} clients for {elapsed:.1f} s against {setup}")
+    print(f"  {'endpoint':<26} {'requests':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  statuses")
+    all_latencies = []
+    errors = 0
+    for name in sorted(recorder.latencies):
+        ordered = sorted(recorder.latencies[name])
+        all_latencies.extend(ordered)
+        statuses = recorder.statuses[name]
+        errors += sum(count for status, count in statuses.items() if status == 0 or status >= 500)
+        print(f"  {name:<26} {len(ordered):>8} {len(ordered) / elapsed:>8.1f} {percentile(ordered, 0.50) * 1000:>8.1f} "
+              f"{percentile(ordered, 0.95) * 1000:>8.1f} {percentile(ordered, 0.99) * 1000:>8.1f}  "
+              + " ".join(f"{status}x{count}" for status, count in sorted(statuses.items())))
+    all_latencies.sort()
+    print(f"  {'total':<26} {len(all_latencies):>8} {len(all_latencies) / elapsed:>8.1f} {percentile(all_latencies, 0.50) * 1000:>8.1f} "
+          f"{percentile(all_latencies, 0.95) * 1000:>8.1f} {percentile(all_latencies, 0.99) * 1000:>8.1f}  {errors} errors")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from sqlalchemy import text
+import argparse
+import time
+from common import bench_engine, bench_sessionmaker, fresh_schema
+from models.schemas import Member
+import admin_functions
+import billing
+
+# Monthly membership invoices for the whole club: one billing_and_payments(action="create") call
+# (one INSERT + commit) per member vs billing.run_billing_cycle (one INSERT ... SELECT).
+# Then re-runs, concurrent runs and a dry run must not create a single duplicate.
+#
+#   python billing_cycle.py --members 100000 --per-call-sample 10000
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--members", type=int, default=100000)
+    parser.add_argument("--per-call-sample", type=int, default=10000, help="members billed one call at a time (time is extrapolated)")
+    args = parser.parse_args()
+
+    engine = bench_engine()
+    fresh_schema(engine)
+    with engine.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO "Member" (name, contact_detail)
+            SELECT 'Member ' || g, 'member' || g || '@example.com' FROM generate_series(1, :members) g
+        """), {"members": args.members})
+    Session = bench_sessionmaker(engine)
+    period = date.today()
+
+    with Session() as session:
+        sample = session.query(Member).order_by(Member.member_id).limit(args.per_call_sample).all()
+        started = time.perf_counter()
+        for member in sample:
+            admin_functions.billing_and_payments(session, action="create", member=member, type_of_billing=billing.MEMBERSHIP, amount=billing.MEMBERSHIP_FEE)
+        per_call = (time.perf_counter() - started) / len(sample)
+        print(f"per-call create:  {len(sample)} invoices in {per_call * len(sample):.2f} s "
+              f"({1 / per_call:,.0f}/s) -> ~{per_call * args.members:.1f} s for {args.members} members")
+        session.execute(text('TRUNCATE "BillingPayment"'))
+        session.commit()
+
+        report = billing.run_billing_cycle(session, period, dry_run=True)
+        print(f"dry run:          {report.eligible} eligible, {report.created} to create in {report.seconds:.2f} s")
+        report = billing.run_billing_cycle(session, period)
+        print(f"billing cycle:    {report.created} invoices in {report.seconds:.2f} s ({report.rows_per_second:,.0f}/s), "
+              f"{per_call * args.members / report.seconds:.0f}x faster than per-call")
+        report = billing.run_billing_cycle(session, period)
+        print(f"re-run:           {report.created} created, {report.skipped} skipped in {report.seconds:.2f} s")
+
+    # Two admins running next month's cycle at the same moment
+    next_period = date(period.year + period.month // 12, period.month % 12 + 1, 1)
+    def run(_):
+        with Session() as session:
+            return billing.run_billing_cycle(session, next_period)
+    with ThreadPoolExecutor(2) as executor:
+        reports = list(executor.map(run, range(2)))
+    print(f"concurrent runs:  created {[r.created for r in reports]}, skipped {[r.skipped for r in reports]}")
+
+    with engine.connect() as conn:
+        duplicates = conn.execute(text("""
+            SELECT count(*) FROM (SELECT member_id, billing_period FROM "BillingPayment"
+                                  GROUP BY member_id, billing_period HAVING count(*) > 1) d
+        """)).scalar()
+        total = conn.execute(text('SELECT count(*) FROM "BillingPayment"')).scalar()
+    print(f"{total} invoices for 2 periods, {duplicates} members billed twice for a period:",
+          "CORRECT" if duplicates == 0 and total == 2 * args.members else "DOUBLE-BILLED")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+from sqlalchemy import text
+import argparse
+import time
+from common import bench_engine, bench_sessionmaker, fresh_schema
+from datagen import SCALES, generate
+from models.schemas import FitnessClass
+import member_functions
+
+# The member class browser: the old listing (every FitnessClass through the view, past and full
+# ones included) vs the first page of ClassAvailability for the next N days. Then checks that the
+# trigger-maintained table matches a from-scratch computation after signups and a reschedule.
+#
+#   python class_availability.py --scale medium --days 14
+
+FROM_SCRATCH_SQL = text("""
+    SELECT fc.class_id, fc.class_name, t.name, r.room_name, rb.start_time, rb.end_time, fc.capacity, fc.capacity - fc.num_signed_up
+    FROM "FitnessClass" fc
+    JOIN "RoomBooking" rb ON rb.booking_id = fc.booking_id
+    JOIN "Room" r ON r.room_id = rb.room_id
+    JOIN "Trainer" t ON t.trainer_id = fc.trainer_id
+    WHERE fc.num_signed_up < fc.capacity AND rb.start_time > localtimestamp
+""")
+
+MAINTAINED_SQL = text("""
+    SELECT class_id, class_name, trainer_name, room_name, start_time, end_time, capacity, seats_left
+    FROM "ClassAvailability" WHERE start_time > localtimestamp
+""")
+
+def consistent(session):
+    return set(session.execute(FROM_SCRATCH_SQL).all()) == set(session.execute(MAINTAINED_SQL).all())
+
+def timed(fn, repeat):
+    fn()  # warm
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - started) / repeat * 1000, result
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", choices=list(SCALES), default="medium")
+    parser.add_argument("--days", type=int, default=14)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    engine = bench_engine()
+    fresh_schema(engine)
+    # No health metrics or billing needed here
+    generate(engine, SCALES[args.scale]._replace(metrics_per_member_year=0), progress=None)
+    Session = bench_sessionmaker(engine)
+
+    with Session() as session:
+        classes = session.query(FitnessClass).count()
+        old_ms, old_rows = timed(lambda: session.execute(text("SELECT * FROM \"FitnessClass\" ORDER BY class_name ASC")).all(), args.repeat)
+        new_ms, page = timed(lambda: next(member_functions.view_available_classes(session, days=args.days)), args.repeat)
+        print(f"{classes} classes")
+        print(f"  old listing (all classes):           {old_ms:8.2f} ms, {len(old_rows)} rows")
+        print(f"  ClassAvailability, next {args.days} days, page 1: {new_ms:8.2f} ms, {len(page.rows)} rows")
+
+        print("  trigger-maintained == from scratch after load:", consistent(session))
+
+        # Fill the soonest bookable class; it must drop out
+        target = page.rows[0]
+        free_members = session.execute(text("""
+            SELECT member_id FROM "Member" m
+            WHERE NOT EXISTS (SELECT 1 FROM "GroupMember" gm WHERE gm.class_id = :c AND gm.member_id = m.member_id)
+            ORDER BY member_id LIMIT :n
+        """), {"c": target.class_id, "n": target.seats_left}).scalars().all()
+        started = time.perf_counter()
+        for member_id in free_members:
+            member_functions.register_for_class(session, member_id, target.class_id)
+        per_signup_ms = (time.perf_counter() - started) / max(1, len(free_members)) * 1000
+        still_listed = session.execute(text('SELECT count(*) FROM "ClassAvailability" WHERE class_id = :c'), {"c": target.class_id}).scalar()
+        print(f"  filled class {target.class_id} with {len(free_members)} signups ({per_signup_ms:.2f} ms each), still listed: {bool(still_listed)}")
+
+        # Move another class into the past; it must drop out too
+        moved = page.rows[1]
+        session.execute(text("""
+            UPDATE "RoomBooking" SET start_time = start_time - interval '400 days', end_time = end_time - interval '400 days', version = version + 1
+            WHERE booking_id = (SELECT booking_id FROM "FitnessClass" WHERE class_id = :c)
+        """), {"c": moved.class_id})
+        session.commit()
+        still_listed = session.execute(text('SELECT count(*) FROM "ClassAvailability" WHERE class_id = :c'), {"c": moved.class_id}).scalar()
+        print(f"  moved class {moved.class_id} into the past, still listed: {bool(still_listed)}")
+        print("  trigger-maintained == from scratch after changes:", consistent(session))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+import argparse
+import asyncio
+import collections
+import random
+import time
+from common import BENCH_DATABASE_URL, fresh_schema
+import database
+import member_functions
+from signup_queue import SignupQueue
+
+# Class-opening burst: one commit per signup (member_functions.register_for_class on a
+# thread pool) vs the asyncio micro-batching SignupQueue. Same requests, same arrival order.
+#
+#   python class_signup_burst.py --signups 2000 --classes 4 --capacity 100
+
+def setup(engine, members, classes, capacity):
+    start = datetime.now() + timedelta(days=1)
+    with engine.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO "Member" (name, contact_detail)
+            SELECT 'Member ' || g, 'member' || g || '@example.com' FROM generate_series(1, :members) g
+        """), {"members": members})
+        conn.execute(text("""INSERT INTO "Admin" (name) VALUES ('Bench admin')"""))
+        conn.execute(text("""INSERT INTO "Room" (room_name) SELECT 'Bench room ' || g FROM generate_series(1, :classes) g"""), {"classes": classes})
+        conn.execute(text("""INSERT INTO "Trainer" (name) SELECT 'Bench trainer ' || g FROM generate_series(1, :classes) g"""), {"classes": classes})
+        conn.execute(text("""
+            INSERT INTO "RoomBooking" (admin_id, room_id, is_booked, start_time, end_time)
+            SELECT (SELECT min(admin_id) FROM "Admin"), room_id, TRUE, :start, :end FROM "Room"
+        """), {"start": start, "end": start + timedelta(hours=1)})
+        return conn.execute(text("""
+            INSERT INTO "FitnessClass" (trainer_id, booking_id, class_name, capacity, num_signed_up)
+            SELECT t.trainer_id, rb.booking_id, 'Popular class', :capacity, 0
+            FROM (SELECT trainer_id, row_number() OVER (ORDER BY trainer_id) AS n FROM "Trainer") t
+            JOIN (SELECT booking_id, row_number() OVER (ORDER BY booking_id) AS n FROM "RoomBooking") rb ON rb.n = t.n
+            RETURNING class_id
+        """), {"capacity": capacity}).scalars().all()
+
+def check(engine, class_ids, requests, results):
+    with engine.connect() as conn:
+        rows = conn.execute(text("""
+            SELECT fc.class_id, fc.num_signed_up, fc.capacity, count(gm.member_id), count(DISTINCT gm.member_id)
+            FROM "FitnessClass" fc LEFT JOIN "GroupMember" gm ON gm.class_id = fc.class_id
+            WHERE fc.class_id = ANY(:ids) GROUP BY fc.class_id
+        """), {"ids": class_ids}).all()
+    registered = collections.Counter(class_id for (_, class_id), result in zip(requests, results) if result == member_functions.REGISTERED)
+    wanted = collections.defaultdict(set)
+    for member_id, class_id in requests:
+        wanted[class_id].add(member_id)
+    return all(signed_up == roster == distinct == registered[class_id] == min(capacity, len(wanted[class_id]))
+               for class_id, signed_up, capacity, roster, distinct in rows)
+
+def run_single(engine, requests, workers):
+    Session = sessionmaker(bind=engine)
+
+    def signup(request):
+        member_id, class_id = request
+        with Session() as session:
+            return member_functions.register_for_class(session, member_id, class_id)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(workers) as executor:
+        results = list(executor.map(signup, requests))
+    return results, time.perf_counter() - started
+
+async def run_queue(engine, requests, max_batch, max_wait):
+    queue = SignupQueue(sessionmaker(bind=engine), max_batch=max_batch, max_wait=max_wait)
+    started = time.perf_counter()
+    results = await asyncio.gather(*(queue.register(member_id, class_id) for member_id, class_id in requests))
+    return results, time.perf_counter() - started, queue.stats()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--signups", type=int, default=2000)
+    parser.add_argument("--classes", type=int, default=4)
+    parser.add_argument("--capacity", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=32, help="threads for the one-commit-per-signup path")
+    parser.add_argument("--max-batch", type=int, default=200)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    settings = database.load_settings()._replace(url=BENCH_DATABASE_URL, pool_size=args.workers, max_overflow=0, statement_timeout_ms=0)
+    engine = database.make_engine(settings)
+    rng = random.Random(3005)
+    members = args.signups
+    requests = [(rng.randint(1, members), None) for _ in range(args.signups)]
+
+    for mode in ("single", "queue"):
+        fresh_schema(engine)
+        class_ids = setup(engine, members, args.classes, args.capacity)
+        burst = [(member_id, class_ids[i % len(class_ids)]) for i, (member_id, _) in enumerate(requests)]
+        if mode == "single":
+            results, elapsed = run_single(engine, burst, args.workers)
+            commits = len(burst)
+            detail = f"{commits} transactions"
+        else:
+            results, elapsed, stats = asyncio.run(run_queue(engine, burst, args.max_batch, args.max_wait_ms / 1000))
+            commits = stats.batches
+            detail = (f"{stats.batches} batches (avg {stats.avg_batch}, max {stats.max_batch}), "
+                      f"queue wait p50 {stats.p50_wait_ms:.1f} ms p95 {stats.p95_wait_ms:.1f} ms")
+        outcomes = collections.Counter(results)
+        print(f"{mode:>6}: {len(burst)} signups in {elapsed:.2f} s = {len(burst) / elapsed:,.0f} signups/s, "
+              f"{commits / elapsed:,.0f} commits/s; {detail}")
+        print("        " + ", ".join(f"{name}={count}" for name, count in sorted(outcomes.items()))
+              + ("  CORRECT" if check(engine, class_ids, burst, results) else "  INCONSISTENT"))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+import argparse
+import collections
+import random
+import threading
+import time
+from common import BENCH_DATABASE_URL, fresh_schema
+from models.schemas import FitnessClass, GroupMember, Member
+import database
+import member_functions
+
+# Hundreds of parallel signups for one small class, as when a popular class opens.
+# Some members click twice. Checks that no seat is oversold and no one is on the roster twice.
+#
+#   python class_signup_stress.py --signups 500 --capacity 20 --workers 32
+#   python class_signup_stress.py --legacy    (the old read-check-increment path, for comparison)
+
+def legacy_registration(session, member_id, class_id):
+    # What class_registration did before: read, check in Python, increment, commit
+    member = session.get(Member, member_id)
+    fitness_class = session.get(FitnessClass, class_id)
+    if any(group_member.member == member for group_member in fitness_class.members):
+        session.rollback()
+        return member_functions.ALREADY_REGISTERED
+    if fitness_class.num_signed_up >= fitness_class.capacity:
+        session.rollback()
+        return member_functions.CLASS_FULL
+    fitness_class.num_signed_up += 1
+    session.add(GroupMember(fitness_class=fitness_class, member=member))
+    try:
+        session.commit()
+    except Exception:
+        session.rollback()
+        return "error"
+    return member_functions.REGISTERED
+
+def setup(engine, members, capacity):
+    start = datetime.now() + timedelta(days=1)
+    with engine.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO "Member" (name, contact_detail)
+            SELECT 'Member ' || g, 'member' || g || '@example.com' FROM generate_series(1, :members) g
+        """), {"members": members})
+        conn.execute(text("""INSERT INTO "Admin" (name) VALUES ('Bench admin')"""))
+        conn.execute(text("""INSERT INTO "Room" (room_name) VALUES ('Bench room')"""))
+        conn.execute(text("""INSERT INTO "Trainer" (name) VALUES ('Bench trainer')"""))
+        booking_id = conn.execute(text("""
+            INSERT INTO "RoomBooking" (admin_id, room_id, is_booked, start_time, end_time)
+            SELECT min(a.admin_id), min(r.room_id), TRUE, :start, :end FROM "Admin" a, "Room" r
+            RETURNING booking_id
+        """), {"start": start, "end": start + timedelta(hours=1)}).scalar()
+        return conn.execute(text("""
+            INSERT INTO "FitnessClass" (trainer_id, booking_id, class_name, capacity, num_signed_up)
+            SELECT min(trainer_id), :booking_id, 'Popular class', :capacity, 0 FROM "Trainer"
+            RETURNING class_id
+        """), {"booking_id": booking_id, "capacity": capacity}).scalar()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--signups", type=int, default=500)
+    parser.add_argument("--capacity", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--duplicate-share", type=float, default=0.2, help="share of signups that repeat an earlier member")
+    parser.add_argument("--legacy", action="store_true")
+    args = parser.parse_args()
+
+    settings = database.load_settings()._replace(url=BENCH_DATABASE_URL, pool_size=args.workers, max_overflow=0, statement_timeout_ms=0)
+    engine = database.make_engine(settings)
+    fresh_schema(engine)
+    members = max(1, int(args.signups * (1 - args.duplicate_share)))
+    class_id = setup(engine, members, args.capacity)
+
+    rng = random.Random(3005)
+    requests = list(range(1, members + 1)) + [rng.randint(1, members) for _ in range(args.signups - members)]
+    rng.shuffle(requests)
+
+    Session = sessionmaker(bind=engine)
+    register = legacy_registration if args.legacy else member_functions.register_for_class
+    barrier = threading.Barrier(args.workers)
+    local = threading.local()
+
+    def signup(member_id):
+        if not getattr(local, "ready", False):
+            barrier.wait()  # every worker starts at the same moment
+            local.ready = True
+        with Session() as session:
+            try:
+                return register(session, member_id, class_id)
+            except Exception as e:
+                session.rollback()
+                return f"error: {type(e).__name__}"
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.workers) as executor:
+        results = list(executor.map(signup, requests))
+    elapsed = time.perf_counter() - started
+
+    with engine.connect() as conn:
+        num_signed_up, capacity = conn.execute(text('SELECT num_signed_up, capacity FROM "FitnessClass" WHERE class_id = :c'), {"c": class_id}).one()
+        roster = conn.execute(text('SELECT count(*), count(DISTINCT member_id) FROM "GroupMember" WHERE class_id = :c'), {"c": class_id}).one()
+
+    outcomes = collections.Counter(results)
+    print(f"{'legacy' if args.legacy else 'single-statement'}: {len(requests)} signups, {args.workers} workers, "
+          f"{elapsed:.2f} s ({len(requests) / elapsed:,.0f} signups/s)")
+    print("  outcomes: " + ", ".join(f"{name}={count}" for name, count in sorted(outcomes.items())))
+    print(f"  capacity={capacity} num_signed_up={num_signed_up} roster rows={roster[0]} distinct members={roster[1]}")
+    correct = (num_signed_up == roster[0] == roster[1] == outcomes[member_functions.REGISTERED]
+               and roster[0] == min(capacity, members))
+    print("  CORRECT" if correct else "  OVERSOLD OR INCONSISTENT")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+from datetime import datetime, date, timedelta
+from typing import NamedTuple
+from sqlalchemy import text
+import argparse
+import bisect
+import itertools
+import random
+from common import bench_engine, fresh_schema
+import bulk_import
+
+# Deterministic synthetic club data. The same scale, seed and origin always
+# produce the same rows. Skew: a few members are far more active than the rest,
+# evening/morning hours are busiest, and some trainers teach much more than others.
+
+class Scale(NamedTuple):
+    members: int
+    trainers: int
+    admins: int
+    rooms: int
+    years: int
+    future_days: int
+    metrics_per_member_year: int
+    class_share: float  # share of used room slots that become classes (rest: PT sessions)
+
+SCALES = {
+    "tiny": Scale(members=50, trainers=5, admins=2, rooms=2, years=1, future_days=30, metrics_per_member_year=12, class_share=0.6),
+    "small": Scale(members=1000, trainers=20, admins=3, rooms=5, years=1, future_days=60, metrics_per_member_year=24, class_share=0.6),
+    "medium": Scale(members=10000, trainers=60, admins=5, rooms=12, years=2, future_days=60, metrics_per_member_year=36, class_share=0.6),
+    "large": Scale(members=50000, trainers=200, admins=10, rooms=30, years=3, future_days=90, metrics_per_member_year=52, class_share=0.6),
+}
+
+OPEN_HOUR = 6
+CLOSE_HOUR = 22
+# Chance that a room slot is used at each hour of the day
+HOUR_DEMAND = {6: 0.5, 7: 0.7, 8: 0.6, 9: 0.4, 10: 0.3, 11: 0.3, 12: 0.5, 13: 0.4,
+               14: 0.3, 15: 0.3, 16: 0.4, 17: 0.8, 18: 0.9, 19: 0.8, 20: 0.5, 21: 0.3}
+CLASS_NAMES = ["Yoga", "HIIT", "Spin", "Pilates", "Boxing", "Zumba", "Strength", "Mobility"]
+GOAL_TYPES = 20
+
+def member_name(i):
+    return f"Member {i}"
+
+def member_contact(i):
+    return f"member{i}@example.com"
+
+def trainer_name(i):
+    return f"Trainer {i}"
+
+def admin_name(i):
+    return f"Admin {i}"
+
+def room_name(i):
+    return f"Room {i}"
+
+class WeightedPicker:
+    # Pareto-shaped weights: index 0 is the busiest
+    def __init__(self, rng, n, alpha=1.2):
+        weights = [1.0 / (i + 1) ** alpha for i in range(n)]
+        order = list(range(n))
+        rng.shuffle(order)
+        self.order = order
+        self.cumulative = list(itertools.accumulate(weights))
+        self.rng = rng
+
+    def pick(self):
+        position = bisect.bisect_left(self.cumulative, self.rng.random() * self.cumulative[-1])
+        return self.order[min(position, len(self.order) - 1)]
+
+    def sample(self, k):
+        chosen = set()
+        while len(chosen) < k:
+            chosen.add(self.pick())
+        return chosen
+
+def default_origin():
+    return datetime.combine(date.today(), datetime.min.time())
+
+def generate(engine, scale: Scale, seed: int = 3005, origin: datetime = None, progress=print):
+    origin = origin or default_origin()
+    first_day = origin - timedelta(days=365 * scale.years)
+    last_day = origin + timedelta(days=scale.future_days)
+    days = (last_day - first_day).days
+
+    def load(model, rows):
+        report = bulk_import.import_rows(engine, model, rows, progress=None)
+        if progress:
+            progress(f"  {model:<15} {report.rows_inserted:>9} rows  {report.rows_per_second:>10,.0f} rows/s")
+        return report
+
+    rng = random.Random(seed)
+    load("Admin", ({"name": admin_name(i)} for i in range(scale.admins)))
+    load("Room", ({"room_name": room_name(i)} for i in range(scale.rooms)))
+    load("Trainer", ({"name": trainer_name(i)} for i in range(scale.trainers)))
+    load("Member", ({
+        "name": member_name(i),
+        "date_of_birth": date(1950, 1, 1) + timedelta(days=rng.randrange(365 * 55)),
+        "gender": rng.choice(["F", "M", "X"]),
+        "contact_detail": member_contact(i),
+    } for i in range(scale.members)))
+
+    # Every trainer is available during opening hours every day
+    load("Availability", ({
+        "trainer_name": trainer_name(t),
+        "is_recurring": False,
+        "start_time": first_day + timedelta(days=d, hours=OPEN_HOUR),
+        "end_time": first_day + timedelta(days=d, hours=CLOSE_HOUR),
+    } for d in range(days) for t in range(scale.trainers)))
+
+    # Decide every used room slot up front (one row per slot, kept small)
+    rng = random.Random(seed + 1)
+    trainer_picker = WeightedPicker(rng, scale.trainers, alpha=0.8)
+    slots = []  # (room, start, kind, trainer, class_name, capacity)
+    for d in range(days):
+        day = first_day + timedelta(days=d)
+        for hour in range(OPEN_HOUR, CLOSE_HOUR):
+            used_rooms = [r for r in range(scale.rooms) if rng.random() < HOUR_DEMAND[hour]]
+            if not used_rooms:
+                continue
+            # A trainer can only be in one room per hour
+            trainers = list(trainer_picker.sample(min(len(used_rooms), scale.trainers)))
+            for r, t in zip(used_rooms, trainers):
+                kind = "class" if rng.random() < scale.class_share else "pt"
+                slots.append((r, day + timedelta(hours=hour), kind, t, rng.choice(CLASS_NAMES), rng.randrange(8, 31)))
+
+    load("RoomBooking", ({
+        "admin_name": admin_name(i % scale.admins),
+        "room_name": room_name(r),
+        "is_booked": True,
+        "start_time": start,
+        "end_time": start + timedelta(minutes=55),
+    } for i, (r, start, *_rest) in enumerate(slots)))
+
+    load("FitnessClass", ({
+        "trainer_name": trainer_name(t),
+        "room_name": room_name(r),
+        "start_time": start,
+        "class_name": name,
+        "capacity": capacity,
+        "num_signed_up": 0,
+    } for r, start, kind, t, name, capacity in slots if kind == "class"))
+
+    rng = random.Random(seed + 2)
+    member_picker = WeightedPicker(rng, scale.members)
+
+    def rosters():
+        for r, start, kind, t, name, capacity in slots:
+            if kind != "class":
+                continue
+            # Future classes are partly filled, past ones mostly full
+            fill = rng.uniform(0.2, 1.0) if start >= origin else rng.uniform(0.5, 1.0)
+            for m in member_picker.sample(min(int(capacity * fill), scale.members)):
+                yield {"member_contact": member_contact(m), "room_name": room_name(r), "start_time": start}
+    load("GroupMember", rosters())
+
+    load("TrainingSession", ({
+        "trainer_name": trainer_name(t),
+        "member_contact": member_contact(member_picker.pick()),
+        "room_name": room_name(r),
+        "start_time": start,
+    } for r, start, kind, t, *_rest in slots if kind == "pt"))
+    slots = None
+
+    # Free (unbooked) slots in the coming weeks for PT booking / room booking benchmarks, wherever
+    # the room is not already taken
+    rng = random.Random(seed + 3)
+    with engine.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO "RoomBooking" (admin_id, room_id, is_booked, start_time, end_time)
+            SELECT (SELECT min(admin_id) FROM "Admin"), r.room_id, FALSE,
+                   d + make_interval(hours => h), d + make_interval(hours => h, mins => 55)
+            FROM "Room" r,
+                 generate_series(CAST(:origin AS timestamp), CAST(:last_day AS timestamp), interval '1 day') d,
+                 generate_series(:open_hour, :close_hour - 1) h
+            WHERE NOT EXISTS (
+                SELECT 1 FROM "RoomBooking" b
+                WHERE b.room_id = r.room_id
+                  AND tsrange(b.start_time, b.end_time) && tsrange(d + make_interval(hours => h), d + make_interval(hours => h, mins => 55)))
+        """), {"origin": origin, "last_day": last_day, "open_hour": OPEN_HOUR, "close_hour": CLOSE_HOUR})
+
+    rank = [0] * scale.members
+    for position, m in enumerate(member_picker.order):
+        rank[m] = position
+
+    def metrics():
+        for m in range(scale.members):
+            # Active members log far more often
+            activity = 3.0 / (1 + 10 * rank[m] / scale.members)
+            count = max(1, int(scale.metrics_per_member_year * scale.years * activity))
+            weight = rng.uniform(50, 110)
+            height = rng.uniform(150, 200)
+            resting = rng.randrange(50, 85)
+            for _ in range(count):
+                weight += rng.uniform(-0.4, 0.35)
+                yield {
+                    "member_contact": member_contact(m),
+                    "date_recorded": first_day + timedelta(seconds=rng.randrange(365 * scale.years * 86400)),
+                    "weight": round(weight, 2),
+                    "height": round(height, 2),
+                    "heart_rate": resting + rng.randrange(-5, 40),
+                }
+    load("HealthMetric", metrics())
+
+    def billings():
+        for m in range(scale.members):
+            for month in range(12 * scale.years):
+                paid = month < 12 * scale.years - 1 or rng.random() < 0.7
+                issued = first_day + timedelta(days=30 * month, hours=OPEN_HOUR)
+                yield {
+                    "member_contact": member_contact(m),
+                    "type_of_billing": "Membership",
+                    "amount_due": 49.99,
+                    "status": "paid" if paid else "due",
+                    "payment_method": rng.choice(["Credit Card", "Debit", "Cash"]) if paid else None,
+                    "created_at": issued,
+                    "paid_at": issued + timedelta(days=rng.randrange(15), minutes=rng.randrange(600)) if paid else None,
+                }
+    load("BillingPayment", billings())
+
+    # One to three goals per member from a shared set of goal types, and a maintenance log per admin
+    with engine.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO "GoalType" (description, target)
+            SELECT (ARRAY['Lose weight', 'Run 5k', 'Bench press', 'Resting heart rate'])[1 + g % 4], 'Target ' || g
+            FROM generate_series(0, :goal_types - 1) g
+        """), {"goal_types": GOAL_TYPES})
+        conn.execute(text("""
+            INSERT INTO "HealthGoal" (member_id, goal_type_id)
+            SELECT m.member_id, t.first + (m.member_id * 7 + k) % :goal_types
+            FROM "Member" m, generate_series(0, m.member_id % 3) k, (SELECT min(goal_type_id) AS first FROM "GoalType") t
+        """), {"goal_types": GOAL_TYPES})
+        conn.execute(text("""
+            INSERT INTO "EquipmentManagement" (admin_id, admin_operation, status)
+            SELECT a.admin_id, (ARRAY['Treadmill service', 'Replace cables', 'Bike calibration', 'Mat cleaning'])[1 + g % 4] || ' #' || g,
+                   CASE WHEN g % 10 = 0 THEN 'open' ELSE 'closed' END
+            FROM "Admin" a, generate_series(1, :per_admin) g
+        """), {"per_admin": max(1, scale.members // (4 * scale.admins))})
+        if progress:
+            progress("  goals and equipment records")
+
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+    return origin
+
+def main():
+    parser = argparse.ArgumentParser(description="Fill the bench database with synthetic club data.")
+    parser.add_argument("scale", choices=list(SCALES))
+    parser.add_argument("--seed", type=int, default=3005)
+    args = parser.parse_args()
+
+    engine = bench_engine()
+    fresh_schema(engine)
+    print(f"Generating scale {args.scale}: {SCALES[args.scale]}")
+    generate(engine, SCALES[args.scale], args.seed)
+
+if __name__ == "__main__":
+    main()
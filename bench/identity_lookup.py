@@ -0,0 +1,49 @@
+from sqlalchemy import select
+import argparse
+import random
+import statistics
+import time
+from common import bench_engine, fresh_schema, bench_sessionmaker
+from datagen import SCALES, generate, member_name
+from models.schemas import Member
+import identity
+
+# Front-desk login: the old exact-match ORM query vs identity.find_member,
+# cold (empty cache) and warm (repeat logins), within one long-lived session.
+
+def timed(fn, names):
+    timings = []
+    for name in names:
+        started = time.perf_counter()
+        assert fn(name) is not None
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), sorted(timings)[int(len(timings) * 0.95) - 1]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", choices=list(SCALES), default="small")
+    parser.add_argument("--logins", type=int, default=2000)
+    args = parser.parse_args()
+
+    engine = bench_engine()
+    fresh_schema(engine)
+    generate(engine, SCALES[args.scale], progress=None)
+    rng = random.Random(3005)
+    # A busy desk sees the same regulars again and again
+    regulars = [member_name(rng.randrange(SCALES[args.scale].members)) for _ in range(200)]
+    names = [rng.choice(regulars) for _ in range(args.logins)]
+
+    Session = bench_sessionmaker(engine)
+    with Session() as session:
+        exact = lambda name: session.scalars(select(Member).where(Member.name == name).limit(1)).first()
+        print("exact-match query:  p50 %.3f ms  p95 %.3f ms" % timed(exact, names))
+    with Session() as session:
+        identity.cache.clear()
+        print("identity cold:      p50 %.3f ms  p95 %.3f ms" % timed(lambda n: identity.find_member(session, name=n.upper()), regulars))
+        print("identity warm:      p50 %.3f ms  p95 %.3f ms" % timed(lambda n: identity.find_member(session, name=n), names))
+    with Session() as session:
+        print("warm, new session:  p50 %.3f ms  p95 %.3f ms" % timed(lambda n: identity.find_member(session, name=n), names))
+    print(f"cache hits={identity.cache.hits} misses={identity.cache.misses}")
+
+if __name__ == "__main__":
+    main()
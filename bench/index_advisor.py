@@ -0,0 +1,333 @@
+from collections import defaultdict
+from datetime import timedelta
+from pathlib import Path
+from sqlalchemy import event, text
+from sqlalchemy.exc import DBAPIError
+import argparse
+import json
+import re
+from common import bench_engine, fresh_schema, bench_sessionmaker
+from datagen import SCALES, generate
+from run_benchmarks import CASES, Context
+import member_functions
+import billing
+import slot_finder
+import migrations
+
+# Index advisor for the app's hot queries. Replays every member/trainer/admin function
+# (run_benchmarks.CASES, plus the billing and PT slot reads) once against a scale-seeded database,
+# records each distinct statement with the parameters it was first sent with, and runs
+# EXPLAIN (ANALYZE, BUFFERS) on it (writes inside a transaction that is rolled back). Reports
+# sequential scans of large tables, hash joins that read a large table whole to keep a few rows,
+# and sorts of a large input feeding a LIMIT (keyset pages without an index on their keys),
+# with the index that would serve each; suggestions an existing index already leads with are
+# reported as covered.
+# --before-after explains every statement again with the vetted indexes (migrations.ADVISED_INDEXES)
+# dropped inside a rolled-back transaction, and prints plan and timing before/after.
+#
+#   python index_advisor.py --scale medium
+#   python index_advisor.py --scale medium --before-after --json results/index_advisor.json
+
+LARGE_TABLE_ROWS = 10000
+SELECTIVE = 0.1  # an index pays off when the scan keeps at most this share of the table
+EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+
+EXTRA_CASES = {
+    "member.update_fitness_goals": lambda s, ctx: member_functions.update_fitness_goals(s, 1, ctx.member, None, "Bench target"),
+    "billing.member_balance": lambda s, ctx: billing.member_balance(s, ctx.member_id),
+    "billing.revenue": lambda s, ctx: billing.revenue(s, ctx.origin.date() - timedelta(days=365), ctx.origin.date()),
+    "slot_finder.bookable_slots": lambda s, ctx: list(slot_finder.bookable_slots(s, ctx.origin, ctx.origin + timedelta(days=1)).rows(s)),
+}
+
+class Recorder:
+    # First parameters of every distinct statement, and the cases that sent it
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = {}
+        self.case = None
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if executemany or not statement.lstrip().upper().startswith(EXPLAINABLE):
+            return
+        entry = self.statements.setdefault(statement, {"parameters": parameters, "cases": []})
+        if self.case not in entry["cases"]:
+            entry["cases"].append(self.case)
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._before_cursor_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._before_cursor_execute)
+        return False
+
+def record_workload(engine, Session, origin):
+    with Session() as session:
+        ctx = Context(session, origin)
+    recorder = Recorder(engine)
+    with recorder:
+        for name, fn in {**CASES, **EXTRA_CASES}.items():
+            recorder.case = name
+            with Session() as session:
+                ctx.load(session)
+                try:
+                    fn(session, ctx)
+                except StopIteration:
+                    pass  # ran out of free bookings / open classes at this scale
+    return recorder.statements
+
+# Catalog
+
+def table_sizes(conn):
+    # Estimated rows per table; partitions count towards (and are reported as) their parent
+    parents = dict(conn.execute(text("""
+        SELECT c.relname, p.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent
+    """)).all())
+    sizes = defaultdict(float)
+    for name, rows in conn.execute(text("""
+        SELECT c.relname, greatest(c.reltuples, 0) FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p')
+    """)):
+        sizes[parents.get(name, name)] += rows
+    return parents, sizes
+
+def existing_indexes(conn):
+    # table -> [(index name, [columns])], plain-column keys only (expression keys end the list)
+    indexes = defaultdict(list)
+    for table, name, columns in conn.execute(text("""
+        SELECT t.relname, i.relname,
+               array(SELECT a.attname FROM unnest(x.indkey) WITH ORDINALITY k(attnum, n)
+                     JOIN pg_attribute a ON a.attrelid = x.indrelid AND a.attnum = k.attnum
+                     ORDER BY k.n)
+        FROM pg_index x JOIN pg_class t ON t.oid = x.indrelid JOIN pg_class i ON i.oid = x.indexrelid
+        JOIN pg_namespace n ON n.oid = t.relnamespace
+        WHERE n.nspname = 'public'
+    """)):
+        indexes[table].append((name, list(columns)))
+    return indexes
+
+def covered_by(indexes, table, columns):
+    # An index whose leading keys are exactly these columns (in any order) serves the lookup
+    for name, keys in indexes.get(table, []):
+        if len(keys) >= len(columns) and set(keys[:len(columns)]) == set(columns):
+            return name
+    return None
+
+# Plans
+
+def explain(conn, statement, parameters, drop=(), runs=1):
+    # Best of `runs`; every run in its own transaction, rolled back (writes, dropped indexes).
+    # None when the statement fails on replay (e.g. an insert the workload already committed)
+    best = None
+    for _ in range(runs):
+        trans = conn.begin()
+        try:
+            for index in drop:
+                conn.execute(text(f'DROP INDEX IF EXISTS "{index}"'))
+            plan = conn.exec_driver_sql("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + statement, parameters).scalar()[0]
+        except DBAPIError:
+            return None
+        finally:
+            trans.rollback()
+        if best is None or plan["Execution Time"] < best["Execution Time"]:
+            best = plan
+    return best
+
+def walk(node, ancestors=()):
+    yield node, ancestors
+    for child in node.get("Plans", []):
+        yield from walk(child, ancestors + (node,))
+
+COMPARED = re.compile(r'(?:\b\w+\.)?"?([a-z_]+)"?\s*(?:::\w+(?:\s\w+)*)?\s*(=|<>|<=|>=|<|>|~~\*?|= ANY)\s')
+ROW_COMPARED = re.compile(r"ROW\(([^)]*)\)\s*[<>]=?")
+CONSTANT_FIRST = re.compile(r"\(\s*(?:'[^']*'|[\d.]+|\$\d+)(?:::\w+(?:\s\w+)*)?\s*=\s*(?:\b\w+\.)?\"?([a-z_]+)\"?\s*\)")
+
+def filter_columns(expression):
+    # (equality columns, range columns) mentioned in a Filter / Index Cond expression
+    equal, ranged = [], []
+    for match in ROW_COMPARED.finditer(expression):
+        for column in match.group(1).split(","):
+            column = column.strip().split(".")[-1].strip('"')
+            if re.fullmatch(r"[a-z_]+", column) and column not in ranged:
+                ranged.append(column)
+    for column in CONSTANT_FIRST.findall(expression):
+        if column not in equal:
+            equal.append(column)  # "1 = member_id", as the ORM writes some comparisons
+    for column, operator in COMPARED.findall(expression):
+        if operator.startswith("~~") or operator == "<>":
+            continue  # LIKE '%x%' and inequality can't use a btree
+        target = equal if operator in ("=", "= ANY") else ranged
+        if column not in equal and column not in ranged:
+            target.append(column)
+    return equal, ranged
+
+def aliases(plan):
+    return {node["Alias"]: node["Relation Name"] for node, _ in walk(plan) if "Relation Name" in node and "Alias" in node}
+
+def findings(plan, parents, sizes, indexes, large=LARGE_TABLE_ROWS):
+    found = []
+    names = aliases(plan)
+    for node, ancestors in walk(plan):
+        kind = node["Node Type"]
+        loops = node.get("Actual Loops", 1)
+        if kind == "Seq Scan":
+            relation = node["Relation Name"]
+            table = parents.get(relation, relation)
+            if sizes.get(table, 0) < large:
+                continue
+            scanned = (node["Actual Rows"] + node.get("Rows Removed by Filter", 0)) * loops
+            kept = node["Actual Rows"] * loops
+            if scanned < large:
+                continue  # a small partition, or a scan that stopped early
+            columns = []
+            if "Filter" in node:
+                if kept > SELECTIVE * max(scanned, 1):
+                    continue  # reads most of what it scans: a seq scan is the right plan
+                equal, ranged = filter_columns(node["Filter"])
+                columns = equal + ranged[:1]
+                why = f"seq scan filtering {scanned:,.0f} rows down to {kept:,.0f}"
+            else:
+                # Read whole as the inner side of a hash join: an index helps if the join keeps few rows
+                join = next((a for a in reversed(ancestors) if a["Node Type"] == "Hash Join"), None)
+                if join is None or join["Actual Rows"] * join.get("Actual Loops", 1) > SELECTIVE * max(scanned, 1):
+                    continue
+                alias = node.get("Alias", relation)
+                columns = [column for side, column in re.findall(r'(\w+)\.(\w+)', join.get("Hash Cond", "")) if side == alias]
+                why = f"whole table ({scanned:,.0f} rows) hashed for a join keeping {join['Actual Rows']:,.0f}"
+            found.append(suggestion(table, columns, why, node, indexes))
+        elif kind == "Sort" and ancestors and ancestors[-1]["Node Type"] == "Limit":
+            child = node["Plans"][0]
+            if child["Actual Rows"] * child.get("Actual Loops", 1) < large:
+                continue
+            keys = [re.sub(r"\s+(DESC|ASC|NULLS \w+)", "", key) for key in node["Sort Key"]]
+            tables = {names.get(key.split(".")[0].strip('"')) if "." in key else None for key in keys}
+            if len(tables) != 1 or None in tables:
+                continue
+            table = tables.pop()
+            table = parents.get(table, table)
+            columns = [key.split(".")[-1].strip('"') for key in keys]
+            found.append(suggestion(table, columns, f"sorts {child['Actual Rows']:,.0f} rows to return {ancestors[-1]['Actual Rows']:,.0f}", node, indexes))
+    return found
+
+def suggestion(table, columns, why, node, indexes):
+    covered = covered_by(indexes, table, columns) if columns else None
+    return {"table": table, "columns": columns, "why": why, "node": node["Node Type"],
+            "covered_by": covered, "ms": round(node.get("Actual Total Time", 0.0) * node.get("Actual Loops", 1), 3)}
+
+def index_sql(table, columns):
+    return f'CREATE INDEX ON "{table}" ({", ".join(columns)})'
+
+def plan_lines(plan, depth=0):
+    # Compact plan tree: node, relation/index, rows and time per node
+    node = plan
+    label = node["Node Type"]
+    if "Index Name" in node:
+        label += f' using {node["Index Name"]}'
+    if "Relation Name" in node:
+        label += f' on {node["Relation Name"]}'
+    lines = [f'{"  " * depth}{label}  (rows={node["Actual Rows"]:,.0f} loops={node.get("Actual Loops", 1)} '
+             f'time={node["Actual Total Time"]:.2f} ms)']
+    for child in node.get("Plans", []):
+        lines.extend(plan_lines(child, depth + 1))
+    return lines
+
+def plan_shape(plan):
+    return [(node["Node Type"], node.get("Index Name"), node.get("Relation Name")) for node, _ in walk(plan)]
+
+def preview(statement, width=110):
+    return " ".join(statement.split())[:width]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", choices=list(SCALES), default="medium")
+    parser.add_argument("--seed", type=int, default=3005)
+    parser.add_argument("--large", type=int, default=LARGE_TABLE_ROWS, help="tables with fewer rows are never flagged")
+    parser.add_argument("--runs", type=int, default=3, help="EXPLAIN ANALYZE runs per statement (best is kept)")
+    parser.add_argument("--before-after", action="store_true", help="also explain without the vetted indexes")
+    parser.add_argument("--plans", action="store_true", help="print before/after plans of statements that changed")
+    parser.add_argument("--json", help="write the report here")
+    args = parser.parse_args()
+
+    engine = bench_engine()
+    fresh_schema(engine)
+    print(f"== scale {args.scale}: generating data")
+    origin = generate(engine, SCALES[args.scale], args.seed, progress=None)
+    Session = bench_sessionmaker(engine)
+    statements = record_workload(engine, Session, origin)
+    print(f"{len(statements)} distinct statements recorded from {len(CASES) + len(EXTRA_CASES)} operations")
+
+    report = {"scale": args.scale, "statements": []}
+    skipped = []
+    suggestions = {}
+    with engine.connect() as conn:
+        parents, sizes = table_sizes(conn)
+        indexes = existing_indexes(conn)
+        vetted = [name for table in indexes.values() for name, _ in table if name in migrations.ADVISED_INDEXES]
+        conn.rollback()  # end the catalog reads' transaction; each explain runs in its own
+        for statement, entry in statements.items():
+            after = explain(conn, statement, entry["parameters"], runs=args.runs)
+            if after is None:
+                skipped.append(entry["cases"])
+                continue
+            result = {"sql": preview(statement, 300), "cases": entry["cases"], "ms": after["Execution Time"],
+                      "findings": findings(after["Plan"], parents, sizes, indexes, args.large)}
+            if args.before_after:
+                before = explain(conn, statement, entry["parameters"], drop=vetted, runs=args.runs)
+                result["before_ms"] = before["Execution Time"]
+                result["before_findings"] = findings(before["Plan"], parents, sizes, indexes, args.large)
+                result["before_plan"], result["plan"] = plan_lines(before["Plan"]), plan_lines(after["Plan"])
+                result["plan_changed"] = plan_shape(before["Plan"]) != plan_shape(after["Plan"])
+            report["statements"].append(result)
+            for finding in result["findings"]:
+                if finding["columns"] and not finding["covered_by"]:
+                    key = (finding["table"], tuple(finding["columns"]))
+                    total = suggestions.setdefault(key, {"statements": 0, "ms": 0.0, "cases": set()})
+                    total["statements"] += 1
+                    total["ms"] += result["ms"]
+                    total["cases"].update(entry["cases"])
+
+    if skipped:
+        print(f"{len(skipped)} write statements could not be replayed ({', '.join(sorted({case for cases in skipped for case in cases}))})")
+    print(f"\nFindings (tables over {args.large:,} rows):")
+    for result in sorted(report["statements"], key=lambda r: -r["ms"]):
+        for finding in result["findings"]:
+            status = f"covered by {finding['covered_by']}" if finding["covered_by"] else (
+                index_sql(finding["table"], finding["columns"]) if finding["columns"] else "no usable columns")
+            print(f"  {result['ms']:>9.2f} ms  {', '.join(result['cases'])}: {finding['why']} on {finding['table']} -> {status}")
+            print(f"             {preview(result['sql'])}")
+
+    print("\nSuggested indexes (by time of the statements they serve):")
+    for (table, columns), total in sorted(suggestions.items(), key=lambda item: -item[1]["ms"]):
+        print(f"  {index_sql(table, columns):<70} {total['statements']:>3} statements {total['ms']:>9.2f} ms  "
+              f"({', '.join(sorted(total['cases']))})")
+    if not suggestions:
+        print("  none")
+    report["suggestions"] = [{"table": table, "columns": list(columns), "sql": index_sql(table, columns), "statements": total["statements"],
+                              "ms": round(total["ms"], 3), "cases": sorted(total["cases"])}
+                             for (table, columns), total in suggestions.items()]
+
+    if args.before_after:
+        print(f"\nWithout -> with the vetted indexes ({', '.join(sorted(vetted))}):")
+        by_case = defaultdict(lambda: [0.0, 0.0])
+        for result in report["statements"]:
+            for case in result["cases"]:
+                by_case[case][0] += result["before_ms"]
+                by_case[case][1] += result["ms"]
+        for case, (before, after) in sorted(by_case.items(), key=lambda item: item[1][1] - item[1][0]):
+            if before - after >= 0.05 or after - before >= 0.05:
+                print(f"  {case:<34} {before:>9.2f} -> {after:>9.2f} ms  ({before / after if after else float('inf'):>6.1f}x)")
+        if args.plans:
+            for result in report["statements"]:
+                if result["plan_changed"] and result["before_ms"] > 1.2 * result["ms"] + 0.5:
+                    print(f"\n  {', '.join(result['cases'])}: {result['before_ms']:.2f} -> {result['ms']:.2f} ms  {preview(result['sql'])}")
+                    print("    before:\n" + "\n".join("      " + line for line in result["before_plan"]))
+                    print("    after:\n" + "\n".join("      " + line for line in result["plan"]))
+
+    if args.json:
+        Path(args.json).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.json).write_text(json.dumps(report, indent=2, default=str))
+        print(f"Saved {args.json}")
+
+if __name__ == "__main__":
+    main()
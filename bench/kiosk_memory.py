@@ -0,0 +1,182 @@
+from contextlib import nullcontext, redirect_stdout
+from datetime import date, timedelta
+from sqlalchemy import text
+import argparse
+import functools
+import gc
+import multiprocessing
+import os
+import random
+import resource
+import statistics
+import sys
+import time
+from common import bench_engine, fresh_schema, bench_sessionmaker
+from datagen import SCALES, admin_name, generate, member_name, trainer_name
+import database
+import terminal_UI
+
+# A front desk left running all shift: replays an 8-hour day of visits through terminal_UI.main_menu
+# with a scripted keyboard, once with a unit of work per menu action (what app/main.py runs) and
+# once with the one session held from startup that the UI used to share. Every few visits, back at
+# the main menu, samples resident memory, live Python objects, the session's identity map and the
+# pooled connections checked out, and reports them hour by hour. Each mode runs in its own process
+# on freshly generated data, so neither inherits the other's memory or bookings.
+#
+#   python kiosk_memory.py --scale small --hours 8 --visits-per-hour 240
+#   python kiosk_memory.py --modes single    (just the long-lived session)
+
+MODES = ("scoped", "single")
+
+# (visit, weight); a visit is the role chosen at the main menu and the (prompt, answer) pairs that follow
+MIX = (("member dashboard", 25), ("log health metric", 15), ("book PT session", 10), ("class signup", 10),
+       ("trainer schedule", 10), ("trainer member lookup", 5), ("admin balance check", 10),
+       ("admin room bookings", 10), ("admin open invoices", 5))
+
+def visit_script(visit, rng, scale, class_ids):
+    member = member_name(rng.randrange(scale.members))
+    if visit in ("member dashboard", "log health metric", "book PT session", "class signup"):
+        steps = [("Choice", "2"), ("Enter your username", member)]
+        if visit == "member dashboard":
+            steps += [("Choice", "6")]
+        elif visit == "log health metric":
+            steps += [("Choice", "2"), ("From date", ""), ("Until date", ""), ("Add a health metric", "y"),
+                      ("Enter weight", str(rng.randint(50, 110))), ("Enter height", str(rng.randint(150, 200))),
+                      ("Enter heart rate", str(rng.randint(55, 95))), ("Add a health metric", "n")]
+        elif visit == "book PT session":
+            # No option is offered when nothing is free; the script then skips to the next "Choice"
+            steps += [("Choice", "4"), ("Choice", "1"), ("First day", ""), ("Number of days", "3"), ("Trainer ID", ""),
+                      ("Option number", str(rng.randint(1, 5))), ("Choice", "0")]
+        else:
+            steps += [("Choice", "5"), ("Show classes", "7"), ("Register for a class", "y"),
+                      ("Class ID", str(rng.choice(class_ids))), ("Register for a class", "n")]
+        return "1", steps + [("Choice", "0"), ("Choice", "0")]
+    if visit.startswith("trainer"):
+        steps = [("Choice", "2"), ("Enter your username", trainer_name(rng.randrange(scale.trainers)))]
+        if visit == "trainer schedule":
+            steps += [("Choice", "2")]
+        else:
+            steps += [("Choice", "3"), ("Member name to lookup", member)]
+        return "2", steps + [("Choice", "0"), ("Choice", "0")]
+    steps = [("Choice", "2"), ("Enter your username", admin_name(rng.randrange(scale.admins)))]
+    if visit == "admin balance check":
+        steps += [("Choice", "4"), ("Choice", "5"), ("Member ID", str(rng.randint(1, scale.members))), ("Choice", "7")]
+    elif visit == "admin room bookings":
+        today = date.today()
+        steps += [("Choice", "1"), ("From date", f"{today:%Y-%m-%d}"), ("Until date", f"{today + timedelta(days=1):%Y-%m-%d}"),
+                  ("Room name", ""), ("Add a room booking", "n")]
+    else:
+        steps += [("Choice", "4"), ("Choice", "3"), ("Status filter", "due"), ("Choice", "7")]
+    return "3", steps + [("Choice", "0"), ("Choice", "0")]
+
+class FrontDesk:
+    # Stands in for input(): answers the next scripted prompt, skipping steps whose prompt never
+    # came up; pages on ("Enter for more") and "Press Enter" are answered on their own
+    def __init__(self, visits, at_main_menu):
+        self.visits = iter(visits)
+        self.at_main_menu = at_main_menu
+        self.steps, self.name = [], None
+
+    def __call__(self, text=""):
+        if text.startswith("-- "):
+            return "q"
+        if text.startswith("Press Enter"):
+            return ""
+        if text.startswith("Choose role"):
+            self.at_main_menu()
+            visit = next(self.visits, None)
+            if visit is None:
+                return "0"
+            self.name, (role, self.steps) = visit[0], visit[1]
+            return role
+        for i, (expected, answer) in enumerate(self.steps):
+            if text.startswith(expected):
+                del self.steps[:i + 1]
+                return answer
+        raise RuntimeError(f"{self.name}: unscripted prompt {text!r}")
+
+def rss_bytes():
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # peak, not current, off Linux
+
+def run_mode(mode, args, scale, class_ids):
+    engine = bench_engine()
+    Session = bench_sessionmaker(engine)
+    rng = random.Random(args.seed)
+    names = [name for name, _ in MIX]
+    weights = [weight for _, weight in MIX]
+    total = args.hours * args.visits_per_hour
+    visits = []
+    for _ in range(total):
+        visit = rng.choices(names, weights)[0]
+        visits.append((visit, visit_script(visit, rng, scale, class_ids)))
+
+    held = Session() if mode == "single" else None
+    scope = (lambda: nullcontext(held)) if held else functools.partial(database.session_scope, Session)
+    samples, visit_seconds = [], []
+    state = {"done": -1, "last": None}
+
+    def at_main_menu():
+        now = time.perf_counter()
+        if state["last"] is not None:
+            visit_seconds.append(now - state["last"])
+        state["done"] += 1
+        done = state["done"]
+        if done % args.sample_every == 0 or done == total:
+            gc.collect()
+            samples.append((done, rss_bytes(), len(gc.get_objects()), len(held.identity_map) if held else 0,
+                            engine.pool.checkedout(), bool(held and held.in_transaction())))
+        state["last"] = time.perf_counter()
+
+    terminal_UI.input = FrontDesk(visits, at_main_menu)
+    terminal_UI.clear_screen = lambda: None
+    started = time.perf_counter()
+    with open(args.transcript or os.devnull, "w") as screen, redirect_stdout(screen):
+        terminal_UI.main_menu(scope)
+    elapsed = time.perf_counter() - started
+    if held:
+        held.close()
+
+    base = samples[0][1]
+    print(f"{'one session per menu action' if mode == 'scoped' else 'one session for the whole shift'}: "
+          f"{total:,} visits in {elapsed:.1f} s, visit p50 {statistics.median(visit_seconds) * 1000:.1f} ms")
+    print(f"  {'hour':>4} {'visits':>7} {'RSS MB':>8} {'vs start':>9} {'objects':>9} {'identity map':>13} {'conns held':>11} {'in txn':>7}")
+    for hour in range(1, args.hours + 1):
+        done, rss, objects, identity, checked_out, in_txn = max((s for s in samples if s[0] <= hour * args.visits_per_hour), key=lambda s: s[0])
+        print(f"  {hour:>4} {done:>7,} {rss / 2**20:>8.1f} {(rss - base) / 2**20:>+8.1f}M {objects:>9,} {identity:>13,} {checked_out:>11} {str(in_txn):>7}")
+    after_first = [s for s in samples if s[0] >= args.visits_per_hour]
+    growth = (after_first[-1][1] - after_first[0][1]) / 2**20
+    print(f"  RSS from hour 1 to hour {args.hours}: {growth:+.1f} MB, objects {after_first[-1][2] - after_first[0][2]:+,}")
+    sys.stdout.flush()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", choices=list(SCALES), default="small")
+    parser.add_argument("--seed", type=int, default=3005)
+    parser.add_argument("--hours", type=int, default=8)
+    parser.add_argument("--visits-per-hour", type=int, default=240)
+    parser.add_argument("--sample-every", type=int, default=20, help="visits between memory samples")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--transcript", help="write what the desk saw to this file (the last mode run)")
+    args = parser.parse_args()
+
+    scale = SCALES[args.scale]
+    engine = bench_engine()
+    # fork, so each mode starts from this process as it is now: same code loaded, nothing replayed yet
+    context = multiprocessing.get_context("fork")
+    for mode in args.modes:
+        fresh_schema(engine)
+        origin = generate(engine, scale, args.seed, progress=None)
+        with engine.connect() as conn:
+            class_ids = conn.execute(text('SELECT fc.class_id FROM "FitnessClass" fc JOIN "RoomBooking" rb ON rb.booking_id = fc.booking_id '
+                                          'WHERE rb.start_time > :now ORDER BY 1'), {"now": origin}).scalars().all()
+        engine.dispose()
+        process = context.Process(target=run_mode, args=(mode, args, scale, class_ids))
+        process.start()
+        process.join()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from sqlalchemy import text
+import argparse
+import random
+import time
+from common import bench_engine, bench_sessionmaker, fresh_schema
+from datagen import SCALES, generate
+import admin_functions
+import billing
+
+# Front-desk balance checks and monthly revenue reports: scanning BillingPayment vs the
+# trigger-maintained MemberBalance / LedgerDaily. Then billing runs, concurrent payments and deletes
+# go through the triggers and billing.reconcile() must find the summaries exact.
+#
+#   python ledger.py --scale medium
+
+RAW_BALANCE_SQL = text("""
+    SELECT coalesce(sum(amount_due) FILTER (WHERE status = 'due'), 0), count(*) FILTER (WHERE status = 'due'), max(paid_at)
+    FROM "BillingPayment" WHERE member_id = :m
+""")
+
+RAW_REVENUE_SQL = text("""
+    SELECT date_trunc('month', coalesce(paid_at, created_at)) AS month, type_of_billing, count(*), sum(amount_due)
+    FROM "BillingPayment" WHERE status = 'paid' AND coalesce(paid_at, created_at) >= :start AND coalesce(paid_at, created_at) < :end
+    GROUP BY 1, 2 ORDER BY 1, 2
+""")
+
+def timed(fn, repeat):
+    fn()  # warm
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - started) / repeat * 1000, result
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", choices=list(SCALES), default="medium")
+    parser.add_argument("--payments", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    engine = bench_engine()
+    fresh_schema(engine)
+    generate(engine, SCALES[args.scale]._replace(metrics_per_member_year=0), progress=None)
+    Session = bench_sessionmaker(engine)
+    rng = random.Random(3005)
+    today = date.today()
+    year_ago = date(today.year - 1, today.month, 1)
+
+    with Session() as session:
+        invoices = session.execute(text('SELECT count(*) FROM "BillingPayment"')).scalar()
+        members = session.execute(text('SELECT member_id FROM "Member"')).scalars().all()
+        print(f"{invoices} invoices, {len(members)} members")
+
+        raw_ms, _ = timed(lambda: session.execute(RAW_BALANCE_SQL, {"m": rng.choice(members)}).one(), args.repeat * 10)
+        ledger_ms, _ = timed(lambda: billing.member_balance(session, rng.choice(members)), args.repeat * 10)
+        print(f"  member balance:        raw {raw_ms:7.2f} ms   ledger {ledger_ms:6.2f} ms")
+        raw_ms, raw_rows = timed(lambda: session.execute(RAW_REVENUE_SQL, {"start": year_ago, "end": today + timedelta(days=1)}).all(), args.repeat)
+        ledger_ms, rows = timed(lambda: billing.revenue(session, year_ago, today + timedelta(days=1)), args.repeat)
+        same = [(r[0].date(), r[1], r[2], r[3]) for r in raw_rows] == [(r.period_start, r.type_of_billing, r.paid_count, r.paid_amount) for r in rows if r.paid_count]
+        print(f"  12-month revenue:      raw {raw_ms:7.2f} ms   ledger {ledger_ms:6.2f} ms   same totals: {same}")
+
+        report = billing.run_billing_cycle(session, today + timedelta(days=31))
+        print(f"  billing cycle with triggers: {report.created} invoices in {report.seconds:.2f} s")
+        due = session.execute(text("""SELECT billing_id FROM "BillingPayment" WHERE status = 'due' ORDER BY random() LIMIT :n"""), {"n": args.payments}).scalars().all()
+
+    def pay(billing_id):
+        with Session() as session:
+            return bool(admin_functions.billing_and_payments(session, action="pay", billing_id=billing_id, payment_method="Cash"))
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.workers) as executor:
+        paid = sum(executor.map(pay, due + due[:args.payments // 10]))  # some paid twice
+    print(f"  {paid} payments from {args.workers} workers in {time.perf_counter() - started:.2f} s")
+
+    with Session() as session:
+        session.execute(text("""DELETE FROM "BillingPayment" WHERE billing_id IN (SELECT billing_id FROM "BillingPayment" ORDER BY random() LIMIT 500)"""))
+        session.commit()
+        report = billing.reconcile(session)
+        print(f"  after billing, payments and deletes: {report.balance_mismatches} + {report.daily_mismatches} mismatches "
+              f"(checked in {report.seconds:.2f} s)", "CORRECT" if report.consistent else "DRIFTED")
+
+        # Drift the summaries behind the triggers' back; reconcile must see it and repair it
+        session.execute(text('UPDATE "MemberBalance" SET outstanding = outstanding + 1 WHERE member_id IN (SELECT member_id FROM "MemberBalance" LIMIT 3)'))
+        session.commit()
+        report = billing.reconcile(session, repair=True)
+        print(f"  after manual drift: {report.balance_mismatches} mismatches found, repaired={report.repaired}; "
+              f"now consistent: {billing.reconcile(session).consistent}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+from datetime import datetime, timedelta
+from sqlalchemy import select, text
+from sqlalchemy.orm import selectinload
+import argparse
+import math
+import time
+import numpy as np
+from common import bench_engine, fresh_schema, bench_sessionmaker
+from models.schemas import Member
+import health_analytics
+
+# Club-wide health stats: NumPy columnar (health_analytics) vs iterating
+# member.health_metrics ORM objects, on a synthetic HealthMetric table.
+#
+#   python member_health_stats.py --rows 1000000 --members 10000
+
+FILL_SQL = text("""
+    INSERT INTO "HealthMetric" (member_id, date_recorded, weight, height, heart_rate)
+    SELECT 1 + (g % :members),
+           CAST(:origin AS timestamp) - make_interval(secs => (CAST(g AS bigint) * 7919) % (:days * 86400)),
+           CASE WHEN g % 11 = 0 THEN NULL ELSE round(CAST(60 + (g % 50) + random() AS numeric), 2) END,
+           CASE WHEN g % 13 = 0 THEN NULL ELSE 150 + (g % 7) * 7 END,
+           CASE WHEN g % 5 = 0 THEN NULL ELSE 55 + (g % 60) END
+    FROM generate_series(:first, :last) g
+""")
+
+def fill(engine, rows, members, days, origin):
+    with engine.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO "Member" (name, contact_detail)
+            SELECT 'Member ' || g, 'member' || g || '@example.com' FROM generate_series(1, :members) g
+        """), {"members": members})
+        conn.execute(text("SELECT healthmetric_ensure_partitions(:first, :last)"),
+                     {"first": origin - timedelta(days=days), "last": origin})
+    batch = 200000
+    for first in range(0, rows, batch):
+        with engine.begin() as conn:
+            conn.execute(FILL_SQL, {"members": members, "origin": origin, "days": days,
+                                    "first": first, "last": min(first + batch, rows) - 1})
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+
+def per_object_stats(session, as_of, trend_days=30):
+    # The shape dashboard/member_lookup used: walk each member's ORM metric objects in Python
+    results = {}
+    members = session.scalars(select(Member).options(selectinload(Member.health_metrics))).all()
+    for member in members:
+        metrics = sorted((m for m in member.health_metrics if m.date_recorded <= as_of), key=lambda m: m.date_recorded)
+        if not metrics:
+            continue
+        weights = [m for m in metrics if m.weight is not None]
+        heights = [m for m in metrics if m.height is not None]
+        latest_weight = float(weights[-1].weight) if weights else math.nan
+        latest_height = float(heights[-1].height) if heights else math.nan
+        bmi = latest_weight / (latest_height / 100) ** 2 if weights and heights else math.nan
+
+        def hr_avg(days):
+            rates = [m.heart_rate for m in metrics if m.heart_rate is not None and m.date_recorded >= as_of - timedelta(days=days)]
+            return sum(rates) / len(rates) if rates else math.nan
+
+        points = [((m.date_recorded - as_of).total_seconds() / 86400, float(m.weight))
+                  for m in weights if m.date_recorded >= as_of - timedelta(days=trend_days)]
+        slope = math.nan
+        if len(points) >= 2:
+            mean_x = sum(x for x, _ in points) / len(points)
+            mean_y = sum(y for _, y in points) / len(points)
+            sxx = sum((x - mean_x) ** 2 for x, _ in points)
+            if sxx > 1e-9:
+                slope = sum((x - mean_x) * (y - mean_y) for x, y in points) / sxx * 7
+        results[member.member_id] = (len(metrics), latest_weight, latest_height, bmi, hr_avg(7), hr_avg(30), slope)
+    return results
+
+def matches(stats, baseline):
+    if len(stats.member_id) != len(baseline):
+        return False
+    for row in stats.rows():
+        expected = baseline[row.member_id]
+        if not np.allclose(row[1:], expected, rtol=1e-6, atol=1e-6, equal_nan=True):
+            return False
+    return True
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--members", type=int, default=10000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--skip-baseline", action="store_true", help="only time the NumPy path")
+    args = parser.parse_args()
+
+    engine = bench_engine()
+    fresh_schema(engine)
+    origin = datetime.now().replace(microsecond=0)
+    print(f"Filling {args.rows:,} metrics for {args.members:,} members over {args.days} days")
+    fill(engine, args.rows, args.members, args.days, origin)
+    Session = bench_sessionmaker(engine)
+
+    with Session() as session:
+        started = time.perf_counter()
+        arrays = health_analytics.load_metric_arrays(session, origin)
+        loaded = time.perf_counter()
+        stats = health_analytics.compute_stats(arrays, origin)
+        done = time.perf_counter()
+    numpy_seconds = done - started
+    print(f"numpy:      load {loaded - started:7.2f} s  compute {done - loaded:7.3f} s  "
+          f"total {numpy_seconds:7.2f} s  ({len(stats.member_id):,} members)")
+
+    if args.skip_baseline:
+        return
+    with Session() as session:
+        started = time.perf_counter()
+        baseline = per_object_stats(session, origin)
+        elapsed = time.perf_counter() - started
+    print(f"per-object: total {elapsed:7.2f} s  ({elapsed / numpy_seconds:.0f}x slower)")
+    print("results match" if matches(stats, baseline) else "RESULTS DIFFER")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import text
+import argparse
+import time
+from common import BENCH_DATABASE_URL
+import database
+
+# Many front-desk workers sharing one small pool: checkout wait and saturation
+# as reported by database.pool_snapshot().
+#
+#   python pool_saturation.py --workers 20 --pool-size 5 --max-overflow 0
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--pool-size", type=int, default=5)
+    parser.add_argument("--max-overflow", type=int, default=0)
+    parser.add_argument("--hold-ms", type=float, default=20.0, help="how long each unit of work holds its connection")
+    args = parser.parse_args()
+
+    settings = database.load_settings()._replace(url=BENCH_DATABASE_URL, pool_size=args.pool_size,
+                                                 max_overflow=args.max_overflow, pool_timeout=30)
+    engine = database.make_engine(settings)
+
+    def unit_of_work(_):
+        with engine.connect() as conn:
+            conn.execute(text("SELECT pg_sleep(:s)"), {"s": args.hold_ms / 1000})
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.workers) as executor:
+        list(executor.map(unit_of_work, range(args.requests)))
+    elapsed = time.perf_counter() - started
+
+    snapshot = database.pool_snapshot(engine)
+    print(f"{args.requests} units of work, {args.workers} workers, pool {args.pool_size}+{args.max_overflow}: {elapsed:.2f} s")
+    print(f"  checkouts={snapshot.checkouts} timeouts={snapshot.timeouts} peak={snapshot.peak_checked_out}/{snapshot.capacity}")
+    print(f"  wait avg={snapshot.avg_wait_ms:.2f} ms p95={snapshot.p95_wait_ms:.2f} ms max={snapshot.max_wait_ms:.2f} ms")
+
+if __name__ == "__main__":
+    main()
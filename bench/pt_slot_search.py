@@ -0,0 +1,81 @@
+from datetime import datetime, date, timedelta
+import argparse
+import random
+import time
+import numpy as np
+from common import bench_engine, bench_sessionmaker, fresh_schema
+from datagen import Scale, generate
+import scheduling
+import slot_finder
+
+# Free PT slots for every trainer over a month: slot_finder (one NumPy sweep over all trainers)
+# vs asking scheduling.trainer_conflicts about every candidate start, trainer by trainer.
+# Both must agree on every candidate checked.
+#
+#   python pt_slot_search.py --trainers 200 --days 30
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trainers", type=int, default=200)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--duration-minutes", type=int, default=60)
+    parser.add_argument("--check-trainers", type=int, default=10, help="trainers compared against trainer_conflicts")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    engine = bench_engine()
+    fresh_schema(engine)
+    scale = Scale(members=2000, trainers=args.trainers, admins=3, rooms=max(2, args.trainers // 6), years=1,
+                  future_days=args.days + 1, metrics_per_member_year=0, class_share=0.6)
+    generate(engine, scale, progress=None)
+    Session = bench_sessionmaker(engine)
+
+    start = datetime.combine(date.today() + timedelta(days=1), datetime.min.time())
+    end = start + timedelta(days=args.days)
+    duration = timedelta(minutes=args.duration_minutes)
+
+    with Session() as session:
+        slot_finder.find_slots(session, start, end, duration)  # warm
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            slots = slot_finder.find_slots(session, start, end, duration)
+        find_ms = (time.perf_counter() - started) / args.repeat * 1000
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            options = slot_finder.bookable_slots(session, start, end)
+        bookable_ms = (time.perf_counter() - started) / args.repeat * 1000
+        day_end = start + timedelta(days=1)
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            day_options = slot_finder.bookable_slots(session, start, day_end)
+        day_ms = (time.perf_counter() - started) / args.repeat * 1000
+        trainers = len(np.unique(slots.trainer_id))
+        print(f"{args.trainers} trainers, {args.days} days, {args.duration_minutes}-minute sessions on a 15-minute grid")
+        print(f"  find_slots:     {find_ms:8.1f} ms  {len(slots.trainer_id):,} feasible starts for {trainers} trainers")
+        print(f"  bookable_slots: {bookable_ms:8.1f} ms  {len(options):,} (trainer, free room booking) pairs")
+        print(f"  bookable_slots, one day (the booking menu): {day_ms:6.1f} ms  {len(day_options):,} pairs")
+
+        # The same question asked window by window through trainer_conflicts
+        rng = random.Random(3005)
+        stride = slot_finder.DEFAULT_STEP
+        grid = [start + i * stride for i in range(int((end - start - duration) / stride) + 1)]
+        found = {(t, s) for t, s in zip(slots.trainer_id.tolist(), slots.start_time.astype(datetime).tolist())}
+        checked = rng.sample(sorted(set(slots.trainer_id.tolist())), min(args.check_trainers, trainers))
+        mismatches = 0
+        started = time.perf_counter()
+        for trainer_id in checked:
+            reasons = scheduling.trainer_conflicts(session, trainer_id, [(s, s + duration) for s in grid])
+            mismatches += sum((reason is None) != ((trainer_id, s) in found) for s, reason in zip(grid, reasons))
+        per_trainer_ms = (time.perf_counter() - started) / len(checked) * 1000
+        print(f"  trainer_conflicts per trainer: {per_trainer_ms:8.1f} ms ({len(grid)} windows) "
+              f"-> ~{per_trainer_ms * args.trainers / 1000:.1f} s for all trainers")
+        print(f"  {len(checked)} trainers x {len(grid)} windows checked, {mismatches} disagreements:",
+              "CORRECT" if mismatches == 0 else "MISMATCH")
+
+        sample = np.array(rng.sample(range(len(options)), min(200, len(options))), dtype=np.int64)
+        pairs = list(slot_finder.BookableSlots(options.trainer_id[sample], options.booking_id[sample]).rows(session))
+        wrong = sum(scheduling.trainer_conflict(session, o.trainer_id, o.start_time, o.end_time) is not None for o in pairs)
+        print(f"  {len(pairs)} bookable pairs re-checked with trainer_conflict, {wrong} rejected:", "CORRECT" if wrong == 0 else "MISMATCH")
+
+if __name__ == "__main__":
+    main()
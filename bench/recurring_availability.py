@@ -0,0 +1,104 @@
+from datetime import datetime, date, time as clock, timedelta
+from sqlalchemy import text
+import argparse
+import random
+import time
+from common import bench_engine, bench_sessionmaker, fresh_schema
+import recurrence
+import scheduling
+import slot_finder
+
+# Weekly trainer availability stored as recurrence rules (a handful of rows per trainer, expanded
+# lazily over the window asked about) vs the same schedule materialized one row per week for
+# --years years. Every availability check and slot search must give the same answer for both.
+#
+#   python recurring_availability.py --trainers 200 --years 2
+
+OPEN_HOUR, CLOSE_HOUR = 7, 21
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trainers", type=int, default=200, help="trainers with rules (each gets a materialized twin)")
+    parser.add_argument("--years", type=int, default=2)
+    parser.add_argument("--checks", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=30, help="slot search window")
+    args = parser.parse_args()
+
+    engine = bench_engine()
+    fresh_schema(engine)
+    Session = bench_sessionmaker(engine)
+    rng = random.Random(3005)
+    monday = datetime.combine(date.today() - timedelta(days=date.today().weekday()), clock())
+    horizon = monday + timedelta(days=365 * args.years)
+
+    # Weekdays every week, Saturdays every other week; a few skipped days each, some rules ending early
+    rules, materialized = [], []
+    for t in range(args.trainers):
+        for weekday in range(6):
+            start = monday + timedelta(days=weekday, hours=rng.choice([OPEN_HOUR, OPEN_HOUR + 1]))
+            end = start + timedelta(hours=rng.choice([4, 6, 8]))
+            rule = recurrence.Rule(0, start, end, recurrence.BIWEEKLY if weekday == 5 else recurrence.WEEKLY,
+                                   (horizon - timedelta(days=rng.randrange(365))).date() if rng.random() < 0.2 else None, frozenset())
+            skips = {s.date() for s, _ in rule.occurrences(monday, horizon) if rng.random() < 0.05}
+            rule = rule._replace(skip_dates=frozenset(skips))
+            rules.append((t, rule))
+            materialized.extend((t, s, e) for s, e in rule.occurrences(monday, horizon))
+
+    with engine.begin() as conn:
+        conn.execute(text("""INSERT INTO "Trainer" (name) SELECT 'Trainer ' || g FROM generate_series(1, :n) g"""), {"n": 2 * args.trainers})
+        conn.execute(text("""
+            INSERT INTO "Availability" (trainer_id, is_recurring, recurrence, start_time, end_time, repeat_until, skip_dates)
+            VALUES (:trainer_id, TRUE, :recurrence, :start_time, :end_time, :repeat_until, :skip_dates)
+        """), [{"trainer_id": t + 1, "recurrence": r.recurrence, "start_time": r.start_time, "end_time": r.end_time,
+                "repeat_until": r.repeat_until, "skip_dates": sorted(r.skip_dates)} for t, r in rules])
+        conn.execute(text("""
+            INSERT INTO "Availability" (trainer_id, is_recurring, start_time, end_time)
+            SELECT t, FALSE, s, e FROM unnest(CAST(:t AS integer[]), CAST(:s AS timestamp[]), CAST(:e AS timestamp[])) AS m(t, s, e)
+        """), {"t": [t + 1 + args.trainers for t, _, _ in materialized], "s": [s for _, s, _ in materialized], "e": [e for _, _, e in materialized]})
+        conn.execute(text('ANALYZE "Availability"'))
+    print(f"{args.trainers} trainers, {args.years} years: {len(rules)} rule rows vs {len(materialized)} materialized rows")
+
+    # Random 1-hour checks over the whole horizon, each asked of a rule trainer and its twin
+    checks = []
+    for _ in range(args.checks):
+        t = rng.randrange(args.trainers)
+        start = monday + timedelta(days=rng.randrange(365 * args.years), hours=rng.randrange(OPEN_HOUR - 1, CLOSE_HOUR))
+        checks.append((t, start, start + timedelta(hours=1)))
+
+    with Session() as session:
+        answers = {}
+        for label, offset in (("rules", 1), ("materialized", 1 + args.trainers)):
+            recurrence.expand.cache_clear()
+            started = time.perf_counter()
+            answers[label] = [scheduling.trainer_conflict(session, t + offset, start, end) for t, start, end in checks]
+            print(f"  trainer_conflict, {label:<12}: {(time.perf_counter() - started) / len(checks) * 1000:6.3f} ms per check")
+        print(f"  {sum(a is None for a in answers['rules'])} of {len(checks)} windows free; same answers:",
+              "CORRECT" if answers["rules"] == answers["materialized"] else "MISMATCH")
+
+        # Everyone's free slots for the next month: rules expand per trainer, twins are read as rows
+        start = monday + timedelta(days=7)
+        end = start + timedelta(days=args.days)
+        recurrence.expand.cache_clear()
+        found = {}
+        for label, repeat in (("cold", 1), ("warm", 5)):
+            started = time.perf_counter()
+            for _ in range(repeat):
+                slots = slot_finder.find_slots(session, start, end, timedelta(hours=1))
+            print(f"  find_slots, {args.days} days, all {2 * args.trainers} trainers, {label} expansion cache: "
+                  f"{(time.perf_counter() - started) / repeat * 1000:7.1f} ms ({len(slots.trainer_id)} slots)")
+        for trainer_id, slot_start in zip(slots.trainer_id.tolist(), slots.start_time.tolist()):
+            found.setdefault(trainer_id, []).append(slot_start)
+        same = all(found.get(t + 1) == found.get(t + 1 + args.trainers) for t in range(args.trainers))
+        print("  slots of rule trainers and their twins:", "CORRECT" if same else "MISMATCH")
+
+        # A trainer's own two-week view, asked again and again
+        now = datetime.now().replace(second=0, microsecond=0)
+        recurrence.expand.cache_clear()
+        started = time.perf_counter()
+        for t in range(args.checks):
+            recurrence.trainer_windows(session, t % args.trainers + 1, now, now + timedelta(days=14))
+        print(f"  two-week availability view: {(time.perf_counter() - started) / args.checks * 1000:.3f} ms per trainer; "
+              f"expansion cache {recurrence.expand.cache_info().hits} hits / {recurrence.expand.cache_info().misses} misses")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+from datetime import datetime
+from sqlalchemy import select, text
+from sqlalchemy.orm import joinedload
+import argparse
+import gc
+import time
+import tracemalloc
+from common import bench_engine, fresh_schema, bench_sessionmaker
+from models.schemas import RoomBooking, FitnessClass, Room, Trainer
+from pagination import keyset_pages
+import admin_functions
+
+# What a listing costs a non-terminal caller (report, batch job, API) that keeps every row:
+# identity-mapped ORM objects with their relationships eager-loaded, the keyset pages of SQLAlchemy
+# Rows the listings returned before, and the same pages as plain NamedTuple records
+# (models/records.py). Reports wall and client CPU time (best of --repeat) and the Python memory
+# the result holds once built, plus the allocation peak on the way, for --rows room bookings
+# and as many fitness classes. Wall time of the paged variants also includes each page's query,
+# which is the same for Rows and records.
+#
+#   python result_records.py --rows 100000
+
+ROOMS = 50
+TRAINERS = 20
+PAGE = 500
+
+FILL_SQL = [
+    """INSERT INTO "Admin" (name) VALUES ('Bench admin')""",
+    """INSERT INTO "Room" (room_name) SELECT 'Room ' || g FROM generate_series(1, :rooms) g""",
+    """INSERT INTO "Trainer" (name) SELECT 'Trainer ' || g FROM generate_series(1, :trainers) g""",
+    # One booking per room per hour, going back from :origin, every one of them a class
+    """INSERT INTO "RoomBooking" (admin_id, room_id, is_booked, start_time, end_time)
+       SELECT (SELECT min(admin_id) FROM "Admin"), 1 + g % :rooms, TRUE,
+              CAST(:origin AS timestamp) - make_interval(hours => 1 + g / :rooms),
+              CAST(:origin AS timestamp) - make_interval(hours => 1 + g / :rooms, mins => -55)
+       FROM generate_series(0, :rows - 1) g""",
+    """INSERT INTO "FitnessClass" (trainer_id, booking_id, class_name, capacity, num_signed_up)
+       SELECT 1 + booking_id % :trainers, booking_id, (ARRAY['Yoga', 'Spin', 'HIIT', 'Pilates', 'Boxing', 'Zumba'])[1 + booking_id % 6],
+              20, booking_id % 21
+       FROM "RoomBooking" """,
+    "ANALYZE",
+]
+
+def fill(engine, rows, origin):
+    with engine.begin() as conn:
+        for sql in FILL_SQL:
+            conn.execute(text(sql), {"rooms": ROOMS, "trainers": TRAINERS, "rows": rows, "origin": origin})
+
+def all_rows(pages):
+    rows = []
+    for page in pages:
+        rows.extend(page.rows)
+    return rows
+
+# Room bookings in listing order, as each caller would hold them
+
+def bookings_orm(session):
+    bookings = session.scalars(select(RoomBooking).options(joinedload(RoomBooking.room))
+                               .order_by(RoomBooking.start_time, RoomBooking.booking_id)).all()
+    return [(booking, booking.room.room_name) for booking in bookings]
+
+def bookings_rows(session):
+    # admin_functions.view_room_bookings' statement, pages of Rows
+    stmt = select(RoomBooking.booking_id, RoomBooking.room_id, Room.room_name, RoomBooking.is_booked,
+                  RoomBooking.start_time, RoomBooking.end_time).join(Room, Room.room_id == RoomBooking.room_id)
+    return all_rows(keyset_pages(session, stmt, [RoomBooking.start_time, RoomBooking.booking_id], PAGE))
+
+def bookings_records(session):
+    return all_rows(admin_functions.view_room_bookings(session, PAGE))
+
+# Fitness classes by name
+
+def classes_orm(session):
+    classes = session.scalars(select(FitnessClass).options(joinedload(FitnessClass.trainer),
+                                                           joinedload(FitnessClass.booking).joinedload(RoomBooking.room))
+                              .order_by(FitnessClass.class_name, FitnessClass.class_id)).all()
+    return [(fc, fc.trainer.name, fc.booking.room.room_name, fc.booking.start_time) for fc in classes]
+
+def classes_rows(session):
+    # admin_functions.view_fitness_classes' statement, pages of Rows
+    stmt = (select(FitnessClass.class_id, FitnessClass.class_name, Trainer.name.label("trainer_name"), Room.room_name,
+                   RoomBooking.start_time, RoomBooking.end_time, FitnessClass.capacity, FitnessClass.num_signed_up)
+            .join(Trainer, Trainer.trainer_id == FitnessClass.trainer_id)
+            .join(RoomBooking, RoomBooking.booking_id == FitnessClass.booking_id)
+            .join(Room, Room.room_id == RoomBooking.room_id))
+    return all_rows(keyset_pages(session, stmt, [FitnessClass.class_name, FitnessClass.class_id], PAGE))
+
+def classes_records(session):
+    return all_rows(admin_functions.view_fitness_classes(session, PAGE))
+
+def measure(Session, fn, repeat):
+    best_wall = best_cpu = float("inf")
+    for _ in range(repeat):
+        with Session() as session:
+            gc.collect()
+            wall, cpu = time.perf_counter(), time.process_time()
+            result = fn(session)
+            best_wall = min(best_wall, time.perf_counter() - wall)
+            best_cpu = min(best_cpu, time.process_time() - cpu)
+            del result
+    # Memory on its own pass: tracing slows allocation down
+    with Session() as session:
+        gc.collect()
+        tracemalloc.start()
+        result = fn(session)
+        gc.collect()
+        held, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        rows = len(result)
+        del result
+    return rows, best_wall, best_cpu, held, peak
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    engine = bench_engine()
+    fresh_schema(engine)
+    fill(engine, args.rows, datetime.now().replace(minute=0, second=0, microsecond=0))
+    Session = bench_sessionmaker(engine)
+
+    for title, cases in (("Room bookings", [("ORM objects (joinedload)", bookings_orm), ("Row pages", bookings_rows), ("record pages", bookings_records)]),
+                         ("Fitness classes", [("ORM objects (joinedload)", classes_orm), ("Row pages", classes_rows), ("record pages", classes_records)])):
+        print(f"{title}:")
+        print(f"  {'':<26} {'rows':>8} {'wall ms':>9} {'CPU ms':>9} {'held MB':>9} {'peak MB':>9} {'B/row':>7}")
+        for name, fn in cases:
+            rows, wall, cpu, held, peak = measure(Session, fn, args.repeat)
+            print(f"  {name:<26} {rows:>8} {wall * 1000:>9.0f} {cpu * 1000:>9.0f} {held / 1e6:>9.1f} {peak / 1e6:>9.1f} {held / max(rows, 1):>7.0f}")
+
+if __name__ == "__main__":
+    main()
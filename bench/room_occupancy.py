@@ -0,0 +1,104 @@
+from datetime import timedelta
+from sqlalchemy import text
+import argparse
+import time
+import numpy as np
+from common import bench_engine, fresh_schema, bench_sessionmaker
+from datagen import SCALES, generate
+import occupancy
+
+# Room occupancy heatmap (app/occupancy.py): a year of every room's bookings binned by hour of the
+# week in NumPy, cold and from the cache, against the same answer from one generate_series
+# aggregation in SQL. Then books a room from a second connection, as another process would, and
+# checks the next cached read picks it up.
+#
+#   python room_occupancy.py --scale large --days 365
+
+# One row per (booking, hour it touches), clipped to the range: the SQL-only way to bin
+REFERENCE_SQL = text("""
+    SELECT rb.room_id,
+           CAST((extract(isodow FROM h) - 1) * 24 + extract(hour FROM h) AS integer) AS week_hour,
+           sum(extract(epoch FROM least(rb.end_time, h + interval '1 hour', CAST(:end AS timestamp))
+                                - greatest(rb.start_time, h, CAST(:start AS timestamp)))) / 3600 AS hours
+    FROM "RoomBooking" rb,
+         generate_series(date_trunc('hour', greatest(rb.start_time, CAST(:start AS timestamp))),
+                         least(rb.end_time, CAST(:end AS timestamp)) - interval '1 microsecond', interval '1 hour') h
+    WHERE rb.is_booked AND rb.end_time > :start AND rb.start_time < :end
+    GROUP BY 1, 2
+""")
+
+BOOK_FREE_SLOT_SQL = text("""
+    UPDATE "RoomBooking" SET is_booked = TRUE, version = version + 1
+    WHERE booking_id = (SELECT booking_id FROM "RoomBooking" WHERE NOT is_booked AND start_time >= :start AND end_time <= :end
+                        ORDER BY start_time LIMIT 1)
+    RETURNING room_id, start_time, end_time
+""")
+
+def best_of(fn, repeat):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+def reference(session, result):
+    booked = np.zeros_like(result.booked_hours)
+    rank = {room_id: i for i, room_id in enumerate(result.room_ids.tolist())}
+    for room_id, week_hour, hours in session.execute(REFERENCE_SQL, {"start": result.start, "end": result.end}):
+        booked[rank[room_id], week_hour] = float(hours)
+    return booked
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", choices=list(SCALES), default="medium")
+    parser.add_argument("--seed", type=int, default=3005)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    engine = bench_engine()
+    fresh_schema(engine)
+    print(f"== scale {args.scale}: generating data")
+    origin = generate(engine, SCALES[args.scale], args.seed, progress=None)
+    Session = bench_sessionmaker(engine)
+    # Up to a month ahead, where datagen leaves free slots to book
+    end = origin + timedelta(days=30)
+    start = end - timedelta(days=args.days)
+
+    with Session() as session:
+        bookings = session.execute(text('SELECT count(*) FROM "RoomBooking" WHERE is_booked AND end_time > :start AND start_time < :end'),
+                                   {"start": start, "end": end}).scalar()
+
+        def cold():
+            occupancy.cache.clear()
+            return occupancy.room_occupancy(session, start, end)
+
+        cold_s, result = best_of(cold, args.repeat)
+        warm_s, warm = best_of(lambda: occupancy.room_occupancy(session, start, end), args.repeat)
+        sql_s, expected = best_of(lambda: reference(session, result), max(1, args.repeat // 2))
+        print(f"{len(result.room_ids)} rooms, {bookings:,} booked slots over {args.days} days")
+        print(f"  numpy, cold        {cold_s * 1000:9.1f} ms")
+        print(f"  numpy, cached      {warm_s * 1000:9.1f} ms  (one version check)")
+        print(f"  SQL generate_series {sql_s * 1000:8.1f} ms")
+        print("  results match" if warm is result and np.allclose(result.booked_hours, expected, atol=1e-6) else "  RESULTS DIFFER")
+        session.rollback()
+
+        # Another process books a free slot in the range
+        with engine.begin() as conn:
+            booked = conn.execute(BOOK_FREE_SLOT_SQL, {"start": start, "end": end}).first()
+        if booked is None:
+            print("no free slot in range to book; invalidation not checked")
+            return
+        room_id, slot_start, slot_end = booked
+        started = time.perf_counter()
+        after = occupancy.room_occupancy(session, start, end)
+        elapsed = time.perf_counter() - started
+        rank = result.room_ids.tolist().index(room_id)
+        added = after.booked_hours[rank].sum() - result.booked_hours[rank].sum()
+        ok = after is not result and abs(added - (slot_end - slot_start).total_seconds() / 3600) < 1e-6
+        print(f"after booking room {room_id} for {slot_end - slot_start} elsewhere: recomputed in {elapsed * 1000:.1f} ms, "
+              f"+{added:.2f} h -> {'invalidated correctly' if ok else 'STALE RESULT'}")
+
+if __name__ == "__main__":
+    main()
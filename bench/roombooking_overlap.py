@@ -0,0 +1,95 @@
+from datetime import datetime
+from sqlalchemy import text
+import argparse
+import threading
+import time
+from common import bench_engine, fresh_schema, bench_sessionmaker
+from models.schemas import Admin, Room
+
+# RoomBooking insert throughput: legacy plpgsql overlap trigger vs the
+# ex_roombooking_room_overlap exclusion constraint
+
+LEGACY_TRIGGER_SQL = """
+CREATE OR REPLACE FUNCTION prevent_roombooking_overlap() RETURNS trigger AS $$
+BEGIN
+    IF EXISTS (
+    SELECT 1 FROM "RoomBooking"
+    WHERE room_id = NEW.room_id
+        AND is_booked = TRUE
+        AND start_time < NEW.end_time
+        AND end_time > NEW.start_time
+        AND (TG_OP = 'INSERT' OR (TG_OP = 'UPDATE' AND booking_id <> NEW.booking_id))
+    ) THEN
+    RAISE EXCEPTION 'Room booking overlaps existing booking';
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_prevent_roombooking_overlap
+BEFORE INSERT OR UPDATE ON "RoomBooking"
+FOR EACH ROW EXECUTE FUNCTION prevent_roombooking_overlap();
+"""
+
+# One-hour slots; writer w owns every slot where slot % writers == w, so writers never collide
+INSERT_BATCH_SQL = text("""
+    INSERT INTO "RoomBooking" (admin_id, room_id, is_booked, start_time, end_time)
+    SELECT :admin_id, :room_id, TRUE,
+           :origin + make_interval(hours => s),
+           :origin + make_interval(hours => s + 1)
+    FROM generate_series(:first, :last, :step) s
+""")
+
+def prepare(engine, mode, rooms):
+    fresh_schema(engine)
+    with engine.begin() as conn:
+        if mode == "trigger":
+            conn.execute(text('ALTER TABLE "RoomBooking" DROP CONSTRAINT ex_roombooking_room_overlap'))
+            conn.execute(text(LEGACY_TRIGGER_SQL))
+    Session = bench_sessionmaker(engine)
+    with Session() as session:
+        admin = Admin(name="Bench admin")
+        room_rows = [Room(room_name=f"Room {i}") for i in range(rooms)]
+        session.add_all([admin, *room_rows])
+        session.commit()
+        return admin.admin_id, [room.room_id for room in room_rows]
+
+def writer(engine, admin_id, room_ids, index, writers, per_room, batch, origin):
+    with engine.connect() as conn:
+        for room_id in room_ids:
+            for first in range(index, per_room, batch * writers):
+                last = min(first + batch * writers - 1, per_room - 1)
+                conn.execute(INSERT_BATCH_SQL, {"admin_id": admin_id, "room_id": room_id, "origin": origin,
+                                                "first": first, "last": last, "step": writers})
+                conn.commit()
+
+def run(engine, mode, rooms, per_room, writers, batch):
+    admin_id, room_ids = prepare(engine, mode, rooms)
+    origin = datetime(2020, 1, 1)
+    threads = [threading.Thread(target=writer, args=(engine, admin_id, room_ids, i, writers, per_room, batch, origin))
+               for i in range(writers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    total = rooms * per_room
+    print(f"{mode:>10}: {total} rows, {writers} writers, {elapsed:.2f} s, {total / elapsed:,.0f} rows/s")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rooms", type=int, default=10)
+    parser.add_argument("--per-room", type=int, default=12000)
+    parser.add_argument("--writers", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--batch", type=int, default=500)
+    args = parser.parse_args()
+
+    engine = bench_engine()
+    for writers in args.writers:
+        engine.dispose()
+        for mode in ("trigger", "exclusion"):
+            run(engine, mode, args.rooms, args.per_room, writers, args.batch)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+from datetime import timedelta
+from pathlib import Path
+from sqlalchemy import select
+import argparse
+import json
+import statistics
+import subprocess
+import time
+from common import BASE_DIR, bench_engine, fresh_schema, bench_sessionmaker, StatementCounter
+from datagen import SCALES, generate, member_name, trainer_name, admin_name, room_name
+from models.schemas import Member, Trainer, Admin, RoomBooking, FitnessClass, TrainingSession, Availability
+import member_functions
+import trainer_functions
+import admin_functions
+
+# Times every public member/trainer/admin function at several data scales and
+# records latency percentiles plus SQL statement counts per call.
+#
+#   python run_benchmarks.py --scales tiny small medium
+#   python run_benchmarks.py --compare results/abc123.json results/def456.json
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+class Context:
+    # Sample entities picked deterministically from the generated data (ids only,
+    # each timed call loads its own copies into a fresh session)
+    def __init__(self, session, origin):
+        self.origin = origin
+        self.member_id = session.scalar(select(Member.member_id).order_by(Member.member_id).limit(1))
+        self.trainer_id = session.scalar(select(Trainer.trainer_id).order_by(Trainer.trainer_id).limit(1))
+        self.admin_id = session.scalar(select(Admin.admin_id).order_by(Admin.admin_id).limit(1))
+        self.pt_session_id = session.scalar(
+            select(TrainingSession.session_id).where(TrainingSession.member_id == self.member_id).limit(1))
+        self.free_booking_ids = iter(session.scalars(
+            select(RoomBooking.booking_id).where(RoomBooking.is_booked == False, RoomBooking.start_time >= origin)
+            .order_by(RoomBooking.start_time, RoomBooking.room_id)).all())
+        self.open_class_ids = iter(session.scalars(
+            select(FitnessClass.class_id).join(RoomBooking).where(RoomBooking.start_time >= origin, FitnessClass.num_signed_up < FitnessClass.capacity)
+            .order_by(RoomBooking.start_time)).all())
+        self.new_slot = 0
+        # Let add_fitness_class reach the insert for the far-future slots below
+        far_future = origin + timedelta(days=3650)
+        session.add(Availability(trainer_id=self.trainer_id, is_recurring=False, start_time=far_future, end_time=far_future + timedelta(days=365)))
+        session.commit()
+
+    def load(self, session):
+        # What a logged-in terminal user already holds before choosing an action
+        self.member = session.get(Member, self.member_id)
+        self.trainer = session.get(Trainer, self.trainer_id)
+        self.admin = session.get(Admin, self.admin_id)
+        self.pt_session = session.get(TrainingSession, self.pt_session_id) if self.pt_session_id else None
+
+    def next_new_slot(self):
+        # Far-future room slots nobody else uses
+        self.new_slot += 1
+        start = self.origin + timedelta(days=3650, hours=self.new_slot)
+        end = start + timedelta(minutes=50)
+        return start.strftime("%Y-%m-%d"), start.strftime("%H:%M"), end.strftime("%Y-%m-%d"), end.strftime("%H:%M")
+
+def book_pt(session, ctx):
+    booking = session.get(RoomBooking, next(ctx.free_booking_ids))
+    member_functions.book_pt_session(session, ctx.member, ctx.trainer, booking)
+
+def reschedule_pt(session, ctx):
+    if ctx.pt_session:
+        booking = session.get(RoomBooking, next(ctx.free_booking_ids))
+        member_functions.reschedule_pt_session(session, ctx.member, ctx.pt_session, booking, ctx.trainer)
+
+def register_class(session, ctx):
+    fitness_class = session.get(FitnessClass, next(ctx.open_class_ids))
+    member_functions.class_registration(session, ctx.member, fitness_class)
+
+def book_room(session, ctx):
+    admin_functions.room_booking(session, ctx.admin, room_name(0), *ctx.next_new_slot())
+
+def add_class(session, ctx):
+    admin_functions.add_fitness_class(session, ctx.admin, ctx.trainer, "Bench class", 20, room_name(0), *ctx.next_new_slot())
+
+def first_page(pages):
+    # Listings are paged generators; the terminal shows the first page straight away
+    return next(iter(pages), None)
+
+CASES = {
+    # Members
+    "member.login_member": lambda s, ctx: member_functions.login_member(s, member_name(0)),
+    "member.view_members": lambda s, ctx: first_page(member_functions.view_members(s)),
+    "member.dashboard": lambda s, ctx: member_functions.dashboard(s, ctx.member),
+    "member.view_health_metrics": lambda s, ctx: first_page(member_functions.view_health_metrics(s, ctx.member, start=ctx.origin - timedelta(days=90))),
+    "member.health_trend": lambda s, ctx: member_functions.health_trend(s, ctx.member_id, "week", ctx.origin - timedelta(days=365 * 3)),
+    "member.view_fitness_goals": lambda s, ctx: member_functions.view_fitness_goals(s, ctx.member),
+    "member.view_pt_sessions": lambda s, ctx: member_functions.view_pt_sessions(s, ctx.member),
+    "member.view_room_bookings": lambda s, ctx: first_page(member_functions.view_room_bookings(s)),
+    "member.view_available_classes": lambda s, ctx: member_functions.view_available_classes(s),
+    "member.book_pt_session": book_pt,
+    "member.reschedule_pt_session": reschedule_pt,
+    "member.class_registration": register_class,
+    # Trainers
+    "trainer.login_trainer": lambda s, ctx: trainer_functions.login_trainer(s, trainer_name(0)),
+    "trainer.view_trainers": lambda s, ctx: first_page(trainer_functions.view_trainers(s)),
+    "trainer.view_availability": lambda s, ctx: trainer_functions.view_availability(s, ctx.trainer),
+    "trainer.schedule_view": lambda s, ctx: trainer_functions.schedule_view(s, ctx.trainer),
+    "trainer.member_lookup": lambda s, ctx: trainer_functions.member_lookup(s, member_name(0)),
+    # Admins
+    "admin.login_admin": lambda s, ctx: admin_functions.login_admin(s, admin_name(0)),
+    "admin.view_admins": lambda s, ctx: first_page(admin_functions.view_admins(s)),
+    "admin.view_rooms": lambda s, ctx: first_page(admin_functions.view_rooms(s)),
+    "admin.view_room_bookings": lambda s, ctx: first_page(admin_functions.view_room_bookings(s)),
+    "admin.view_fitness_classes": lambda s, ctx: first_page(admin_functions.view_fitness_classes(s)),
+    "admin.view_equipment_maintenance": lambda s, ctx: first_page(admin_functions.view_equipment_maintenance(s, ctx.admin)),
+    "admin.view_billings": lambda s, ctx: first_page(admin_functions.view_billings(s)),
+    "admin.room_booking": book_room,
+    "admin.add_fitness_class": add_class,
+}
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def time_case(engine, Session, ctx, fn, iterations, budget_s):
+    timings = []
+    statements = []
+    spent = 0.0
+    while len(timings) < iterations and (spent < budget_s or not timings):
+        # Fresh session per call so identity-map hits don't hide the real cost
+        with Session() as session:
+            ctx.load(session)
+            with StatementCounter(engine) as counter:
+                started = time.perf_counter()
+                try:
+                    fn(session, ctx)
+                except StopIteration:
+                    break
+                elapsed = time.perf_counter() - started
+            timings.append(elapsed * 1000)
+            statements.append(counter.count)
+            spent += elapsed
+    if not timings:
+        return None
+    return {
+        "runs": len(timings),
+        "p50_ms": round(percentile(timings, 50), 3),
+        "p95_ms": round(percentile(timings, 95), 3),
+        "p99_ms": round(percentile(timings, 99), 3),
+        "mean_ms": round(statistics.fmean(timings), 3),
+        "statements": max(statements),
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True, text=True).stdout.strip() or "unknown"
+    except OSError:
+        return "unknown"
+
+def run_scale(scale_name, iterations, budget_s, only, seed):
+    engine = bench_engine()
+    fresh_schema(engine)
+    print(f"== scale {scale_name}: generating data")
+    origin = generate(engine, SCALES[scale_name], seed)
+    Session = bench_sessionmaker(engine)
+
+    with Session() as session:
+        ctx = Context(session, origin)
+
+    results = {}
+    for name, fn in CASES.items():
+        if only and not any(part in name for part in only):
+            continue
+        result = time_case(engine, Session, ctx, fn, iterations, budget_s)
+        if result is None:
+            continue
+        results[name] = result
+        print(f"  {name:<32} p50={result['p50_ms']:>9.2f} ms  p95={result['p95_ms']:>9.2f} ms  "
+              f"p99={result['p99_ms']:>9.2f} ms  statements={result['statements']:>6}  runs={result['runs']}")
+    return {"scale": scale_name, "config": SCALES[scale_name]._asdict(), "seed": seed, "results": results}
+
+def compare(old_path, new_path):
+    old = json.loads(Path(old_path).read_text())
+    new = json.loads(Path(new_path).read_text())
+    print(f"{old['commit']} -> {new['commit']}")
+    for old_scale, new_scale in zip(old["scales"], new["scales"]):
+        print(f"== scale {new_scale['scale']}")
+        for name, after in new_scale["results"].items():
+            before = old_scale["results"].get(name)
+            if not before:
+                print(f"  {name:<32} (new)")
+                continue
+            change = (after["p50_ms"] - before["p50_ms"]) / before["p50_ms"] * 100 if before["p50_ms"] else 0.0
+            print(f"  {name:<32} p50 {before['p50_ms']:>9.2f} -> {after['p50_ms']:>9.2f} ms ({change:+6.1f}%)  "
+                  f"statements {before['statements']:>6} -> {after['statements']:>6}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scales", nargs="+", choices=list(SCALES), default=["tiny", "small"])
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--budget", type=float, default=5.0, help="max seconds spent per function per scale")
+    parser.add_argument("--only", nargs="*", help="run functions whose name contains any of these")
+    parser.add_argument("--seed", type=int, default=3005)
+    parser.add_argument("--output", help="JSON file to write (default: results/<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    commit = git_commit()
+    report = {"commit": commit, "scales": [run_scale(name, args.iterations, args.budget, args.only, args.seed) for name in args.scales]}
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{commit}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"Saved {output}")
+
+if __name__ == "__main__":
+    main()
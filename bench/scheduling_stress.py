@@ -0,0 +1,207 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+import argparse
+import collections
+import inspect
+import random
+import threading
+import time
+from common import BENCH_DATABASE_URL, fresh_schema
+from models.schemas import Admin, FitnessClass, Member, RoomBooking, Trainer, TrainingSession
+import admin_functions
+import database
+import member_functions
+
+# Front desks racing each other over a small schedule: PT bookings and reschedules, new classes
+# and class signups from many threads at once, all for a handful of trainers, rooms and hours.
+# Afterwards checks in SQL that no trainer is in two places at once, no room booking is used
+# twice, is_booked matches what is attached to each booking and no class is oversold. Reports
+# throughput, outcomes and how often each operation had to retry (app/database.py).
+#
+#   python scheduling_stress.py --workers 16 --seconds 20
+#   python scheduling_stress.py --no-retry    (the same checks, but a lost race is an error instead of a retry)
+
+ADMIN_ID = 1
+CLASS_CAPACITY = 5
+SLOT = timedelta(minutes=50)
+
+# (operation, the function it calls, weight)
+MIX = (("book", "book_pt_session", 40), ("reschedule", "reschedule_pt_session", 25),
+       ("add_class", "add_fitness_class", 15), ("register", "class_registration", 20))
+
+FILL_SQL = [
+    """INSERT INTO "Admin" (name) VALUES ('Bench admin')""",
+    """INSERT INTO "Member" (name, contact_detail)
+       SELECT 'Member ' || g, 'member' || g || '@example.com' FROM generate_series(1, :members) g""",
+    """INSERT INTO "Trainer" (name) SELECT 'Trainer ' || g FROM generate_series(1, :trainers) g""",
+    """INSERT INTO "Availability" (trainer_id, is_recurring, start_time, end_time)
+       SELECT trainer_id, FALSE, :origin, CAST(:origin AS timestamp) + make_interval(hours => :hours) FROM "Trainer" """,
+    # PT rooms hold free hourly slots to book; class rooms stay empty for add_fitness_class
+    """INSERT INTO "Room" (room_name) SELECT 'PT room ' || g FROM generate_series(1, :pt_rooms) g""",
+    """INSERT INTO "Room" (room_name) SELECT 'Class room ' || g FROM generate_series(1, :class_rooms) g""",
+    """INSERT INTO "RoomBooking" (admin_id, room_id, is_booked, start_time, end_time)
+       SELECT 1, r.room_id, FALSE, CAST(:origin AS timestamp) + make_interval(hours => h),
+              CAST(:origin AS timestamp) + make_interval(hours => h, mins => 50)
+       FROM "Room" r, generate_series(0, :hours - 1) h
+       WHERE r.room_name LIKE 'PT room %'""",
+    "ANALYZE",
+]
+
+# Each query counts violations; all must be 0
+INVARIANTS = {
+    "trainer double-booked": """
+        WITH events AS (
+            SELECT ts.trainer_id, 's' || ts.session_id AS event, rb.start_time, rb.end_time
+            FROM "TrainingSession" ts JOIN "RoomBooking" rb ON rb.booking_id = ts.booking_id
+            UNION ALL
+            SELECT fc.trainer_id, 'c' || fc.class_id, rb.start_time, rb.end_time
+            FROM "FitnessClass" fc JOIN "RoomBooking" rb ON rb.booking_id = fc.booking_id
+        )
+        SELECT count(*) FROM events a JOIN events b
+          ON a.trainer_id = b.trainer_id AND a.event < b.event AND a.start_time < b.end_time AND b.start_time < a.end_time
+    """,
+    "booking used twice": """
+        SELECT count(*) FROM (
+            SELECT booking_id FROM (
+                SELECT booking_id FROM "TrainingSession" UNION ALL SELECT booking_id FROM "FitnessClass"
+            ) used GROUP BY booking_id HAVING count(*) > 1
+        ) twice
+    """,
+    "is_booked wrong": """
+        SELECT count(*) FROM "RoomBooking" rb
+        WHERE rb.is_booked <> (EXISTS (SELECT 1 FROM "TrainingSession" ts WHERE ts.booking_id = rb.booking_id)
+                               OR EXISTS (SELECT 1 FROM "FitnessClass" fc WHERE fc.booking_id = rb.booking_id))
+    """,
+    "class oversold or miscounted": """
+        SELECT count(*) FROM "FitnessClass" fc
+        WHERE fc.num_signed_up > fc.capacity
+           OR fc.num_signed_up <> (SELECT count(*) FROM "GroupMember" gm WHERE gm.class_id = fc.class_id)
+    """,
+}
+
+def fill(engine, args, origin):
+    with engine.begin() as conn:
+        for sql in FILL_SQL:
+            conn.execute(text(sql), {"members": args.members, "trainers": args.trainers, "pt_rooms": args.pt_rooms,
+                                     "class_rooms": args.class_rooms, "hours": args.hours, "origin": origin})
+        return conn.execute(text('SELECT booking_id FROM "RoomBooking" ORDER BY booking_id')).scalars().all()
+
+def scalar_ids(session, sql):
+    return session.execute(text(sql)).scalars().all()
+
+class Workload:
+    def __init__(self, args, origin, booking_ids, retry):
+        self.args = args
+        self.origin = origin
+        self.booking_ids = booking_ids
+        unwrap = (lambda fn: fn) if retry else inspect.unwrap  # past the tracing and retry wrappers
+        self.book_pt_session = unwrap(member_functions.book_pt_session)
+        self.reschedule_pt_session = unwrap(member_functions.reschedule_pt_session)
+        self.add_fitness_class = unwrap(admin_functions.add_fitness_class)
+        self.class_registration = unwrap(member_functions.class_registration)
+
+    def book(self, session, rng):
+        return self.book_pt_session(session, session.get(Member, rng.randint(1, self.args.members)),
+                                    session.get(Trainer, rng.randint(1, self.args.trainers)),
+                                    session.get(RoomBooking, rng.choice(self.booking_ids)))
+
+    def reschedule(self, session, rng):
+        session_ids = scalar_ids(session, 'SELECT session_id FROM "TrainingSession"')
+        if not session_ids:
+            return None
+        training_session = session.get(TrainingSession, rng.choice(session_ids))
+        trainer = session.get(Trainer, rng.randint(1, self.args.trainers)) if rng.random() < 0.5 else None
+        return self.reschedule_pt_session(session, training_session.member, training_session,
+                                          session.get(RoomBooking, rng.choice(self.booking_ids)), trainer)
+
+    def add_class(self, session, rng):
+        start = self.origin + timedelta(hours=rng.randrange(self.args.hours))
+        end = start + SLOT
+        return self.add_fitness_class(session, session.get(Admin, ADMIN_ID), session.get(Trainer, rng.randint(1, self.args.trainers)),
+                                      "Stress class", CLASS_CAPACITY, f"Class room {rng.randint(1, self.args.class_rooms)}",
+                                      start.strftime("%Y-%m-%d"), start.strftime("%H:%M"), end.strftime("%Y-%m-%d"), end.strftime("%H:%M"))
+
+    def register(self, session, rng):
+        class_ids = scalar_ids(session, 'SELECT class_id FROM "FitnessClass"')
+        if not class_ids:
+            return None
+        return self.class_registration(session, session.get(Member, rng.randint(1, self.args.members)),
+                                       session.get(FitnessClass, rng.choice(class_ids)))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--members", type=int, default=200)
+    parser.add_argument("--trainers", type=int, default=3)
+    parser.add_argument("--pt-rooms", type=int, default=3)
+    parser.add_argument("--class-rooms", type=int, default=2)
+    parser.add_argument("--hours", type=int, default=24, help="hourly slots every room offers")
+    parser.add_argument("--seed", type=int, default=3005)
+    parser.add_argument("--no-retry", action="store_true")
+    args = parser.parse_args()
+
+    settings = database.load_settings()._replace(url=BENCH_DATABASE_URL, pool_size=args.workers, max_overflow=0, statement_timeout_ms=0)
+    engine = database.make_engine(settings)
+    fresh_schema(engine)
+    origin = (datetime.now() + timedelta(days=1)).replace(minute=0, second=0, microsecond=0)
+    booking_ids = fill(engine, args, origin)
+    Session = sessionmaker(bind=engine)
+    workload = Workload(args, origin, booking_ids, retry=not args.no_retry)
+    operations = [name for name, _, _ in MIX]
+    weights = [weight for _, _, weight in MIX]
+    database.retry_stats.reset()
+
+    outcomes = collections.Counter()
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.seconds
+
+    def worker(index):
+        rng = random.Random(args.seed * 1000 + index)
+        counts = collections.Counter()
+        while time.perf_counter() < deadline:
+            operation = rng.choices(operations, weights)[0]
+            with Session() as session:
+                try:
+                    result = getattr(workload, operation)(session, rng)
+                    counts[operation, "done" if result else "rejected"] += 1
+                except Exception as e:
+                    session.rollback()
+                    counts[operation, f"error: {type(e).__name__}"] += 1
+        with lock:
+            outcomes.update(counts)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.workers) as executor:
+        list(executor.map(worker, range(args.workers)))
+    elapsed = time.perf_counter() - started
+
+    total = sum(outcomes.values())
+    print(f"{'no retries' if args.no_retry else 'retry on conflict'}: {args.workers} workers, {args.trainers} trainers, "
+          f"{args.pt_rooms} PT + {args.class_rooms} class rooms, {args.hours} hours")
+    print(f"  {total:,} operations in {elapsed:.1f} s ({total / elapsed:,.0f} ops/s)")
+    retries = {row.operation.rsplit(".", 1)[1]: row for row in database.retry_snapshot()}
+    for operation, function, _ in MIX:
+        counts = {outcome: n for (name, outcome), n in sorted(outcomes.items()) if name == operation}
+        calls = sum(counts.values())
+        line = f"  {operation:<11} {calls:>7,}  " + ", ".join(f"{outcome}={n:,}" for outcome, n in counts.items())
+        row = retries.get(function)
+        if row:
+            line += f"  | retries={row.retries:,} ({row.retry_rate:.1%} per call), gave up={row.gave_up}"
+        print(line)
+
+    violations = 0
+    with engine.connect() as conn:
+        for name, sql in INVARIANTS.items():
+            found = conn.execute(text(sql)).scalar()
+            violations += found
+            print(f"  {name:<30} {found}")
+        booked = conn.execute(text('SELECT count(*) FROM "TrainingSession"')).scalar()
+        classes = conn.execute(text('SELECT count(*), coalesce(sum(num_signed_up), 0) FROM "FitnessClass"')).one()
+    print(f"  {booked} PT sessions, {classes[0]} classes with {classes[1]} signups")
+    print("  NO INVARIANT VIOLATIONS" if not violations else f"  {violations} INVARIANT VIOLATIONS")
+
+if __name__ == "__main__":
+    main()
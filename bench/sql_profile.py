@@ -0,0 +1,82 @@
+from datetime import datetime
+import argparse
+import time
+from common import bench_engine, bench_sessionmaker, fresh_schema
+from datagen import SCALES, generate
+from models.schemas import Member, Trainer
+import instrumentation
+import member_functions
+import trainer_functions
+import admin_functions
+import billing
+
+# Per-operation SQL instrumentation (app/instrumentation.py): what a traced call costs with
+# profiling off and on, then the per-operation report for a handful of UI actions; fan-out such as
+# a lazy load per listed row shows up as an N+1 suspect.
+#
+#   python sql_profile.py --scale small
+
+def per_call_us(fn, repeat, rounds=5):
+    # Best of `rounds`, so scheduler noise does not swamp a few microseconds
+    fn()
+    best = float("inf")
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        best = min(best, time.perf_counter() - started)
+    return best / repeat * 1e6
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", choices=list(SCALES), default="small")
+    parser.add_argument("--repeat", type=int, default=2000)
+    parser.add_argument("--json", default=None, help="also dump the profile here")
+    args = parser.parse_args()
+
+    engine = bench_engine()
+    fresh_schema(engine)
+    generate(engine, SCALES[args.scale]._replace(metrics_per_member_year=4), progress=None)
+    Session = bench_sessionmaker(engine)
+
+    # The wrapper alone, on a function that never reaches the database
+    noop = instrumentation.traced(lambda: None, "noop")
+    bare_noop = per_call_us(lambda: None, args.repeat * 50)
+    wrapped_noop = per_call_us(noop, args.repeat * 50)
+    print(f"traced wrapper with profiling off: {wrapped_noop - bare_noop:.2f} us per call")
+
+    with Session() as session:
+        member = session.get(Member, 1)
+        trainer = session.get(Trainer, 1)
+        raw = billing.member_balance.__wrapped__
+        per_call_us(lambda: raw(session, 1), args.repeat)  # warm the connection and the server's caches
+        bare_us = per_call_us(lambda: raw(session, 1), args.repeat)
+        off_us = per_call_us(lambda: billing.member_balance(session, 1), args.repeat)
+        instrumentation.enable(engine)
+        on_us = per_call_us(lambda: billing.member_balance(session, 1), args.repeat)
+        print(f"member_balance (one query): untraced {bare_us:.1f} us, traced with profiling off {off_us:.1f} us "
+              f"({(off_us - bare_us) / bare_us * 100:+.1f}%), on {on_us:.1f} us ({(on_us - bare_us) / bare_us * 100:+.1f}%)")
+        instrumentation.reset()
+
+        # A short session at the front desk
+        member_functions.dashboard(session, member)
+        for _ in member_functions.view_room_bookings(session, start=datetime.now(), is_booked=False):
+            pass  # every page
+        for _ in admin_functions.view_fitness_classes(session):
+            pass
+        trainer_functions.schedule_view(session, trainer)
+        trainer_functions.member_lookup(session, member.name)
+        member_functions.view_pt_sessions(session, member)
+        instrumentation.disable()
+
+    print(f"\n{'operation':<48} {'calls':>5} {'statements':>10} {'DB ms':>8}  N+1")
+    for row in instrumentation.summary():
+        print(f"{row.name:<48} {row.calls:>5} {row.statements:>10} {row.db_ms:>8.1f}  {'SUSPECT' if row.n_plus_one_calls else ''}")
+    for report in instrumentation.recent(suspects_only=True):
+        worst = report.repeated[0]
+        print(f"  {report.name}: {worst.count}x ({worst.distinct_params} distinct parameter sets) {' '.join(worst.sql.split())[:110]}")
+    if args.json:
+        print("profile written to", instrumentation.dump_json(args.json))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+from sqlalchemy import text
+import statistics
+import sys
+import time
+from common import bench_engine, fresh_schema
+import database
+import migrations
+from main import STARTUP_BUDGET_MS
+
+# Cold (empty database) vs warm (schema current) startup through migrations.migrate and .maintain,
+# each with a fresh engine the way a newly started kiosk process gets one.
+# Exits non-zero if the warm-start p95 is over main.STARTUP_BUDGET_MS.
+
+def timed_start():
+    started = time.perf_counter()
+    engine = bench_engine()
+    migrations.migrate(engine, progress=None)
+    migrations.maintain(engine)
+    elapsed = (time.perf_counter() - started) * 1000
+    engine.dispose()
+    return elapsed
+
+def main():
+    engine = bench_engine()
+    with engine.begin() as conn:
+        conn.execute(text("DROP SCHEMA public CASCADE;"))
+        conn.execute(text("CREATE SCHEMA public;"))
+    engine.dispose()
+
+    cold = timed_start()
+    warm = sorted(timed_start() for _ in range(30))
+    p95 = warm[int(len(warm) * 0.95) - 1]
+    print(f"cold start: {cold:8.1f} ms")
+    print(f"warm start: p50 {statistics.median(warm):6.1f} ms  p95 {p95:6.1f} ms  (budget {STARTUP_BUDGET_MS} ms)")
+    if p95 > STARTUP_BUDGET_MS:
+        print("Warm start is over budget")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
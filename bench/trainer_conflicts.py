@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta
+from sqlalchemy import text
+import statistics
+import time
+from common import bench_engine, fresh_schema, bench_sessionmaker
+from models.schemas import Admin, Room, Trainer, Availability
+import scheduling
+
+# Latency of scheduling.trainer_conflict as one trainer's past sessions grow
+
+GROW_SESSIONS_SQL = text("""
+    WITH slots AS (
+        INSERT INTO "RoomBooking" (admin_id, room_id, is_booked, start_time, end_time)
+        SELECT :admin_id, :room_id, TRUE,
+               :origin - make_interval(hours => g + :offset),
+               :origin - make_interval(hours => g + :offset) + interval '1 hour'
+        FROM generate_series(1, :count) g
+        RETURNING booking_id
+    )
+    INSERT INTO "TrainingSession" (trainer_id, booking_id, member_id)
+    SELECT :trainer_id, booking_id, :member_id FROM slots
+""")
+
+def main():
+    engine = bench_engine()
+    fresh_schema(engine)
+    Session = bench_sessionmaker(engine)
+    origin = datetime.now().replace(minute=0, second=0, microsecond=0)
+
+    with Session() as session:
+        admin = Admin(name="Bench admin")
+        room = Room(room_name="Bench room")
+        trainer = Trainer(name="Bench trainer")
+        session.add_all([admin, room, trainer])
+        session.flush()
+        session.execute(text("""INSERT INTO "Member" (name, contact_detail) VALUES ('Bench', 'bench@example.com')"""))
+        session.add(Availability(trainer=trainer, is_recurring=False, start_time=origin, end_time=origin + timedelta(days=30)))
+        session.commit()
+
+        window = (origin + timedelta(days=1), origin + timedelta(days=1, hours=1))
+        candidates = [(origin + timedelta(hours=h), origin + timedelta(hours=h + 1)) for h in range(24 * 7)]
+        total = 0
+        for count in (0, 1000, 10000, 100000):
+            if count > total:
+                session.execute(GROW_SESSIONS_SQL, {"admin_id": admin.admin_id, "room_id": room.room_id, "trainer_id": trainer.trainer_id,
+                                                    "member_id": 1, "origin": origin, "offset": total, "count": count - total})
+                session.commit()
+                session.execute(text('ANALYZE "RoomBooking"; ANALYZE "TrainingSession"'))
+                total = count
+
+            timings = []
+            for _ in range(200):
+                started = time.perf_counter()
+                scheduling.trainer_conflict(session, trainer.trainer_id, *window)
+                timings.append((time.perf_counter() - started) * 1000)
+            started = time.perf_counter()
+            scheduling.trainer_conflicts(session, trainer.trainer_id, candidates)
+            batch_ms = (time.perf_counter() - started) * 1000
+            print(f"past sessions={total:>6}  single p50={statistics.median(timings):.3f} ms  "
+                  f"batch of {len(candidates)}={batch_ms:.2f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+# gunicorn settings for the HTTP API (app/api.py):  gunicorn -c gunicorn.conf.py wsgi:app
+# Every worker process gets its own engine and pool, so the database sees at most
+# workers x (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections; keep that below max_connections.
+import multiprocessing
+import os
+
+pythonpath = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app")
+bind = os.environ.get("API_BIND", "127.0.0.1:8000")
+workers = int(os.environ.get("API_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+# More than one thread per worker switches gunicorn to its threaded worker
+threads = int(os.environ.get("API_THREADS", "1"))
+timeout = int(os.environ.get("API_TIMEOUT", "30"))
+accesslog = os.environ.get("API_ACCESS_LOG") or None
+
+# A worker serves `threads` requests at a time and each holds one connection
+os.environ.setdefault("DB_POOL_SIZE", str(threads))
+os.environ.setdefault("DB_MAX_OVERFLOW", "1")
+
+def on_starting(server):
+    # Bring the schema up to date once, before any worker starts
+    import database
+    import migrations
+    engine = database.make_engine()
+    migrations.migrate(engine, progress=server.log.info)
+    migrations.maintain(engine)
+    engine.dispose()
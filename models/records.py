@@ -0,0 +1,198 @@
+from typing import NamedTuple, Optional
+from datetime import date, datetime
+
+# Plain result records (no ORM identity map), rendered by terminal_UI. Built straight from
+# column-only selects: one tuple per row, nothing tracked by the Session, nothing lazy-loaded later.
+
+# Listing rows (pagination.keyset_pages(record=...)); field names match the selected columns
+
+class MemberRecord(NamedTuple):
+    member_id: int
+    name: str
+    date_of_birth: date
+    gender: str
+    contact_detail: str
+
+class TrainerRecord(NamedTuple):
+    trainer_id: int
+    name: str
+
+class AdminRecord(NamedTuple):
+    admin_id: int
+    name: str
+
+class RoomRecord(NamedTuple):
+    room_id: int
+    room_name: str
+
+class RoomBookingRecord(NamedTuple):
+    booking_id: int
+    room_id: int
+    room_name: str
+    is_booked: bool
+    start_time: datetime
+    end_time: datetime
+
+class HealthMetricRecord(NamedTuple):
+    metric_id: int
+    date_recorded: datetime
+    weight: Optional[float]
+    height: Optional[float]
+    heart_rate: Optional[int]
+
+class AvailableClassRecord(NamedTuple):
+    class_id: int
+    class_name: str
+    trainer_name: str
+    room_name: str
+    start_time: datetime
+    end_time: datetime
+    capacity: int
+    seats_left: int
+
+class FitnessClassRecord(NamedTuple):
+    class_id: int
+    class_name: str
+    trainer_name: str
+    room_name: str
+    start_time: datetime
+    end_time: datetime
+    capacity: int
+    num_signed_up: int
+
+class EquipmentRecord(NamedTuple):
+    equipment_id: int
+    admin_id: int
+    admin_operation: str
+    status: str
+
+class BillingRecord(NamedTuple):
+    billing_id: int
+    member_id: int
+    type_of_billing: str
+    amount_due: float
+    status: str
+    payment_method: Optional[str]
+
+# Composite results
+
+class MetricRecord(NamedTuple):
+    date_recorded: datetime
+    weight: Optional[float]
+    height: Optional[float]
+    heart_rate: Optional[int]
+
+class GoalRecord(NamedTuple):
+    description: str
+    target: str
+
+class SessionRecord(NamedTuple):
+    session_id: int
+    trainer_name: str
+    start_time: datetime
+    end_time: datetime
+
+class ClassRecord(NamedTuple):
+    class_id: int
+    class_name: str
+    trainer_name: str
+    start_time: datetime
+    end_time: datetime
+
+class TrendRecord(NamedTuple):
+    period_start: date  # day, or Monday of the week
+    samples: int
+    avg_weight: Optional[float]
+    min_heart_rate: Optional[int]
+    max_heart_rate: Optional[int]
+    avg_heart_rate: Optional[float]
+
+class TrainerSessionRecord(NamedTuple):
+    session_id: int
+    member_name: str
+    start_time: datetime
+    end_time: datetime
+
+class ScheduleRecord(NamedTuple):
+    sessions: list[TrainerSessionRecord]
+    classes: list[ClassRecord]
+
+class AvailabilityRecord(NamedTuple):
+    availability_id: int
+    start_time: datetime
+    end_time: datetime
+    is_recurring: bool
+    recurrence: Optional[str]
+    repeat_until: Optional[date]
+    skip_dates: Optional[list[date]]
+
+class TrainerAvailabilityRecord(NamedTuple):
+    rules: list[AvailabilityRecord]  # stored rows, first occurrence of recurring ones
+    windows: list[tuple[datetime, datetime]]  # what they add up to over the coming days
+
+class MemberLookupRecord(NamedTuple):
+    member_id: int
+    name: str
+    goals: list[GoalRecord]
+    latest_metric: Optional[MetricRecord]
+    weekly_trend: list[TrendRecord]
+
+class DashboardRecord(NamedTuple):
+    latest_metrics: list[MetricRecord]
+    weekly_trend: list[TrendRecord]
+    active_goals: list[GoalRecord]
+    past_class_count: int
+    upcoming_sessions: list[SessionRecord]
+    upcoming_classes: list[ClassRecord]
+
+class BalanceRecord(NamedTuple):
+    member_id: int
+    outstanding: float
+    open_invoices: int
+    last_payment_at: Optional[datetime]
+    last_payment_amount: Optional[float]
+
+class RevenueRecord(NamedTuple):
+    period_start: date  # day, or first of the month
+    type_of_billing: str
+    invoiced_count: int
+    invoiced_amount: float
+    paid_count: int
+    paid_amount: float
+
+class RoomUtilizationRecord(NamedTuple):
+    room_id: int
+    room_name: str
+    booked_hours: float
+    utilization: float  # percent of the range's hours the room was booked
+    peak_day: int  # 0 = Monday
+    peak_hour: int
+    peak_utilization: float
+
+class PeakHourRecord(NamedTuple):
+    day: int  # 0 = Monday
+    hour: int
+    utilization: float  # percent, across the rooms asked for
+    busiest_room: str
+    busiest_utilization: float
+
+# Outcome of a write, registration or login: terminal_UI prints the message, app/api.py maps the
+# status to an HTTP code. value is what was written or found (an ORM object, so read it before the
+# session closes). Truthy only for OK, so `if outcome:` reads as "it went through".
+
+class Outcome(NamedTuple):
+    status: str
+    message: str
+    value: object = None
+
+    OK = "ok"
+    NOT_FOUND = "not found"
+    INVALID = "invalid"
+    CONFLICT = "conflict"
+
+    def __bool__(self):
+        return self.status == Outcome.OK
+
+class Page(NamedTuple):
+    rows: list
+    after: Optional[tuple]  # keyset of the last row; pass back as after= to resume
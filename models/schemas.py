@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Date, DateTime, Boolean, ForeignKey, Numeric, PrimaryKeyConstraint, Index
+from sqlalchemy import Column, Integer, BigInteger, String, Date, DateTime, Boolean, ForeignKey, Numeric, PrimaryKeyConstraint, CheckConstraint, Index, func, column
+from sqlalchemy.dialects.postgresql import ExcludeConstraint, ARRAY
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from typing import Optional
@@ -25,6 +26,12 @@ class Member(Base):
     group_classes: Mapped[list["GroupMember"]] = relationship("GroupMember", back_populates="member", cascade="all, delete-orphan" )
     training_sessions: Mapped[list["TrainingSession"]] = relationship("TrainingSession", back_populates="member", cascade="all, delete-orphan")
 
+    # Indexes (case-insensitive login / lookup, see app/identity.py)
+    __table_args__ = (
+        Index("ix_member_name_lower", func.lower(column("name"))),
+        Index("ix_member_contact_lower", func.lower(column("contact_detail"))),
+    )
+
     def __repr__(self) -> str:
         return f"Member({self.member_id}, {self.name!r}, {self.date_of_birth}, {self.gender!r}, {self.contact_detail!r})"
 
@@ -32,9 +39,9 @@ class HealthMetric(Base):
     __tablename__ = "HealthMetric"
 
     # Columns
-    metric_id: Mapped[int] = mapped_column(primary_key=True)
+    metric_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     member_id: Mapped[int] = mapped_column(ForeignKey("Member.member_id"), nullable=False)
-    date_recorded: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    date_recorded: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
     weight: Mapped[Optional[float]] = mapped_column(Numeric(5, 2), nullable=True)
     height: Mapped[Optional[float]] = mapped_column(Numeric(5, 2), nullable=True)
     heart_rate: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
@@ -42,9 +49,53 @@ class HealthMetric(Base):
     # Relationships
     member: Mapped["Member"] = relationship("Member", back_populates="health_metrics")
 
+    # Range-partitioned by month on date_recorded (partitions and rollups: sql/health_metrics.sql),
+    # so the partition key is part of the primary key. Indexes are created on every partition.
+    __table_args__ = (
+        Index("ix_healthmetric_member_time", "member_id", "date_recorded"),
+        Index("ix_healthmetric_time_brin", "date_recorded", postgresql_using="brin"),
+        {"postgresql_partition_by": "RANGE (date_recorded)"},
+    )
+
     def __repr__(self) -> str:
         return (f"HealthMetric({self.metric_id}, member_id={self.member_id}, "f"date={self.date_recorded}, weight={self.weight}, height={self.height}, hr={self.heart_rate})")
 
+# Per-member rollups of HealthMetric, kept current by statement-level triggers
+# (sql/health_metrics.sql). Sums and counts are stored so averages stay exact.
+class HealthMetricDaily(Base):
+    __tablename__ = "HealthMetricDaily"
+
+    # Columns
+    member_id: Mapped[int] = mapped_column(ForeignKey("Member.member_id", ondelete="CASCADE"), primary_key=True)
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    samples: Mapped[int] = mapped_column(Integer, nullable=False)
+    weight_sum: Mapped[float] = mapped_column(Numeric(12, 2), nullable=False)
+    weight_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    heart_rate_sum: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    heart_rate_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    heart_rate_min: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    heart_rate_max: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+
+    def __repr__(self) -> str:
+        return f"HealthMetricDaily(member={self.member_id}, {self.day}, samples={self.samples})"
+
+class HealthMetricWeekly(Base):
+    __tablename__ = "HealthMetricWeekly"
+
+    # Columns (week_start is the Monday of the ISO week)
+    member_id: Mapped[int] = mapped_column(ForeignKey("Member.member_id", ondelete="CASCADE"), primary_key=True)
+    week_start: Mapped[date] = mapped_column(Date, primary_key=True)
+    samples: Mapped[int] = mapped_column(Integer, nullable=False)
+    weight_sum: Mapped[float] = mapped_column(Numeric(12, 2), nullable=False)
+    weight_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    heart_rate_sum: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    heart_rate_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    heart_rate_min: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    heart_rate_max: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+
+    def __repr__(self) -> str:
+        return f"HealthMetricWeekly(member={self.member_id}, {self.week_start}, samples={self.samples})"
+
 class BillingPayment(Base):
     __tablename__ = "BillingPayment"
 
@@ -53,15 +104,55 @@ class BillingPayment(Base):
     member_id: Mapped[int] = mapped_column(ForeignKey("Member.member_id"), nullable=False)
     type_of_billing: Mapped[str] = mapped_column(String(50), nullable=False)
     amount_due: Mapped[float] = mapped_column(Numeric(10, 2), nullable=False)
-    status: Mapped[str] = mapped_column(String(20), nullable=False)
+    status: Mapped[str] = mapped_column(String(20), nullable=False)  # "due" or "paid" (billing.STATUS_*)
     payment_method: Mapped[Optional[str]] = mapped_column(String(50), nullable=True)
+    # Set by billing cycles (app/billing.py): one invoice per key, so a re-run can't double-bill
+    billing_period: Mapped[Optional[date]] = mapped_column(Date, nullable=True)
+    idempotency_key: Mapped[Optional[str]] = mapped_column(String(100), nullable=True, unique=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, server_default=func.localtimestamp())
+    paid_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
 
     # Relationship
     member: Mapped["Member"] = relationship("Member", back_populates="payments")
 
+    # Index / status check (ledger summaries: sql/ledger.sql)
+    __table_args__ = (
+        Index("ix_billingpayment_member", "member_id"),
+        CheckConstraint("status IN ('due', 'paid')", name="ck_billingpayment_status"),
+    )
+
     def __repr__(self) -> str:
         return f"BillingPayment({self.billing_id}, member={self.member_id}, {self.amount_due}, {self.status})"
 
+# Ledger summaries of BillingPayment, kept current in the same transaction by statement-level
+# triggers (sql/ledger.sql); billing.reconcile() checks them against the raw rows.
+class MemberBalance(Base):
+    __tablename__ = "MemberBalance"
+
+    # Columns
+    member_id: Mapped[int] = mapped_column(ForeignKey("Member.member_id", ondelete="CASCADE"), primary_key=True)
+    outstanding: Mapped[float] = mapped_column(Numeric(12, 2), nullable=False)
+    open_invoices: Mapped[int] = mapped_column(Integer, nullable=False)
+    last_payment_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    last_payment_amount: Mapped[Optional[float]] = mapped_column(Numeric(10, 2), nullable=True)
+
+    def __repr__(self) -> str:
+        return f"MemberBalance(member={self.member_id}, outstanding={self.outstanding}, open={self.open_invoices})"
+
+class LedgerDaily(Base):
+    __tablename__ = "LedgerDaily"
+
+    # Columns: invoices by the day they were issued, payments by the day they were received
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    type_of_billing: Mapped[str] = mapped_column(String(50), primary_key=True)
+    invoiced_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    invoiced_amount: Mapped[float] = mapped_column(Numeric(14, 2), nullable=False)
+    paid_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    paid_amount: Mapped[float] = mapped_column(Numeric(14, 2), nullable=False)
+
+    def __repr__(self) -> str:
+        return f"LedgerDaily({self.day}, {self.type_of_billing!r}, invoiced={self.invoiced_amount}, paid={self.paid_amount})"
+
 class GoalType(Base):
     __tablename__ = "GoalType"
 
@@ -88,6 +179,11 @@ class HealthGoal(Base):
     member: Mapped["Member"] = relationship("Member", back_populates="goals")
     goal_type: Mapped["GoalType"] = relationship("GoalType", back_populates="goals")
 
+    # Index (a member's goals: dashboard, goal views, member lookup)
+    __table_args__ = (
+        Index("ix_healthgoal_member", "member_id"),
+    )
+
     def __repr__(self) -> str:
         return f"HealthGoal({self.goal_id}, member={self.member_id}, type={self.goal_type_id})"
 
@@ -102,6 +198,11 @@ class Admin(Base):
     equipment_operations: Mapped[list["EquipmentManagement"]] = relationship("EquipmentManagement", back_populates="admin", cascade="all, delete-orphan")
     bookings: Mapped[list["RoomBooking"]] = relationship("RoomBooking", back_populates="admin", cascade="all, delete-orphan")
 
+    # Index (case-insensitive login / lookup, see app/identity.py)
+    __table_args__ = (
+        Index("ix_admin_name_lower", func.lower(column("name"))),
+    )
+
     def __repr__(self) -> str:
         return f"Admin({self.admin_id}, {self.name!r})"
 
@@ -143,6 +244,7 @@ class RoomBooking(Base):
     is_booked: Mapped[bool] = mapped_column(Boolean, nullable=False)
     start_time: Mapped[datetime] = mapped_column(DateTime, nullable=False)
     end_time: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    version: Mapped[int] = mapped_column(Integer, nullable=False, server_default="1")
 
     # Relationships
     admin: Mapped["Admin"] = relationship("Admin", back_populates="bookings")
@@ -150,26 +252,59 @@ class RoomBooking(Base):
     fitness_classes: Mapped[list["FitnessClass"]] = relationship("FitnessClass", back_populates="booking", cascade="all, delete-orphan")
     training_sessions: Mapped[list["TrainingSession"]] = relationship("TrainingSession", back_populates="booking", cascade="all, delete-orphan")
 
-    # Index
+    # Indexes / no two bookings of the same room may overlap, free or booked: the rule room_booking's
+    # probe has always applied (GiST exclusion, needs btree_gist)
     __table_args__ = (
         Index("ix_roombooking_room_time", "room_id", "start_time", "end_time"),
+        Index("ix_roombooking_time", "end_time", "start_time"),
+        Index("ix_roombooking_start", "start_time", "booking_id"),  # keyset order of the booking listings
+        ExcludeConstraint(
+            ("room_id", "="),
+            (func.tsrange(column("start_time"), column("end_time")), "&&"),
+            name="ex_roombooking_room_overlap",
+            using="gist",
+        ),
     )
 
+    # Optimistic concurrency: every ORM UPDATE checks and bumps version (app/database.py);
+    # raw SQL that updates these rows bumps it too
+    __mapper_args__ = {"version_id_col": version}
+
     def __repr__(self) -> str:
         return f"RoomBooking({self.booking_id}, room={self.room_id}, {self.start_time}-{self.end_time})"
 
+# Trigger-maintained (sql/occupancy.sql): bumped whenever booked time in the room changes.
+# No row yet means version 0. app/occupancy.py checks cached heatmaps against it.
+class RoomBookingChange(Base):
+    __tablename__ = "RoomBookingChange"
+
+    # Columns
+    room_id: Mapped[int] = mapped_column(ForeignKey("Room.room_id", ondelete="CASCADE"), primary_key=True)
+    version: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    changed_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"RoomBookingChange(room={self.room_id}, version={self.version}, changed_at={self.changed_at})"
+
 class Trainer(Base):
     __tablename__ = "Trainer"
 
     # Columns
     trainer_id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column(String(100), nullable=False)
+    # Bumped by every write that adds to or moves the trainer's sessions and classes (scheduling.claim_trainer)
+    schedule_version: Mapped[int] = mapped_column(Integer, nullable=False, server_default="1")
 
     # Relationships
     classes: Mapped[list["FitnessClass"]] = relationship("FitnessClass", back_populates="trainer", cascade="all, delete-orphan" )
     availability: Mapped[list["Availability"]] = relationship("Availability", back_populates="trainer", cascade="all, delete-orphan")
     sessions: Mapped[list["TrainingSession"]] = relationship("TrainingSession", back_populates="trainer", cascade="all, delete-orphan")
 
+    # Index (case-insensitive login / lookup, see app/identity.py)
+    __table_args__ = (
+        Index("ix_trainer_name_lower", func.lower(column("name"))),
+    )
+
     def __repr__(self) -> str:
         return f"Trainer({self.trainer_id}, {self.name!r})"
 
@@ -183,15 +318,51 @@ class FitnessClass(Base):
     class_name: Mapped[str] = mapped_column(String(50), nullable=False)
     capacity: Mapped[int] = mapped_column(nullable=False)
     num_signed_up: Mapped[int] = mapped_column(default=0, nullable=False)
+    version: Mapped[int] = mapped_column(Integer, nullable=False, server_default="1")
 
     # Relationships
     trainer: Mapped["Trainer"] = relationship("Trainer", back_populates="classes")
     booking: Mapped["RoomBooking"] = relationship("RoomBooking", back_populates="fitness_classes")
     members: Mapped[list["GroupMember"]] = relationship("GroupMember", back_populates="fitness_class", cascade="all, delete-orphan")
 
+    # Indexes (trainer conflict checks)
+    __table_args__ = (
+        Index("ix_fitnessclass_trainer", "trainer_id"),
+        Index("ix_fitnessclass_booking", "booking_id"),
+        Index("ix_fitnessclass_name", "class_name", "class_id"),  # keyset order of view_fitness_classes
+    )
+
+    # Optimistic concurrency: every ORM UPDATE checks and bumps version (app/database.py);
+    # raw SQL that updates these rows bumps it too
+    __mapper_args__ = {"version_id_col": version}
+
     def __repr__(self) -> str:
         return f"FitnessClass({self.class_id}, {self.class_name!r}, signed_up={self.num_signed_up}/{self.capacity})"
 
+# Bookable classes: future and not full, one row per class, kept current by statement-level
+# triggers on FitnessClass / RoomBooking / Room / Trainer (sql/class_availability.sql).
+# Rows whose start_time has passed are ignored by readers and pruned by class_availability_prune().
+class ClassAvailability(Base):
+    __tablename__ = "ClassAvailability"
+
+    # Columns
+    class_id: Mapped[int] = mapped_column(ForeignKey("FitnessClass.class_id", ondelete="CASCADE"), primary_key=True)
+    class_name: Mapped[str] = mapped_column(String(50), nullable=False)
+    trainer_name: Mapped[str] = mapped_column(String(100), nullable=False)
+    room_name: Mapped[str] = mapped_column(String(50), nullable=False)
+    start_time: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    end_time: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    capacity: Mapped[int] = mapped_column(nullable=False)
+    seats_left: Mapped[int] = mapped_column(nullable=False)
+
+    # Index ("classes in the next N days", keyset order); seats_left is left unindexed so signups stay HOT updates
+    __table_args__ = (
+        Index("ix_classavailability_start", "start_time", "class_id"),
+    )
+
+    def __repr__(self) -> str:
+        return f"ClassAvailability({self.class_id}, {self.class_name!r}, {self.start_time}, seats_left={self.seats_left})"
+
 class GroupMember(Base):
     __tablename__ = "GroupMember"
 
@@ -203,9 +374,10 @@ class GroupMember(Base):
     fitness_class: Mapped["FitnessClass"] = relationship("FitnessClass", back_populates="members")
     member: Mapped["Member"] = relationship("Member", back_populates="group_classes")
 
-    # Composite key
+    # Composite key / a member's classes (the key leads with class_id)
     __table_args__ = (
         PrimaryKeyConstraint("class_id", "member_id"),
+        Index("ix_groupmember_member", "member_id"),
     )
 
     def __repr__(self) -> str:
@@ -220,12 +392,29 @@ class Availability(Base):
     is_recurring: Mapped[bool] = mapped_column(Boolean, nullable=False)
     start_time: Mapped[datetime] = mapped_column(DateTime, nullable=False)
     end_time: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    # Recurring rows are rules (app/recurrence.py): start/end is the first occurrence
+    recurrence: Mapped[Optional[str]] = mapped_column(String(10), nullable=True)
+    repeat_until: Mapped[Optional[date]] = mapped_column(Date, nullable=True)
+    skip_dates: Mapped[Optional[list[date]]] = mapped_column(ARRAY(Date), nullable=True)
 
     # Relationship
     trainer: Mapped["Trainer"] = relationship("Trainer", back_populates="availability")
 
+    # Indexes (trainer conflict checks; all trainers' windows for the PT slot finder; recurring rules)
+    __table_args__ = (
+        Index("ix_availability_trainer_time", "trainer_id", "end_time", "start_time"),
+        Index("ix_availability_time", "end_time", "start_time"),
+        Index("ix_availability_recurring", "trainer_id", postgresql_where=column("is_recurring")),
+        CheckConstraint("recurrence IN ('weekly', 'biweekly')", name="ck_availability_recurrence"),
+    )
+
     def __repr__(self) -> str:
-        return f"Availability(trainer={self.trainer_id}, {self.start_time}–{self.end_time}, recurring={self.is_recurring})"
+        if not self.is_recurring:
+            return f"Availability(trainer={self.trainer_id}, {self.start_time}–{self.end_time}, recurring=False)"
+        until = f" until {self.repeat_until}" if self.repeat_until else ""
+        skips = f", skipping {', '.join(str(day) for day in sorted(self.skip_dates))}" if self.skip_dates else ""
+        return (f"Availability(#{self.availability_id}, trainer={self.trainer_id}, {self.start_time}–{self.end_time}, "
+                f"{self.recurrence or 'weekly'}{until}{skips})")
 
 class TrainingSession(Base):
     __tablename__ = "TrainingSession"
@@ -235,11 +424,23 @@ class TrainingSession(Base):
     trainer_id: Mapped[int] = mapped_column(ForeignKey("Trainer.trainer_id"), nullable=False)
     booking_id: Mapped[int] = mapped_column(ForeignKey("RoomBooking.booking_id"), nullable=False)
     member_id: Mapped[int] = mapped_column(ForeignKey("Member.member_id"), nullable=False)
+    version: Mapped[int] = mapped_column(Integer, nullable=False, server_default="1")
 
     # Relationships
     trainer: Mapped["Trainer"] = relationship("Trainer", back_populates="sessions")
     booking: Mapped["RoomBooking"] = relationship("RoomBooking", back_populates="training_sessions")
     member: Mapped["Member"] = relationship("Member", back_populates="training_sessions")
 
+    # Indexes (trainer conflict checks; a member's sessions)
+    __table_args__ = (
+        Index("ix_trainingsession_trainer", "trainer_id"),
+        Index("ix_trainingsession_booking", "booking_id"),
+        Index("ix_trainingsession_member", "member_id"),
+    )
+
+    # Optimistic concurrency: every ORM UPDATE checks and bumps version (app/database.py);
+    # raw SQL that updates these rows bumps it too
+    __mapper_args__ = {"version_id_col": version}
+
     def __repr__(self) -> str:
         return f"TrainingSession({self.session_id}, trainer={self.trainer_id}, member={self.member_id})"
\ No newline at end of file
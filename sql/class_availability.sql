@@ -0,0 +1,125 @@
+-- ClassAvailability: future, non-full classes with trainer/room names, maintained incrementally.
+-- Every change to the source rows recomputes only the affected classes. Signups change
+-- FitnessClass.num_signed_up in the same statement as the GroupMember insert (see
+-- member_functions.register_for_class / register_batch and bulk_import), so the FitnessClass
+-- trigger is what keeps seats_left current; GroupMember needs no trigger of its own.
+
+-- Recomputes the ClassAvailability rows of the given classes from the source tables
+CREATE OR REPLACE FUNCTION class_availability_refresh(p_class_ids integer[])
+RETURNS void AS $$
+BEGIN
+    -- Classes that have started since the last refresh leave first, so the table stays bounded
+    PERFORM class_availability_prune();
+    WITH bookable AS (
+        SELECT fc.class_id, fc.class_name, t.name AS trainer_name, r.room_name,
+               rb.start_time, rb.end_time, fc.capacity, fc.capacity - fc.num_signed_up AS seats_left
+        FROM "FitnessClass" fc
+        JOIN "RoomBooking" rb ON rb.booking_id = fc.booking_id
+        JOIN "Room" r ON r.room_id = rb.room_id
+        JOIN "Trainer" t ON t.trainer_id = fc.trainer_id
+        WHERE fc.class_id = ANY(p_class_ids)
+          AND fc.num_signed_up < fc.capacity
+          AND rb.start_time > localtimestamp
+    ), gone AS (
+        DELETE FROM "ClassAvailability" ca
+        WHERE ca.class_id = ANY(p_class_ids)
+          AND NOT EXISTS (SELECT 1 FROM bookable b WHERE b.class_id = ca.class_id)
+    )
+    INSERT INTO "ClassAvailability" (class_id, class_name, trainer_name, room_name, start_time, end_time, capacity, seats_left)
+    SELECT * FROM bookable
+    ON CONFLICT (class_id) DO UPDATE SET
+        class_name = EXCLUDED.class_name, trainer_name = EXCLUDED.trainer_name, room_name = EXCLUDED.room_name,
+        start_time = EXCLUDED.start_time, end_time = EXCLUDED.end_time,
+        capacity = EXCLUDED.capacity, seats_left = EXCLUDED.seats_left;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Drops classes that have started; readers already filter on start_time, this only bounds the table.
+-- Runs on every refresh and at startup (migrations.maintain)
+CREATE OR REPLACE FUNCTION class_availability_prune()
+RETURNS integer AS $$
+DECLARE
+    pruned integer;
+BEGIN
+    DELETE FROM "ClassAvailability" WHERE start_time <= localtimestamp;
+    GET DIAGNOSTICS pruned = ROW_COUNT;
+    RETURN pruned;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Deleted classes leave through the ON DELETE CASCADE foreign key
+CREATE OR REPLACE FUNCTION class_availability_fitnessclass_change()
+RETURNS trigger AS $$
+BEGIN
+    PERFORM class_availability_refresh(ARRAY(SELECT DISTINCT class_id FROM new_rows));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION class_availability_roombooking_change()
+RETURNS trigger AS $$
+BEGIN
+    PERFORM class_availability_refresh(ARRAY(
+        SELECT fc.class_id FROM "FitnessClass" fc
+        WHERE fc.booking_id IN (SELECT n.booking_id FROM new_rows n JOIN old_rows o USING (booking_id)
+                                WHERE (n.room_id, n.start_time, n.end_time) IS DISTINCT FROM (o.room_id, o.start_time, o.end_time))));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION class_availability_room_change()
+RETURNS trigger AS $$
+BEGIN
+    PERFORM class_availability_refresh(ARRAY(
+        SELECT fc.class_id FROM "FitnessClass" fc JOIN "RoomBooking" rb ON rb.booking_id = fc.booking_id
+        WHERE rb.room_id IN (SELECT n.room_id FROM new_rows n JOIN old_rows o USING (room_id)
+                             WHERE n.room_name IS DISTINCT FROM o.room_name)
+          AND rb.start_time > localtimestamp));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION class_availability_trainer_change()
+RETURNS trigger AS $$
+BEGIN
+    PERFORM class_availability_refresh(ARRAY(
+        SELECT fc.class_id FROM "FitnessClass" fc
+        WHERE fc.trainer_id IN (SELECT n.trainer_id FROM new_rows n JOIN old_rows o USING (trainer_id)
+                                WHERE n.name IS DISTINCT FROM o.name)));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_class_availability_insert ON "FitnessClass";
+CREATE TRIGGER trg_class_availability_insert
+AFTER INSERT ON "FitnessClass"
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION class_availability_fitnessclass_change();
+
+DROP TRIGGER IF EXISTS trg_class_availability_update ON "FitnessClass";
+CREATE TRIGGER trg_class_availability_update
+AFTER UPDATE ON "FitnessClass"
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION class_availability_fitnessclass_change();
+
+DROP TRIGGER IF EXISTS trg_class_availability_roombooking ON "RoomBooking";
+CREATE TRIGGER trg_class_availability_roombooking
+AFTER UPDATE ON "RoomBooking"
+REFERENCING NEW TABLE AS new_rows OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION class_availability_roombooking_change();
+
+DROP TRIGGER IF EXISTS trg_class_availability_room ON "Room";
+CREATE TRIGGER trg_class_availability_room
+AFTER UPDATE ON "Room"
+REFERENCING NEW TABLE AS new_rows OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION class_availability_room_change();
+
+DROP TRIGGER IF EXISTS trg_class_availability_trainer ON "Trainer";
+CREATE TRIGGER trg_class_availability_trainer
+AFTER UPDATE ON "Trainer"
+REFERENCING NEW TABLE AS new_rows OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION class_availability_trainer_change();
+
+-- Backfill (also repairs the table if it ever drifts)
+SELECT class_availability_refresh(ARRAY(SELECT class_id FROM "FitnessClass"));
+SELECT class_availability_prune();
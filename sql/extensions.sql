@@ -0,0 +1,4 @@
+-- extensions: must exist before the tables are created
+
+-- btree_gist lets the RoomBooking exclusion constraint mix room_id (=) with tsrange (&&)
+CREATE EXTENSION IF NOT EXISTS btree_gist;
@@ -0,0 +1,172 @@
+-- HealthMetric storage: monthly range partitions plus daily/weekly rollups.
+-- Run after the tables are created (HealthMetric is declared PARTITION BY RANGE (date_recorded)).
+
+-- Rows for months without a partition land here until healthmetric_ensure_partitions() moves them out
+CREATE TABLE IF NOT EXISTS "HealthMetric_default" PARTITION OF "HealthMetric" DEFAULT;
+
+-- Creates the monthly partitions HealthMetric_YYYY_MM covering [p_from, p_to], moving any matching
+-- rows out of the default partition first. Returns how many partitions were created.
+CREATE OR REPLACE FUNCTION healthmetric_ensure_partitions(p_from timestamp, p_to timestamp)
+RETURNS integer AS $$
+DECLARE
+    month_start timestamp := date_trunc('month', p_from);
+    month_end timestamp;
+    part_name text;
+    created integer := 0;
+BEGIN
+    IF p_from IS NULL OR p_to IS NULL THEN
+        RETURN 0;
+    END IF;
+    WHILE month_start <= p_to LOOP
+        month_end := month_start + interval '1 month';
+        part_name := 'HealthMetric_' || to_char(month_start, 'YYYY_MM');
+        IF to_regclass(format('%I', part_name)) IS NULL THEN
+            -- Concurrent callers wait here, then see the partition already exists
+            PERFORM pg_advisory_xact_lock(hashtext(part_name));
+            IF to_regclass(format('%I', part_name)) IS NULL THEN
+                EXECUTE format('CREATE TABLE %I (LIKE "HealthMetric" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', part_name);
+                -- Statement triggers on HealthMetric don't fire for the default partition, so rollups are untouched
+                EXECUTE format(
+                    'WITH moved AS (DELETE FROM "HealthMetric_default" WHERE date_recorded >= %L AND date_recorded < %L RETURNING *) '
+                    'INSERT INTO %I SELECT * FROM moved', month_start, month_end, part_name);
+                EXECUTE format('ALTER TABLE "HealthMetric" ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                               part_name, month_start, month_end);
+                created := created + 1;
+            END IF;
+        END IF;
+        month_start := month_end;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Startup/maintenance: partitions for every month parked in the default partition,
+-- plus the current month and p_months_ahead after it
+CREATE OR REPLACE FUNCTION healthmetric_maintain_partitions(p_months_ahead integer DEFAULT 3)
+RETURNS integer AS $$
+DECLARE
+    parked timestamp;
+    created integer := 0;
+BEGIN
+    FOR parked IN SELECT DISTINCT date_trunc('month', date_recorded) FROM "HealthMetric_default" LOOP
+        created := created + healthmetric_ensure_partitions(parked, parked);
+    END LOOP;
+    RETURN created + healthmetric_ensure_partitions(
+        CAST(date_trunc('month', now()) AS timestamp),
+        CAST(date_trunc('month', now()) AS timestamp) + make_interval(months => p_months_ahead));
+END;
+$$ LANGUAGE plpgsql;
+
+-- Recomputes the daily and weekly rollups for the given (member_id, day) pairs from HealthMetric.
+-- Each bucket reads only the partition(s) covering its day or week.
+CREATE OR REPLACE FUNCTION healthmetric_refresh_rollups(p_member_ids integer[], p_days date[])
+RETURNS void AS $$
+BEGIN
+    DELETE FROM "HealthMetricDaily" d
+    USING unnest(p_member_ids, p_days) AS t(member_id, day)
+    WHERE d.member_id = t.member_id AND d.day = t.day;
+
+    INSERT INTO "HealthMetricDaily" (member_id, day, samples, weight_sum, weight_count,
+                                     heart_rate_sum, heart_rate_count, heart_rate_min, heart_rate_max)
+    SELECT hm.member_id, t.day, count(*), coalesce(sum(hm.weight), 0), count(hm.weight),
+           coalesce(sum(hm.heart_rate), 0), count(hm.heart_rate), min(hm.heart_rate), max(hm.heart_rate)
+    FROM (SELECT DISTINCT member_id, day FROM unnest(p_member_ids, p_days) AS u(member_id, day)) t
+    JOIN "HealthMetric" hm ON hm.member_id = t.member_id
+                          AND hm.date_recorded >= t.day AND hm.date_recorded < t.day + 1
+    GROUP BY hm.member_id, t.day;
+
+    DELETE FROM "HealthMetricWeekly" w
+    USING unnest(p_member_ids, p_days) AS t(member_id, day)
+    WHERE w.member_id = t.member_id AND w.week_start = CAST(date_trunc('week', t.day) AS date);
+
+    INSERT INTO "HealthMetricWeekly" (member_id, week_start, samples, weight_sum, weight_count,
+                                      heart_rate_sum, heart_rate_count, heart_rate_min, heart_rate_max)
+    SELECT hm.member_id, t.week_start, count(*), coalesce(sum(hm.weight), 0), count(hm.weight),
+           coalesce(sum(hm.heart_rate), 0), count(hm.heart_rate), min(hm.heart_rate), max(hm.heart_rate)
+    FROM (SELECT DISTINCT member_id, CAST(date_trunc('week', day) AS date) AS week_start
+          FROM unnest(p_member_ids, p_days) AS u(member_id, day)) t
+    JOIN "HealthMetric" hm ON hm.member_id = t.member_id
+                          AND hm.date_recorded >= t.week_start AND hm.date_recorded < t.week_start + 7
+    GROUP BY hm.member_id, t.week_start;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Inserts fold the new rows into the rollups once per statement (a bulk COPY chunk is one statement)
+CREATE OR REPLACE FUNCTION healthmetric_rollup_insert()
+RETURNS trigger AS $$
+BEGIN
+    INSERT INTO "HealthMetricDaily" AS d (member_id, day, samples, weight_sum, weight_count,
+                                          heart_rate_sum, heart_rate_count, heart_rate_min, heart_rate_max)
+    SELECT member_id, CAST(date_recorded AS date), count(*), coalesce(sum(weight), 0), count(weight),
+           coalesce(sum(heart_rate), 0), count(heart_rate), min(heart_rate), max(heart_rate)
+    FROM new_rows
+    GROUP BY 1, 2
+    ON CONFLICT (member_id, day) DO UPDATE SET
+        samples = d.samples + EXCLUDED.samples,
+        weight_sum = d.weight_sum + EXCLUDED.weight_sum,
+        weight_count = d.weight_count + EXCLUDED.weight_count,
+        heart_rate_sum = d.heart_rate_sum + EXCLUDED.heart_rate_sum,
+        heart_rate_count = d.heart_rate_count + EXCLUDED.heart_rate_count,
+        heart_rate_min = least(d.heart_rate_min, EXCLUDED.heart_rate_min),
+        heart_rate_max = greatest(d.heart_rate_max, EXCLUDED.heart_rate_max);
+
+    INSERT INTO "HealthMetricWeekly" AS w (member_id, week_start, samples, weight_sum, weight_count,
+                                           heart_rate_sum, heart_rate_count, heart_rate_min, heart_rate_max)
+    SELECT member_id, CAST(date_trunc('week', date_recorded) AS date), count(*), coalesce(sum(weight), 0), count(weight),
+           coalesce(sum(heart_rate), 0), count(heart_rate), min(heart_rate), max(heart_rate)
+    FROM new_rows
+    GROUP BY 1, 2
+    ON CONFLICT (member_id, week_start) DO UPDATE SET
+        samples = w.samples + EXCLUDED.samples,
+        weight_sum = w.weight_sum + EXCLUDED.weight_sum,
+        weight_count = w.weight_count + EXCLUDED.weight_count,
+        heart_rate_sum = w.heart_rate_sum + EXCLUDED.heart_rate_sum,
+        heart_rate_count = w.heart_rate_count + EXCLUDED.heart_rate_count,
+        heart_rate_min = least(w.heart_rate_min, EXCLUDED.heart_rate_min),
+        heart_rate_max = greatest(w.heart_rate_max, EXCLUDED.heart_rate_max);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Updates and deletes can't be folded in (min/max), so the touched buckets are recomputed
+CREATE OR REPLACE FUNCTION healthmetric_rollup_change()
+RETURNS trigger AS $$
+DECLARE
+    member_ids integer[];
+    days date[];
+BEGIN
+    IF TG_OP = 'UPDATE' THEN
+        SELECT array_agg(member_id), array_agg(day) INTO member_ids, days
+        FROM (SELECT member_id, CAST(date_recorded AS date) AS day FROM old_rows
+              UNION
+              SELECT member_id, CAST(date_recorded AS date) FROM new_rows) t;
+    ELSE
+        SELECT array_agg(member_id), array_agg(day) INTO member_ids, days
+        FROM (SELECT DISTINCT member_id, CAST(date_recorded AS date) AS day FROM old_rows) t;
+    END IF;
+    IF member_ids IS NOT NULL THEN
+        PERFORM healthmetric_refresh_rollups(member_ids, days);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_healthmetric_rollup_insert ON "HealthMetric";
+CREATE TRIGGER trg_healthmetric_rollup_insert
+AFTER INSERT ON "HealthMetric"
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION healthmetric_rollup_insert();
+
+DROP TRIGGER IF EXISTS trg_healthmetric_rollup_update ON "HealthMetric";
+CREATE TRIGGER trg_healthmetric_rollup_update
+AFTER UPDATE ON "HealthMetric"
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION healthmetric_rollup_change();
+
+DROP TRIGGER IF EXISTS trg_healthmetric_rollup_delete ON "HealthMetric";
+CREATE TRIGGER trg_healthmetric_rollup_delete
+AFTER DELETE ON "HealthMetric"
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION healthmetric_rollup_change();
+
+SELECT healthmetric_maintain_partitions(3);
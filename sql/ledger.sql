@@ -0,0 +1,141 @@
+-- Ledger summaries of BillingPayment: MemberBalance (outstanding balance, open invoices, last payment)
+-- and LedgerDaily (invoiced / paid totals per day and billing type). Statement-level triggers fold
+-- every insert, update and delete in, inside the writing transaction. Monthly totals sum at most
+-- 31 LedgerDaily rows per type. billing.reconcile() compares both tables with ledger_expected_*.
+
+-- Adds (p_sign = 1) or removes (p_sign = -1) the contribution of a set of BillingPayment rows
+CREATE OR REPLACE FUNCTION ledger_apply(p_rows "BillingPayment"[], p_sign integer)
+RETURNS void AS $$
+BEGIN
+    INSERT INTO "LedgerDaily" AS l (day, type_of_billing, invoiced_count, invoiced_amount, paid_count, paid_amount)
+    SELECT day, type_of_billing, sum(invoiced_count), sum(invoiced_amount), sum(paid_count), sum(paid_amount)
+    FROM (
+        SELECT CAST(created_at AS date) AS day, type_of_billing,
+               p_sign AS invoiced_count, p_sign * amount_due AS invoiced_amount, 0 AS paid_count, 0 AS paid_amount
+        FROM unnest(p_rows)
+        UNION ALL
+        SELECT CAST(coalesce(paid_at, created_at) AS date), type_of_billing, 0, 0, p_sign, p_sign * amount_due
+        FROM unnest(p_rows) WHERE status = 'paid'
+    ) contributions
+    GROUP BY day, type_of_billing
+    ORDER BY day, type_of_billing  -- same lock order in every transaction
+    ON CONFLICT (day, type_of_billing) DO UPDATE SET
+        invoiced_count = l.invoiced_count + EXCLUDED.invoiced_count,
+        invoiced_amount = l.invoiced_amount + EXCLUDED.invoiced_amount,
+        paid_count = l.paid_count + EXCLUDED.paid_count,
+        paid_amount = l.paid_amount + EXCLUDED.paid_amount;
+
+    INSERT INTO "MemberBalance" AS b (member_id, outstanding, open_invoices, last_payment_at, last_payment_amount)
+    SELECT member_id,
+           coalesce(p_sign * sum(amount_due) FILTER (WHERE status = 'due'), 0),
+           p_sign * count(*) FILTER (WHERE status = 'due'),
+           CASE WHEN p_sign = 1 THEN max(paid_at) END,
+           CASE WHEN p_sign = 1 THEN (array_agg(amount_due ORDER BY paid_at DESC, billing_id DESC) FILTER (WHERE paid_at IS NOT NULL))[1] END
+    FROM unnest(p_rows)
+    GROUP BY member_id
+    ORDER BY member_id
+    ON CONFLICT (member_id) DO UPDATE SET
+        outstanding = b.outstanding + EXCLUDED.outstanding,
+        open_invoices = b.open_invoices + EXCLUDED.open_invoices,
+        last_payment_at = CASE WHEN EXCLUDED.last_payment_at >= b.last_payment_at OR b.last_payment_at IS NULL
+                               THEN EXCLUDED.last_payment_at ELSE b.last_payment_at END,
+        last_payment_amount = CASE WHEN EXCLUDED.last_payment_at >= b.last_payment_at OR b.last_payment_at IS NULL
+                                   THEN EXCLUDED.last_payment_amount ELSE b.last_payment_amount END;
+
+    -- A payment that went away (un-paid, re-dated or deleted): look the last payment up again
+    IF p_sign = -1 THEN
+        UPDATE "MemberBalance" b
+        SET last_payment_at = last.paid_at, last_payment_amount = last.amount_due
+        FROM (SELECT DISTINCT member_id FROM unnest(p_rows) WHERE paid_at IS NOT NULL) gone
+        LEFT JOIN LATERAL (
+            SELECT bp.paid_at, bp.amount_due FROM "BillingPayment" bp
+            WHERE bp.member_id = gone.member_id AND bp.paid_at IS NOT NULL
+            ORDER BY bp.paid_at DESC, bp.billing_id DESC LIMIT 1
+        ) last ON TRUE
+        WHERE b.member_id = gone.member_id;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION ledger_billingpayment_insert()
+RETURNS trigger AS $$
+BEGIN
+    PERFORM ledger_apply(ARRAY(SELECT CAST(ROW(n.*) AS "BillingPayment") FROM new_rows n), 1);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Old rows come out first; the raw table already holds the new rows when the last payment is looked up
+CREATE OR REPLACE FUNCTION ledger_billingpayment_update()
+RETURNS trigger AS $$
+BEGIN
+    PERFORM ledger_apply(ARRAY(SELECT CAST(ROW(o.*) AS "BillingPayment") FROM old_rows o), -1);
+    PERFORM ledger_apply(ARRAY(SELECT CAST(ROW(n.*) AS "BillingPayment") FROM new_rows n), 1);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION ledger_billingpayment_delete()
+RETURNS trigger AS $$
+BEGIN
+    PERFORM ledger_apply(ARRAY(SELECT CAST(ROW(o.*) AS "BillingPayment") FROM old_rows o), -1);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_ledger_insert ON "BillingPayment";
+CREATE TRIGGER trg_ledger_insert
+AFTER INSERT ON "BillingPayment"
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION ledger_billingpayment_insert();
+
+DROP TRIGGER IF EXISTS trg_ledger_update ON "BillingPayment";
+CREATE TRIGGER trg_ledger_update
+AFTER UPDATE ON "BillingPayment"
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION ledger_billingpayment_update();
+
+DROP TRIGGER IF EXISTS trg_ledger_delete ON "BillingPayment";
+CREATE TRIGGER trg_ledger_delete
+AFTER DELETE ON "BillingPayment"
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION ledger_billingpayment_delete();
+
+-- What the summaries should hold, computed from the raw rows (reconciliation and rebuild)
+CREATE OR REPLACE VIEW ledger_expected_balance AS
+SELECT member_id,
+       coalesce(sum(amount_due) FILTER (WHERE status = 'due'), 0) AS outstanding,
+       CAST(count(*) FILTER (WHERE status = 'due') AS integer) AS open_invoices,
+       max(paid_at) AS last_payment_at,
+       (array_agg(amount_due ORDER BY paid_at DESC, billing_id DESC) FILTER (WHERE paid_at IS NOT NULL))[1] AS last_payment_amount
+FROM "BillingPayment"
+GROUP BY member_id;
+
+CREATE OR REPLACE VIEW ledger_expected_daily AS
+SELECT day, type_of_billing,
+       CAST(sum(invoiced_count) AS integer) AS invoiced_count, sum(invoiced_amount) AS invoiced_amount,
+       CAST(sum(paid_count) AS integer) AS paid_count, sum(paid_amount) AS paid_amount
+FROM (
+    SELECT CAST(created_at AS date) AS day, type_of_billing, 1 AS invoiced_count, amount_due AS invoiced_amount, 0 AS paid_count, 0 AS paid_amount
+    FROM "BillingPayment"
+    UNION ALL
+    SELECT CAST(coalesce(paid_at, created_at) AS date), type_of_billing, 0, 0, 1, amount_due
+    FROM "BillingPayment" WHERE status = 'paid'
+) contributions
+GROUP BY day, type_of_billing;
+
+-- Replaces both summaries with the expected values; the lock keeps writers out meanwhile
+CREATE OR REPLACE FUNCTION ledger_rebuild()
+RETURNS void AS $$
+BEGIN
+    LOCK TABLE "BillingPayment" IN SHARE MODE;
+    DELETE FROM "MemberBalance";
+    DELETE FROM "LedgerDaily";
+    INSERT INTO "MemberBalance" (member_id, outstanding, open_invoices, last_payment_at, last_payment_amount)
+    SELECT member_id, outstanding, open_invoices, last_payment_at, last_payment_amount FROM ledger_expected_balance;
+    INSERT INTO "LedgerDaily" (day, type_of_billing, invoiced_count, invoiced_amount, paid_count, paid_amount)
+    SELECT day, type_of_billing, invoiced_count, invoiced_amount, paid_count, paid_amount FROM ledger_expected_daily;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT ledger_rebuild();
@@ -0,0 +1,63 @@
+-- RoomBookingChange: a version counter per room, bumped in the writing transaction whenever a
+-- statement adds, removes or moves booked time in that room (app/occupancy.py caches heatmaps
+-- against it). Free slots (is_booked = false) don't count towards occupancy, so creating or
+-- deleting one leaves the counter alone. Rooms are bumped in room_id order, so concurrent
+-- writers take the counter row locks in the same order.
+
+CREATE OR REPLACE FUNCTION roombooking_change_bump(p_room_ids integer[])
+RETURNS void AS $$
+BEGIN
+    INSERT INTO "RoomBookingChange" AS c (room_id, version, changed_at)
+    SELECT DISTINCT room_id, 1, localtimestamp FROM unnest(p_room_ids) room_id
+    WHERE room_id IS NOT NULL
+    ORDER BY room_id
+    ON CONFLICT (room_id) DO UPDATE SET version = c.version + 1, changed_at = EXCLUDED.changed_at;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION roombooking_change_insert()
+RETURNS trigger AS $$
+BEGIN
+    PERFORM roombooking_change_bump(ARRAY(SELECT n.room_id FROM new_rows n WHERE n.is_booked));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION roombooking_change_update()
+RETURNS trigger AS $$
+BEGIN
+    PERFORM roombooking_change_bump(ARRAY(
+        SELECT room_id FROM (
+            SELECT o.room_id AS old_room, n.room_id AS new_room FROM new_rows n JOIN old_rows o USING (booking_id)
+            WHERE (o.is_booked OR n.is_booked)
+              AND (n.room_id, n.is_booked, n.start_time, n.end_time) IS DISTINCT FROM (o.room_id, o.is_booked, o.start_time, o.end_time)
+        ) changed, unnest(ARRAY[old_room, new_room]) room_id));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION roombooking_change_delete()
+RETURNS trigger AS $$
+BEGIN
+    PERFORM roombooking_change_bump(ARRAY(SELECT o.room_id FROM old_rows o WHERE o.is_booked));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_roombooking_change_insert ON "RoomBooking";
+CREATE TRIGGER trg_roombooking_change_insert
+AFTER INSERT ON "RoomBooking"
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION roombooking_change_insert();
+
+DROP TRIGGER IF EXISTS trg_roombooking_change_update ON "RoomBooking";
+CREATE TRIGGER trg_roombooking_change_update
+AFTER UPDATE ON "RoomBooking"
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION roombooking_change_update();
+
+DROP TRIGGER IF EXISTS trg_roombooking_change_delete ON "RoomBooking";
+CREATE TRIGGER trg_roombooking_change_delete
+AFTER DELETE ON "RoomBooking"
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION roombooking_change_delete();
@@ -1,32 +1,12 @@
-
--- trigger: prevent overlapping RoomBooking for same room
--- function for trigger
-
-CREATE OR REPLACE FUNCTION prevent_roombooking_overlap() RETURNS trigger AS $$
-BEGIN
-    IF EXISTS (
-    SELECT 1 FROM "RoomBooking"
-    WHERE room_id = NEW.room_id
-        AND is_booked = TRUE
-        AND start_time < NEW.end_time
-        AND end_time > NEW.start_time
-        AND (TG_OP = 'INSERT' OR (TG_OP = 'UPDATE' AND booking_id <> NEW.booking_id))
-    ) THEN
-    RAISE EXCEPTION 'Room booking overlaps existing booking';
-    END IF;
-    RETURN NEW;
-END;
-$$ LANGUAGE plpgsql;
-
-
--- create trigger only if not exists
+-- RoomBooking overlap is enforced by the ex_roombooking_room_overlap exclusion constraint
+-- (see RoomBooking in models/schemas.py), which keeps every booking of a room apart, booked or
+-- not. Drop the trigger only once the constraint exists, so a table is never left unguarded.
 
 DO $$
 BEGIN
-    IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'trg_prevent_roombooking_overlap') THEN
-    CREATE TRIGGER trg_prevent_roombooking_overlap
-    BEFORE INSERT OR UPDATE ON "RoomBooking"
-    FOR EACH ROW EXECUTE FUNCTION prevent_roombooking_overlap();
+    IF EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'ex_roombooking_room_overlap') THEN
+    DROP TRIGGER IF EXISTS trg_prevent_roombooking_overlap ON "RoomBooking";
+    DROP FUNCTION IF EXISTS prevent_roombooking_overlap();
     END IF;
 END;
-$$;
\ No newline at end of file
+$$;
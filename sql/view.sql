@@ -1,11 +1,15 @@
-
--- view: available fitness classes
+-- view: bookable fitness classes (future, with seats left), backed by ClassAvailability
+-- (sql/class_availability.sql). Dropped first because the column list changed in schema v4.
+DROP VIEW IF EXISTS view_available_classes;
 CREATE VIEW view_available_classes AS
 SELECT
     class_id,
-    trainer_id,
-    booking_id,
     class_name,
+    trainer_name,
+    room_name,
+    start_time,
+    end_time,
     capacity,
-    num_signed_up
-FROM "FitnessClass";
+    seats_left
+FROM "ClassAvailability"
+WHERE start_time > localtimestamp;
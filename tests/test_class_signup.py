@@ -0,0 +1,52 @@
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+import collections
+import random
+import threading
+from conftest import make_test_engine
+from class_signup_stress import setup
+import member_functions
+
+# A popular class opening: many members sign up at once, some twice.
+# No seat may be oversold and no member may be on the roster twice.
+
+WORKERS = 32
+SIGNUPS = 300
+CAPACITY = 20
+
+def test_parallel_signups_never_oversell(engine):
+    members = SIGNUPS * 4 // 5
+    class_id = setup(engine, members, CAPACITY)
+    rng = random.Random(3005)
+    requests = list(range(1, members + 1)) + [rng.randint(1, members) for _ in range(SIGNUPS - members)]
+    rng.shuffle(requests)
+
+    workers_engine = make_test_engine(pool_size=WORKERS)
+    Session = sessionmaker(bind=workers_engine)
+    barrier = threading.Barrier(WORKERS)
+    local = threading.local()
+
+    def signup(member_id):
+        if not getattr(local, "ready", False):
+            barrier.wait()  # every worker starts at the same moment
+            local.ready = True
+        with Session() as session:
+            try:
+                return member_functions.register_for_class(session, member_id, class_id)
+            except Exception as e:
+                session.rollback()
+                return f"error: {type(e).__name__}"
+
+    try:
+        with ThreadPoolExecutor(WORKERS) as executor:
+            outcomes = collections.Counter(executor.map(signup, requests))
+    finally:
+        workers_engine.dispose()
+
+    with engine.connect() as conn:
+        num_signed_up = conn.execute(text('SELECT num_signed_up FROM "FitnessClass" WHERE class_id = :c'), {"c": class_id}).scalar()
+        rows, distinct = conn.execute(text('SELECT count(*), count(DISTINCT member_id) FROM "GroupMember" WHERE class_id = :c'), {"c": class_id}).one()
+
+    assert not [outcome for outcome in outcomes if outcome.startswith("error:")], outcomes
+    assert rows == distinct == num_signed_up == outcomes[member_functions.REGISTERED] == CAPACITY
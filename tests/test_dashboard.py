@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta
+from sqlalchemy.orm import sessionmaker
+import pytest
+from common import StatementCounter
+from models.schemas import Member, HealthMetric, HealthGoal, GoalType, Admin, Room, RoomBooking, Trainer, FitnessClass, GroupMember, TrainingSession
+import member_functions
+
+# member_functions.dashboard must issue the same number of statements
+# no matter how much history the member has
+
+def add_history(session, member, admin, trainer, size, offset):
+    # Each batch books its own rooms, so no two bookings of a room overlap
+    class_room, pt_room = Room(room_name=f"Class room {offset}"), Room(room_name=f"PT room {offset}")
+    base = datetime.now() - timedelta(days=offset + size)
+    session.add_all([
+        HealthMetric(member=member, date_recorded=base + timedelta(days=i), weight=70 + i % 5, height=175, heart_rate=60 + i % 20)
+        for i in range(size)
+    ])
+    goal_type = GoalType(description=f"Goal {offset}", target="target")
+    session.add(HealthGoal(member=member, goal_type=goal_type))
+    for i in range(size):
+        start = base + timedelta(days=2 * i, hours=i % 8)
+        past = RoomBooking(admin=admin, room=class_room, is_booked=True, start_time=start, end_time=start + timedelta(hours=1))
+        fitness_class = FitnessClass(trainer=trainer, booking=past, class_name=f"Class {offset}-{i}", capacity=10, num_signed_up=1)
+        session.add(GroupMember(fitness_class=fitness_class, member=member))
+        future = datetime.now() + timedelta(days=offset + i + 1)
+        upcoming = RoomBooking(admin=admin, room=pt_room, is_booked=True, start_time=future, end_time=future + timedelta(hours=1))
+        session.add(TrainingSession(trainer=trainer, booking=upcoming, member=member))
+    session.commit()
+
+def test_dashboard_statement_count_is_constant(engine):
+    with sessionmaker(bind=engine)() as session:
+        member = Member(name="History", contact_detail="history@example.com")
+        admin = Admin(name="Test admin")
+        trainer = Trainer(name="Test trainer")
+        session.add_all([member, admin, trainer])
+        session.commit()
+
+        counts = []
+        offset = 0
+        for size in (0, 10, 100, 1000):
+            add_history(session, member, admin, trainer, size, offset)
+            offset += 3 * size + 1
+            session.expire_all()
+            member = session.get(Member, member.member_id)
+            with StatementCounter(engine) as counter:
+                member_functions.dashboard(session, member)
+            counts.append(counter.count)
+
+    assert len(set(counts)) == 1, f"dashboard statement count grew with history: {counts}"
@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+import collections
+import random
+import threading
+import time
+from conftest import make_test_engine
+from scheduling_stress import INVARIANTS, MIX, Workload, fill
+import database
+
+# Front desks racing each other over a small schedule (bench/scheduling_stress.py, shortened):
+# no trainer in two places at once, no booking used twice, is_booked right, no class oversold.
+
+WORKERS = 8
+SECONDS = 3
+
+def test_racing_front_desks_keep_schedule_consistent(engine):
+    args = SimpleNamespace(members=200, trainers=3, pt_rooms=3, class_rooms=2, hours=24, seed=3005)
+    origin = (datetime.now() + timedelta(days=1)).replace(minute=0, second=0, microsecond=0)
+    booking_ids = fill(engine, args, origin)
+    workload = Workload(args, origin, booking_ids, retry=True)
+    operations = [name for name, _, _ in MIX]
+    weights = [weight for _, _, weight in MIX]
+
+    workers_engine = make_test_engine(pool_size=WORKERS)
+    Session = sessionmaker(bind=workers_engine)
+    outcomes = collections.Counter()
+    lock = threading.Lock()
+    deadline = time.perf_counter() + SECONDS
+
+    def worker(index):
+        rng = random.Random(args.seed * 1000 + index)
+        counts = collections.Counter()
+        while time.perf_counter() < deadline:
+            operation = rng.choices(operations, weights)[0]
+            with Session() as session:
+                try:
+                    result = getattr(workload, operation)(session, rng)
+                    counts[operation, "done" if result else "rejected"] += 1
+                except Exception as e:
+                    session.rollback()
+                    counts[operation, f"error: {type(e).__name__}"] += 1
+        with lock:
+            outcomes.update(counts)
+
+    database.retry_stats.reset()
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(WORKERS)]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        workers_engine.dispose()
+
+    assert not {key: n for key, n in outcomes.items() if key[1].startswith("error:")}, outcomes
+    assert sum(n for (_, outcome), n in outcomes.items() if outcome == "done"), outcomes
+    with engine.connect() as conn:
+        violations = {name: conn.execute(text(sql)).scalar() for name, sql in INVARIANTS.items()}
+    assert violations == dict.fromkeys(INVARIANTS, 0)